@@ -5,6 +5,7 @@ from .views import (
     AdminContentListView,
     AdminLoginView,
     AdminStatsView,
+    AdminThrottleStatsView,
     AdminUserListView,
     AdminUserStatusView,
     AdminCommentListView,
@@ -20,5 +21,6 @@ urlpatterns = [
     path("users/", AdminUserListView.as_view(), name="admin-users"),
     path("users/<int:pk>/status/", AdminUserStatusView.as_view(), name="admin-user-status"),
     path("stats/", AdminStatsView.as_view(), name="admin-stats"),
+    path("throttle/", AdminThrottleStatsView.as_view(), name="admin-throttle"),
 ]
 
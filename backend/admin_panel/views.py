@@ -1,11 +1,13 @@
 from datetime import date, timedelta
 
+from django.conf import settings
 from django.db.models import Q, Count
 from drf_spectacular.utils import extend_schema, OpenApiParameter, OpenApiExample
 from rest_framework import generics, permissions, status
 from rest_framework.response import Response
 from rest_framework_simplejwt.views import TokenObtainPairView
 
+from core.throttling import LoginIPThrottle, LoginPhoneThrottle, throttle_metrics
 from interactions.models import Comment
 from moments.models import Moment
 from moments.serializers import MomentListSerializer
@@ -34,6 +36,7 @@ class AdminLoginView(TokenObtainPairView):
     """管理员登录接口"""
     serializer_class = AdminTokenObtainPairSerializer
     permission_classes = [permissions.AllowAny]
+    throttle_classes = [LoginIPThrottle, LoginPhoneThrottle]
 
 
 @extend_schema(
@@ -273,3 +276,20 @@ class AdminCommentDeleteView(generics.DestroyAPIView):
     """管理员删除评论接口"""
     permission_classes = [IsStaffUser]
     queryset = Comment.objects.all()
+
+
+@extend_schema(
+    tags=["管理后台"],
+    summary="限流统计",
+    description="登录/注册接口各限流规则的配置，以及累计放行和拒绝的请求数。",
+)
+class AdminThrottleStatsView(generics.GenericAPIView):
+    """管理员限流统计接口"""
+    permission_classes = [IsStaffUser]
+
+    def get(self, request, *args, **kwargs):
+        metrics = throttle_metrics()
+        return Response([
+            {"scope": scope, "rate": rate, **metrics[scope]}
+            for scope, rate in settings.THROTTLE_RATES.items()
+        ])
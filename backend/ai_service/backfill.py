@@ -0,0 +1,188 @@
+"""
+Backfill AI-suggested tags for moments that have no tags yet.
+
+Untagged moments are streamed in id order (keyset pagination), grouped into
+multi-item prompts, and processed by a bounded thread pool behind a shared rate
+limiter. Tags are written back in bulk after each chunk, and the last processed
+id is checkpointed to a file so an interrupted run can resume where it stopped.
+The checkpoint never moves past a moment the model did not answer: a failed or
+incomplete batch stops the run there, so it is retried by the next run. A moment
+the model keeps leaving out while answering the rest of its chunk is skipped
+after ``AI_BACKFILL_MAX_ATTEMPTS`` runs, so one bad moment cannot block the backlog.
+"""
+import json
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from django.conf import settings
+
+from core.dfa_filter import gfw
+from moments.models import Moment
+from moments.tagging import attach_tags, normalize_tag_names
+
+from .services import AIService
+
+logger = logging.getLogger(__name__)
+
+
+class RateLimiter:
+    """Thread-safe limiter that spaces calls at least ``1 / rate`` seconds apart."""
+
+    def __init__(self, rate_per_second: float):
+        self.interval = 1.0 / rate_per_second if rate_per_second > 0 else 0.0
+        self._lock = threading.Lock()
+        self._next_slot = 0.0
+
+    def acquire(self):
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            wait = self._next_slot - now
+            self._next_slot = max(now, self._next_slot) + self.interval
+        if wait > 0:
+            time.sleep(wait)
+
+
+def default_checkpoint_path() -> Path:
+    return Path(settings.BASE_DIR) / ".tag_backfill_checkpoint"
+
+
+def load_checkpoint(path: Path) -> Dict:
+    try:
+        return json.loads(Path(path).read_text())
+    except (FileNotFoundError, ValueError):
+        return {"last_id": 0, "processed": 0, "tagged": 0, "skipped": 0, "attempts": {}}
+
+
+def save_checkpoint(path: Path, state: Dict):
+    path = Path(path)
+    tmp_path = path.with_suffix(".tmp")
+    tmp_path.write_text(json.dumps(state))
+    # 原子替换，避免中断时写出半个文件
+    tmp_path.replace(path)
+
+
+def iter_untagged_chunks(after_id: int, chunk_size: int):
+    """Yield lists of (id, content) for untagged, visible moments in id order."""
+    last_id = after_id
+    while True:
+        rows = list(
+            Moment.objects.filter(is_deleted=False, tags__isnull=True, id__gt=last_id)
+            .order_by("id")
+            .values_list("id", "content")[:chunk_size]
+        )
+        if not rows:
+            return
+        last_id = rows[-1][0]
+        yield rows
+
+
+def _clean_suggestions(tags: List[str]) -> List[str]:
+    """Normalize model output (models sometimes prefix a "#" anyway) and drop sensitive tags."""
+    names = normalize_tag_names(str(tag).strip().lstrip("#") for tag in tags)
+    return [tag for tag in names if not gfw.exists(tag)[0]]
+
+
+def run_tag_backfill(
+    chunk_size: int = None,
+    batch_size: int = None,
+    max_workers: int = None,
+    rate_limit: float = None,
+    max_chunks: Optional[int] = None,
+    max_attempts: Optional[int] = None,
+    checkpoint_path: Optional[Path] = None,
+    model_name: Optional[str] = None,
+    service: Optional[AIService] = None,
+    stdout=None,
+) -> Dict:
+    """
+    Run (or resume) the tag backfill. Returns the checkpoint state, with an extra
+    ``done`` flag telling whether the backlog has been exhausted and a ``failed``
+    flag telling whether the run stopped because the model did not answer.
+    """
+    chunk_size = chunk_size or settings.AI_BACKFILL_CHUNK_SIZE
+    batch_size = batch_size or settings.AI_BACKFILL_BATCH_SIZE
+    max_workers = max_workers or settings.AI_BACKFILL_MAX_WORKERS
+    rate_limit = settings.AI_BACKFILL_RATE_LIMIT if rate_limit is None else rate_limit
+    max_attempts = max_attempts or settings.AI_BACKFILL_MAX_ATTEMPTS
+    checkpoint_path = checkpoint_path or default_checkpoint_path()
+    service = service or AIService()
+    limiter = RateLimiter(rate_limit)
+
+    state = load_checkpoint(checkpoint_path)
+    state.setdefault("skipped", 0)
+    attempts = state.setdefault("attempts", {})
+    logger.info(f"[run_tag_backfill] Resuming after id {state['last_id']}")
+
+    def process_batch(batch: List[Tuple[int, str]]) -> Dict[int, List[str]]:
+        limiter.acquire()
+        return service.recommend_tags_batch(batch, model_name=model_name)
+
+    chunks_done = 0
+    done = True
+    failed = False
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for rows in iter_untagged_chunks(state["last_id"], chunk_size):
+            # 没有文字内容的动态无法做文本标签推荐，直接跳过
+            items = [(moment_id, content[:500]) for moment_id, content in rows if content and content.strip()]
+            batches = [items[i:i + batch_size] for i in range(0, len(items), batch_size)]
+
+            suggestions = {}
+            for result in executor.map(process_batch, batches):
+                suggestions.update(result)
+            moment_tags = {
+                moment_id: tags
+                for moment_id, tags in ((mid, _clean_suggestions(t)) for mid, t in suggestions.items())
+                if tags
+            }
+            attach_tags(moment_tags)
+
+            # 调用失败或模型漏答的动态之后不推进检查点，结束本次运行，下次从第一条未答复的动态重试
+            unanswered = [moment_id for moment_id, _ in items if moment_id not in suggestions]
+            if unanswered and suggestions:
+                # 模型答复了同一分块的其他动态，说明问题出在漏答的动态本身：累计次数，达到上限后跳过
+                # （整块都没有答复时视为模型不可用，不计次数）
+                for moment_id in unanswered:
+                    attempts[str(moment_id)] = attempts.get(str(moment_id), 0) + 1
+                given_up = {moment_id for moment_id in unanswered if attempts[str(moment_id)] >= max_attempts}
+                if given_up:
+                    state["skipped"] += len(given_up)
+                    unanswered = [moment_id for moment_id in unanswered if moment_id not in given_up]
+                    logger.warning(
+                        f"[run_tag_backfill] Skipping {len(given_up)} moment(s) unanswered "
+                        f"{max_attempts} times: {sorted(given_up)}"
+                    )
+            if unanswered:
+                failed = True
+                rows = [row for row in rows if row[0] < unanswered[0]]
+                logger.warning(
+                    f"[run_tag_backfill] {len(unanswered)} moment(s) got no answer, stopping before id {unanswered[0]}"
+                )
+
+            if rows:
+                state["last_id"] = rows[-1][0]
+            # 检查点之前的动态不会再被重试，丢弃它们的失败次数
+            attempts = state["attempts"] = {
+                moment_id: count for moment_id, count in attempts.items() if int(moment_id) > state["last_id"]
+            }
+            state["processed"] += len(rows)
+            state["tagged"] += len(moment_tags)
+            save_checkpoint(checkpoint_path, state)
+            if stdout:
+                stdout.write(
+                    f"  chunk up to id {state['last_id']}: {len(moment_tags)}/{len(rows)} tagged "
+                    f"(total {state['tagged']}/{state['processed']})"
+                )
+
+            chunks_done += 1
+            if failed or (max_chunks and chunks_done >= max_chunks):
+                done = False
+                break
+
+    logger.info(f"[run_tag_backfill] Finished {chunks_done} chunk(s): {state}")
+    return dict(state, done=done, failed=failed)
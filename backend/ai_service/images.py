@@ -0,0 +1,78 @@
+"""
+Image preprocessing for vision model requests.
+
+Uploaded photos are downscaled and re-encoded before being base64 encoded, so the
+payload sent to the model stays small regardless of the original upload size.
+"""
+import io
+import logging
+from typing import Optional, Tuple
+
+from django.conf import settings
+from PIL import Image as PILImage
+from PIL import ImageOps
+
+logger = logging.getLogger(__name__)
+
+# 推荐最大边长小于 AI_IMAGE_MAX_SIDE 的视觉模型（像素），更大的图片会被模型内部再次缩放，传输纯属浪费；
+# 其他模型使用 AI_IMAGE_MAX_SIDE
+MODEL_MAX_SIDE = {
+    "Qwen": 1280,
+    "step": 1024,
+}
+
+_FORMAT_MIME = {
+    "JPEG": "image/jpeg",
+    "WEBP": "image/webp",
+}
+
+
+def max_side_for_model(model_name: Optional[str]) -> int:
+    """Return the maximum image side length appropriate for the given model."""
+    if model_name:
+        for keyword, side in MODEL_MAX_SIDE.items():
+            if keyword.lower() in model_name.lower():
+                return min(side, settings.AI_IMAGE_MAX_SIDE)
+    return settings.AI_IMAGE_MAX_SIDE
+
+
+def preprocess_image(
+    image_file,
+    max_side: Optional[int] = None,
+    image_format: Optional[str] = None,
+    quality: Optional[int] = None,
+) -> Tuple[bytes, str]:
+    """
+    Downscale and re-encode an uploaded image.
+
+    The file is decoded lazily: only the header is parsed by ``Image.open`` and,
+    for JPEG sources, ``draft`` lets the decoder produce a reduced-scale image
+    directly instead of decoding every full-resolution pixel. EXIF metadata is
+    dropped (orientation is applied first so the picture stays upright).
+
+    Returns (encoded_bytes, mime_type).
+    """
+    max_side = max_side or settings.AI_IMAGE_MAX_SIDE
+    image_format = (image_format or settings.AI_IMAGE_FORMAT).upper()
+    if image_format not in _FORMAT_MIME:
+        image_format = "JPEG"
+    quality = quality or settings.AI_IMAGE_QUALITY
+
+    if hasattr(image_file, "seek"):
+        image_file.seek(0)
+
+    with PILImage.open(image_file) as img:
+        if img.width * img.height > settings.AI_IMAGE_MAX_PIXELS:
+            raise ValueError(f"image too large: {img.width}x{img.height}")
+        if img.format == "JPEG":
+            # 让 JPEG 解码器直接按 1/2、1/4、1/8 缩放解码，避免解出整张大图
+            img.draft("RGB", (max_side, max_side))
+        img = ImageOps.exif_transpose(img)
+        if img.mode not in ("RGB", "L"):
+            img = img.convert("RGB")
+        img.thumbnail((max_side, max_side), PILImage.LANCZOS)
+
+        buffer = io.BytesIO()
+        # 不传 exif 参数，重新编码后的图片不包含任何 EXIF 元数据
+        img.save(buffer, format=image_format, quality=quality, optimize=True)
+    return buffer.getvalue(), _FORMAT_MIME[image_format]
@@ -0,0 +1,68 @@
+"""
+为没有标签的历史动态批量生成 AI 推荐标签
+
+使用方式：
+    python manage.py backfill_tags                 # 从上次的断点继续
+    python manage.py backfill_tags --reset         # 清除断点，从头开始
+    python manage.py backfill_tags --async         # 交给 Celery 后台执行
+"""
+from pathlib import Path
+
+from django.core.management.base import BaseCommand
+
+from ai_service.backfill import default_checkpoint_path, run_tag_backfill
+from ai_service.tasks import backfill_moment_tags
+
+
+class Command(BaseCommand):
+    help = '为没有标签的动态批量生成 AI 推荐标签（支持断点续跑）'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, help='每次从数据库读取的动态数量')
+        parser.add_argument('--batch-size', type=int, help='每次请求模型时合并的动态数量')
+        parser.add_argument('--workers', type=int, help='并发请求模型的线程数')
+        parser.add_argument('--rate-limit', type=float, help='每秒最多请求模型的次数（0 表示不限制）')
+        parser.add_argument('--max-chunks', type=int, help='本次最多处理的分块数量')
+        parser.add_argument('--model', type=str, help='指定使用的模型')
+        parser.add_argument('--checkpoint', type=str, help='断点文件路径')
+        parser.add_argument('--reset', action='store_true', help='清除断点，从头开始')
+        parser.add_argument('--async', dest='run_async', action='store_true', help='交给 Celery 后台执行')
+
+    def handle(self, *args, **options):
+        checkpoint = Path(options['checkpoint']) if options.get('checkpoint') else default_checkpoint_path()
+        if options['reset'] and checkpoint.exists():
+            checkpoint.unlink()
+            self.stdout.write('  🧹 已清除断点')
+
+        params = {
+            'chunk_size': options.get('chunk_size'),
+            'batch_size': options.get('batch_size'),
+            'max_workers': options.get('workers'),
+            'rate_limit': options.get('rate_limit'),
+            'model_name': options.get('model'),
+            'checkpoint_path': str(checkpoint),
+        }
+
+        if options['run_async']:
+            backfill_moment_tags.delay(max_chunks=options.get('max_chunks') or 10, **params)
+            self.stdout.write(self.style.SUCCESS('✅ 已提交后台任务'))
+            return
+
+        self.stdout.write(self.style.NOTICE('🚀 开始补全动态标签...'))
+        state = run_tag_backfill(max_chunks=options.get('max_chunks'), stdout=self.stdout, **params)
+        if state['done']:
+            self.stdout.write(self.style.SUCCESS(
+                f"🎉 标签补全完成: 共处理 {state['processed']} 条，生成标签 {state['tagged']} 条"
+            ))
+        if state.get('skipped'):
+            self.stdout.write(self.style.WARNING(
+                f"⚠️ 共有 {state['skipped']} 条动态多次未获模型答复，已跳过（详见日志）"
+            ))
+        elif state['failed']:
+            self.stdout.write(self.style.WARNING(
+                f"⚠️ 模型调用失败，已停在 id {state['last_id']}，稍后再次执行命令可从此处重试"
+            ))
+        else:
+            self.stdout.write(self.style.WARNING(
+                f"⏸️ 已处理到 id {state['last_id']}，再次执行命令可继续"
+            ))
@@ -0,0 +1,146 @@
+"""
+Circuit breakers for upstream LLM calls.
+
+Each model gets its own breaker. Outcomes are tracked in a sliding time window;
+once the failure rate crosses the threshold the breaker opens and calls fail
+fast for ``open_seconds``. After that a single half-open probe is let through:
+success closes the breaker, failure opens it again.
+"""
+import logging
+import threading
+import time
+from collections import deque
+from typing import Dict
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+
+class CircuitBreaker:
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(
+        self,
+        name: str,
+        failure_rate: float = 0.5,
+        min_calls: int = 5,
+        window_seconds: float = 60,
+        open_seconds: float = 30,
+    ):
+        self.name = name
+        self.failure_rate = failure_rate
+        self.min_calls = min_calls
+        self.window_seconds = window_seconds
+        self.open_seconds = open_seconds
+        self._lock = threading.Lock()
+        self._outcomes = deque()  # (timestamp, succeeded)
+        self._state = self.CLOSED
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._current_state(time.monotonic())
+
+    def _current_state(self, now: float) -> str:
+        if self._state == self.OPEN and now - self._opened_at >= self.open_seconds:
+            self._state = self.HALF_OPEN
+            self._probe_in_flight = False
+        return self._state
+
+    def _trim(self, now: float):
+        while self._outcomes and now - self._outcomes[0][0] > self.window_seconds:
+            self._outcomes.popleft()
+
+    def _open(self, now: float):
+        self._state = self.OPEN
+        self._opened_at = now
+        self._probe_in_flight = False
+        self._outcomes.clear()
+        logger.warning(f"[CircuitBreaker] {self.name} opened for {self.open_seconds}s")
+
+    def allow_request(self) -> bool:
+        """Return True if a call may be attempted now (reserves the probe when half-open)."""
+        with self._lock:
+            state = self._current_state(time.monotonic())
+            if state == self.CLOSED:
+                return True
+            if state == self.HALF_OPEN and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            now = time.monotonic()
+            if self._current_state(now) == self.HALF_OPEN:
+                logger.info(f"[CircuitBreaker] {self.name} closed after successful probe")
+                self._state = self.CLOSED
+                self._probe_in_flight = False
+                self._outcomes.clear()
+                return
+            self._outcomes.append((now, True))
+            self._trim(now)
+
+    def record_failure(self):
+        with self._lock:
+            now = time.monotonic()
+            state = self._current_state(now)
+            if state == self.HALF_OPEN:
+                self._open(now)
+                return
+            if state == self.OPEN:
+                return
+            self._outcomes.append((now, False))
+            self._trim(now)
+            calls = len(self._outcomes)
+            failures = sum(1 for _, ok in self._outcomes if not ok)
+            if calls >= self.min_calls and failures / calls >= self.failure_rate:
+                self._open(now)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            now = time.monotonic()
+            self._trim(now)
+            calls = len(self._outcomes)
+            failures = sum(1 for _, ok in self._outcomes if not ok)
+            return {
+                "state": self._current_state(now),
+                "calls": calls,
+                "failures": failures,
+            }
+
+
+_breakers: Dict[str, CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+
+
+def get_breaker(name: str) -> CircuitBreaker:
+    """Return the process-wide circuit breaker for an upstream model."""
+    breaker = _breakers.get(name)
+    if breaker is None:
+        with _breakers_lock:
+            breaker = _breakers.get(name)
+            if breaker is None:
+                breaker = CircuitBreaker(
+                    name,
+                    failure_rate=settings.AI_BREAKER_FAILURE_RATE,
+                    min_calls=settings.AI_BREAKER_MIN_CALLS,
+                    window_seconds=settings.AI_BREAKER_WINDOW_SECONDS,
+                    open_seconds=settings.AI_BREAKER_OPEN_SECONDS,
+                )
+                _breakers[name] = breaker
+    return breaker
+
+
+def breaker_stats() -> Dict[str, Dict]:
+    return {name: breaker.stats() for name, breaker in list(_breakers.items())}
+
+
+def reset_breakers():
+    with _breakers_lock:
+        _breakers.clear()
@@ -1,13 +1,20 @@
+import json
 import logging
 import os
-from typing import Dict, List, Optional
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Dict, List, Optional, Tuple
 
+import httpx
 from django.conf import settings
 from langchain_core.output_parsers import JsonOutputParser
 from langchain_core.messages import HumanMessage, SystemMessage
 from pydantic import BaseModel, Field
 from langchain_openai import ChatOpenAI
 
+from .resilience import get_breaker
+
 logger = logging.getLogger(__name__)
 
 
@@ -16,6 +23,190 @@ class AIOutputSchema(BaseModel):
     suggested_tags: List[str] = Field(description="基于内容推荐的3-5个标签，每个标签不超过10个字符")
 
 
+# ========== 进程级 LLM 客户端池 ==========
+# 按 (模型, 超时, base_url, 代理, api_key) 复用 ChatOpenAI 及其底层 httpx 连接池，
+# 避免每次请求都重新建立 TCP/TLS 连接。
+_llm_clients: Dict[Tuple, ChatOpenAI] = {}
+_http_clients: Dict[Tuple, httpx.Client] = {}
+_clients_lock = threading.Lock()
+_client_stats = {
+    "clients_created": 0,
+    "clients_reused": 0,
+    "http_requests": 0,
+    "connections_opened": 0,
+}
+_stats_lock = threading.Lock()
+
+# 上游调用在独立线程池中执行，请求线程最多等待预算时间，超时即降级返回
+_llm_executor = ThreadPoolExecutor(
+    max_workers=settings.AI_MAX_CONCURRENT_CALLS, thread_name_prefix="llm-call"
+)
+
+
+def _incr_stat(name: str, amount: int = 1):
+    with _stats_lock:
+        _client_stats[name] += amount
+
+
+def _trace_connections(event_name: str, info: dict):
+    """httpcore trace callback: count newly opened TCP connections."""
+    if event_name == "connection.connect_tcp.complete":
+        _incr_stat("connections_opened")
+
+
+def _on_http_request(request: httpx.Request):
+    _incr_stat("http_requests")
+    request.extensions["trace"] = _trace_connections
+
+
+def _build_http_client(timeout: int, proxy: Optional[str]) -> httpx.Client:
+    """Create an httpx client with keep-alive connection pooling."""
+    limits = httpx.Limits(
+        max_connections=settings.AI_HTTP_MAX_CONNECTIONS,
+        max_keepalive_connections=settings.AI_HTTP_MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry=settings.AI_HTTP_KEEPALIVE_EXPIRY,
+    )
+    return httpx.Client(
+        proxy=proxy or None,
+        limits=limits,
+        timeout=timeout,
+        event_hooks={"request": [_on_http_request]},
+    )
+
+
+def get_pooled_llm(
+    model_name: str,
+    timeout: int,
+    api_key: str,
+    base_url: Optional[str] = None,
+    proxy: Optional[str] = None,
+) -> ChatOpenAI:
+    """
+    Return a process-wide ChatOpenAI client for the given settings.
+    Clients (and their HTTP connection pools) are created once and reused.
+    """
+    key = (model_name, timeout, base_url, proxy, api_key)
+    llm = _llm_clients.get(key)
+    if llm is not None:
+        _incr_stat("clients_reused")
+        if logger.isEnabledFor(logging.DEBUG):
+            with _stats_lock:
+                requests_count = _client_stats["http_requests"]
+                opened = _client_stats["connections_opened"]
+            logger.debug(
+                f"[get_pooled_llm] Reusing client for {model_name} "
+                f"(http_requests={requests_count}, connections_opened={opened})"
+            )
+        return llm
+
+    with _clients_lock:
+        llm = _llm_clients.get(key)
+        if llm is not None:
+            _incr_stat("clients_reused")
+            return llm
+        http_key = (timeout, proxy)
+        http_client = _http_clients.get(http_key)
+        if http_client is None:
+            http_client = _build_http_client(timeout, proxy)
+            _http_clients[http_key] = http_client
+        llm = ChatOpenAI(
+            openai_api_key=api_key,
+            openai_api_base=base_url,
+            model_name=model_name,
+            temperature=0.7,
+            request_timeout=timeout,
+            http_client=http_client,
+        )
+        _llm_clients[key] = llm
+        _incr_stat("clients_created")
+        logger.info(f"[get_pooled_llm] Created pooled client for {model_name}, timeout: {timeout}s")
+        return llm
+
+
+def get_client_stats() -> Dict:
+    """Snapshot of client pool metrics, including the connection reuse ratio."""
+    with _stats_lock:
+        stats = dict(_client_stats)
+    with _clients_lock:
+        stats["pooled_clients"] = len(_llm_clients)
+    requests_count = stats["http_requests"]
+    reused = max(requests_count - stats["connections_opened"], 0)
+    stats["connections_reused"] = reused
+    stats["connection_reuse_ratio"] = round(reused / requests_count, 4) if requests_count else 0.0
+    return stats
+
+
+def reset_llm_clients():
+    """Close all pooled HTTP connections and clear the registry (tests / shutdown)."""
+    with _clients_lock:
+        for http_client in _http_clients.values():
+            try:
+                http_client.close()
+            except Exception:
+                pass
+        _http_clients.clear()
+        _llm_clients.clear()
+    with _stats_lock:
+        for name in _client_stats:
+            _client_stats[name] = 0
+
+
+def warmup_llm_clients(models: Optional[List[str]] = None) -> int:
+    """
+    Pre-build pooled clients at worker start so the first user request does not
+    pay for client construction. When AI_BASE_URL is set, a lightweight HEAD
+    request is issued to open a keep-alive connection ahead of time.
+    Returns the number of clients warmed up.
+    """
+    service = AIService()
+    if not service.api_key:
+        logger.info("[warmup_llm_clients] AI_API_KEY not set, skipping warmup")
+        return 0
+
+    models = models or settings.AI_WARMUP_MODELS or [service.model_name]
+    warmed = 0
+    for model in models:
+        llm = service.get_llm(model_name=model)
+        if llm is None:
+            continue
+        warmed += 1
+        if service.base_url and llm.http_client is not None:
+            try:
+                llm.http_client.head(service.base_url)
+            except Exception as e:
+                logger.warning(f"[warmup_llm_clients] Connection warmup failed for {model}: {e}")
+    logger.info(f"[warmup_llm_clients] Warmed up {warmed} client(s): {get_client_stats()}")
+    return warmed
+
+
+class _Attempt:
+    """
+    One upstream call. Its outcome is recorded on the breaker exactly once: by
+    invoke_with_fallback when it sees the result or gives up on the budget, or by
+    the future's done callback when the call finishes after nobody is waiting.
+    Otherwise an abandoned half-open probe would keep its breaker rejecting forever.
+    """
+
+    def __init__(self, model: str, breaker):
+        self.model = model
+        self.breaker = breaker
+        self._lock = threading.Lock()
+        self._recorded = False
+
+    def record(self, succeeded: bool):
+        with self._lock:
+            if self._recorded:
+                return
+            self._recorded = True
+        if succeeded:
+            self.breaker.record_success()
+        else:
+            self.breaker.record_failure()
+
+    def on_done(self, future):
+        self.record(not future.cancelled() and future.exception() is None)
+
+
 class AIService:
     """
     Service for AI interactions using LangChain.
@@ -77,35 +268,32 @@ class AIService:
             # Common arguments for ChatOpenAI
             # Note: For ZhipuAI, use base_url="https://open.bigmodel.cn/api/paas/v4/"
             # and model_name="glm-4" (or similar).
-            logger.info(f"[get_llm] Initializing ChatOpenAI with model: {target_model}, timeout: {timeout}s")
-            llm = ChatOpenAI(
-                openai_api_key=self.api_key,
-                openai_api_base=self.base_url,
+            # Clients are pooled per process so connections are kept alive between requests.
+            return get_pooled_llm(
                 model_name=target_model,
-                openai_proxy=self.openai_proxy,
-                temperature=0.7,
-                request_timeout=timeout,
+                timeout=timeout,
+                api_key=self.api_key,
+                base_url=self.base_url,
+                proxy=self.openai_proxy,
             )
-            logger.info(f"[get_llm] ChatOpenAI initialized successfully")
-            return llm
         except Exception as e:
             logger.error(f"[get_llm] Failed to initialize LLM with model {target_model}: {e}", exc_info=True)
             return None
 
-    def process_content(self, text: str, image_data: str = None, model_name: str = None) -> Dict:
+    def process_content(
+        self, text: str, image_data: str = None, model_name: str = None, image_mime: str = None
+    ) -> Dict:
         """
         Process user text (and optional image) to generate polished content and tags.
         Returns a dict with 'polished_content' and 'suggested_tags'.
         """
         logger.info(f"[process_content] Starting - model: {model_name}, text_length: {len(text) if text else 0}, has_image: {bool(image_data)}")
 
-        llm = self.get_llm(model_name=model_name, image_data=image_data)
-
         # Log effective model name
         effective_model = model_name or self.model_name
         logger.info(f"[process_content] Effective model: {effective_model}")
 
-        if not llm:
+        if not self.api_key:
             logger.error("[process_content] LLM initialization failed, returning fallback")
             return self._fallback_response(text)
 
@@ -134,7 +322,7 @@ class AIService:
                 user_content.append({
                     "type": "image_url",
                     "image_url": {
-                        "url": f"data:image/jpeg;base64,{image_data}"
+                        "url": f"data:{image_mime or 'image/jpeg'};base64,{image_data}"
                     }
                 })
 
@@ -149,30 +337,16 @@ class AIService:
                 HumanMessage(content=user_content)
             ]
 
-            # Invoke LLM
+            # Invoke LLM (circuit breaker + hedged backup models)
             logger.info(f"[process_content] Invoking LLM with model: {effective_model}, has_image: {bool(image_data)}")
-            response = llm.invoke(messages)
+            response = self.invoke_with_fallback(messages, model_name=model_name, image_data=image_data)
+            if response is None:
+                return self._fallback_response(text)
             logger.info(f"[process_content] LLM Response received, length: {len(response.content)}")
             logger.debug(f"[process_content] Raw response: {response.content[:500]}...")  # Log first 500 chars
             
             # Parse result
-            content = response.content
-            # Cleanup potential markdown formatting if model wraps JSON in ```json ... ```
-            if "```json" in content:
-                content = content.split("```json")[1].split("```")[0].strip()
-            elif "```" in content:
-                content = content.split("```")[0].strip()
-            
-            # Special handling for GLM-4/SiliconFlow output artifacts
-            if "<|begin_of_box|>" in content:
-                content = content.replace("<|begin_of_box|>", "").replace("<|end_of_box|>", "").strip()
-            
-            # Remove any leading/trailing characters that are not part of JSON object
-            content = content.strip()
-            if not content.startswith("{") and "{" in content:
-                content = content[content.find("{"):]
-            if not content.endswith("}") and "}" in content:
-                content = content[:content.rfind("}")+1]
+            content = self._clean_json_output(response.content)
 
             return parser.parse(content)
 
@@ -180,6 +354,152 @@ class AIService:
             logger.error(f"[process_content] AI processing failed: {e}", exc_info=True)
             return self._fallback_response(text)
 
+    def recommend_tags_batch(self, items: List[Tuple[int, str]], model_name: str = None) -> Dict[int, List[str]]:
+        """
+        Recommend tags for several text items in a single prompt.
+        ``items`` is a list of (id, text). Returns {id: [tags]} for the items the
+        model answered; items missing from the response (or a failed call) are
+        simply absent, so callers never persist fallback tags.
+        """
+        if not items:
+            return {}
+
+        if not self.api_key:
+            logger.error("[recommend_tags_batch] LLM initialization failed")
+            return {}
+
+        system_prompt = (
+            "你是一个专业的社交媒体运营助手。\n"
+            "下面有多条用户动态，每条带有一个 id。请为每条动态推荐3-5个相关标签，"
+            "不要带#号，每个标签不超过10个字符。\n\n"
+            "请严格按照以下JSON格式输出，不要包含Markdown代码块标记：\n"
+            '{"results": [{"id": 1, "tags": ["标签1", "标签2", "标签3"]}]}\n'
+        )
+        user_text = "\n".join(f"[id={item_id}] {text}" for item_id, text in items)
+        messages = [
+            SystemMessage(content=system_prompt),
+            HumanMessage(content=user_text),
+        ]
+
+        try:
+            logger.info(f"[recommend_tags_batch] Invoking LLM for {len(items)} item(s)")
+            # 后台批处理没有用户在等待，使用完整的请求超时作为预算
+            response = self.invoke_with_fallback(messages, model_name=model_name, budget=self.request_timeout)
+            if response is None:
+                return {}
+            data = json.loads(self._clean_json_output(response.content))
+        except Exception as e:
+            logger.error(f"[recommend_tags_batch] AI processing failed: {e}", exc_info=True)
+            return {}
+
+        valid_ids = {item_id for item_id, _ in items}
+        results = {}
+        for entry in data.get("results", []) if isinstance(data, dict) else []:
+            try:
+                item_id = int(entry.get("id"))
+            except (TypeError, ValueError, AttributeError):
+                continue
+            tags = entry.get("tags") or []
+            if item_id in valid_ids and isinstance(tags, list):
+                results[item_id] = [str(tag) for tag in tags][:5]
+        logger.info(f"[recommend_tags_batch] Received tags for {len(results)}/{len(items)} item(s)")
+        return results
+
+    def _candidate_llms(self, model_name: str = None, image_data: str = None) -> List[ChatOpenAI]:
+        """Primary model followed by configured backups, de-duplicated by effective model."""
+        candidates = []
+        seen = set()
+        for name in [model_name or self.model_name] + list(settings.AI_BACKUP_MODELS):
+            llm = self.get_llm(model_name=name, image_data=image_data)
+            if llm is not None and llm.model_name not in seen:
+                seen.add(llm.model_name)
+                candidates.append(llm)
+        return candidates
+
+    def invoke_with_fallback(
+        self, messages: List, model_name: str = None, image_data: str = None, budget: float = None
+    ):
+        """
+        Invoke the LLM within a time budget, guarded by per-model circuit breakers.
+
+        The primary model is called first. If it fails, or has not answered after
+        AI_HEDGE_DELAY seconds, the next backup model whose breaker allows it is
+        started in parallel, and the first successful response wins. Models with
+        an open breaker are skipped, so while the upstream is unhealthy this
+        returns None in milliseconds instead of waiting for the full timeout.
+        Each call's HTTP timeout is capped by the remaining budget, and calls that
+        lose the race still report their outcome to their breaker when they finish.
+        Returns the LLM response, or None if every attempt failed.
+        """
+        budget = budget or settings.AI_REQUEST_BUDGET
+        deadline = time.monotonic() + budget
+        candidates = self._candidate_llms(model_name=model_name, image_data=image_data)
+        pending = {}  # future -> _Attempt
+
+        def launch_next() -> bool:
+            while candidates:
+                llm = candidates.pop(0)
+                breaker = get_breaker(llm.model_name)
+                if not breaker.allow_request():
+                    logger.warning(f"[invoke_with_fallback] Circuit open for {llm.model_name}, skipping")
+                    continue
+                logger.info(f"[invoke_with_fallback] Calling {llm.model_name}")
+                attempt = _Attempt(llm.model_name, breaker)
+                timeout = max(deadline - time.monotonic(), 1)
+                future = _llm_executor.submit(llm.invoke, messages, timeout=timeout)
+                future.add_done_callback(attempt.on_done)
+                pending[future] = attempt
+                return True
+            return False
+
+        launch_next()
+        while pending:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            timeout = min(settings.AI_HEDGE_DELAY, remaining) if candidates else remaining
+            done, _ = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+            for future in done:
+                attempt = pending.pop(future)
+                try:
+                    response = future.result()
+                except Exception as e:
+                    attempt.record(False)
+                    logger.error(f"[invoke_with_fallback] {attempt.model} failed: {e}")
+                    continue
+                attempt.record(True)
+                # 仍在进行的对冲调用不再等待，结束时由回调把结果记到各自的熔断器
+                return response
+            # 走到这里说明主调用超过对冲等待时间仍未返回，或有调用失败：启动下一个备用模型
+            launch_next()
+
+        for future, attempt in pending.items():
+            future.cancel()
+            attempt.record(False)
+            logger.error(f"[invoke_with_fallback] {attempt.model} exceeded {budget}s budget")
+        return None
+
+    @staticmethod
+    def _clean_json_output(content: str) -> str:
+        """Strip markdown fences and model-specific artifacts around a JSON object."""
+        # Cleanup potential markdown formatting if model wraps JSON in ```json ... ```
+        if "```json" in content:
+            content = content.split("```json")[1].split("```")[0].strip()
+        elif "```" in content:
+            content = content.split("```")[0].strip()
+
+        # Special handling for GLM-4/SiliconFlow output artifacts
+        if "<|begin_of_box|>" in content:
+            content = content.replace("<|begin_of_box|>", "").replace("<|end_of_box|>", "").strip()
+
+        # Remove any leading/trailing characters that are not part of JSON object
+        content = content.strip()
+        if not content.startswith("{") and "{" in content:
+            content = content[content.find("{"):]
+        if not content.endswith("}") and "}" in content:
+            content = content[:content.rfind("}")+1]
+        return content
+
     def _fallback_response(self, text: str) -> Dict:
         """Return a safe fallback response when AI fails."""
         return {
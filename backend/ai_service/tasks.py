@@ -0,0 +1,34 @@
+import logging
+
+from celery import shared_task
+from django.conf import settings
+
+from .backfill import run_tag_backfill
+
+logger = logging.getLogger(__name__)
+
+
+@shared_task
+def backfill_moment_tags(max_chunks: int = 10, failed_runs: int = 0, **options):
+    """
+    Backfill AI tags for untagged moments. Each run handles at most ``max_chunks``
+    chunks and re-enqueues itself, so a large backlog never monopolizes a worker.
+    When the model stops answering, the next run waits for the circuit breaker to
+    reopen instead of retrying immediately; after ``AI_BACKFILL_MAX_FAILED_RUNS``
+    failed runs in a row the chain stops and needs to be restarted by hand.
+    """
+    state = run_tag_backfill(max_chunks=max_chunks, **options)
+    if state["done"]:
+        return state
+    failed_runs = failed_runs + 1 if state["failed"] else 0
+    if failed_runs >= settings.AI_BACKFILL_MAX_FAILED_RUNS:
+        logger.error(
+            f"[backfill_moment_tags] Giving up after {failed_runs} failed runs in a row, "
+            f"stopped before id {state['last_id']}"
+        )
+        return state
+    countdown = settings.AI_BREAKER_OPEN_SECONDS if state["failed"] else None
+    backfill_moment_tags.apply_async(
+        kwargs=dict(options, max_chunks=max_chunks, failed_runs=failed_runs), countdown=countdown
+    )
+    return state
@@ -3,6 +3,7 @@ from drf_spectacular.utils import extend_schema, OpenApiExample
 from rest_framework import generics, permissions
 from rest_framework.response import Response
 
+from .images import max_side_for_model, preprocess_image
 from .services import AIService
 from .serializers import PolishSerializer, TagRecommendSerializer, AIResultSerializer
 
@@ -11,20 +12,28 @@ import logging
 
 logger = logging.getLogger(__name__)
 
-def _process_image(image_file):
-    """Process uploaded image file to base64 string"""
+def _process_image(image_file, model_name=None):
+    """Downscale and re-encode uploaded image, then encode to base64 string.
+
+    Returns (base64_string, mime_type), or (None, None) if no image / processing failed.
+    """
     if not image_file:
-        return None
+        return None, None
     try:
-        # Read file content
-        image_content = image_file.read()
-        logger.info(f"Processing image: size={len(image_content)} bytes, name={getattr(image_file, 'name', 'unknown')}")
+        original_size = getattr(image_file, "size", None)
+        image_content, mime_type = preprocess_image(
+            image_file, max_side=max_side_for_model(model_name)
+        )
+        logger.info(
+            f"Processing image: name={getattr(image_file, 'name', 'unknown')}, "
+            f"original={original_size} bytes, processed={len(image_content)} bytes, mime={mime_type}"
+        )
         # Encode to base64
         base64_encoded = base64.b64encode(image_content).decode('utf-8')
-        return base64_encoded
+        return base64_encoded, mime_type
     except Exception as e:
         logger.error(f"Image processing failed: {e}")
-        return None
+        return None, None
 
 
 @extend_schema(
@@ -55,12 +64,13 @@ class PolishView(generics.GenericAPIView):
         service = AIService()
         
         # Process image if present
-        image_data = _process_image(data.get("image"))
+        image_data, image_mime = _process_image(data.get("image"), model_name=data.get("model"))
         
         result = service.process_content(
             text=data.get("text", ""),
             image_data=image_data,
-            model_name=data.get("model")
+            model_name=data.get("model"),
+            image_mime=image_mime,
         )
         return Response(result)
 
@@ -93,12 +103,13 @@ class TagRecommendView(generics.GenericAPIView):
         service = AIService()
         
         # Process image if present
-        image_data = _process_image(data.get("image"))
+        image_data, image_mime = _process_image(data.get("image"))
         
         # Reuse process_content but only return tags
         result = service.process_content(
             text=data.get("text", ""),
-            image_data=image_data
+            image_data=image_data,
+            image_mime=image_mime,
         )
         
         tags = result.get("suggested_tags", [])
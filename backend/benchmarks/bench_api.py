@@ -0,0 +1,219 @@
+#!/usr/bin/env python
+"""
+热点接口基准测试：在独立的测试数据库中按规模生成数据，逐个场景重复请求，
+报告 p50/p99 延迟和 SQL 次数，并与 benchmarks/baseline.json 对比，出现退化时以非零状态退出。
+
+用法:
+    python benchmarks/bench_api.py                         # scale=1000（约 13 万行），与基线对比
+    python benchmarks/bench_api.py --scale 10000           # 约 130 万行
+    python benchmarks/bench_api.py --only feed search      # 只跑部分场景
+    python benchmarks/bench_api.py --save-baseline         # 用本次结果覆盖基线
+    python benchmarks/bench_api.py --keepdb                # 复用上次生成的数据（非 SQLite 数据库）
+
+说明:
+- 每次请求前清空缓存，测量的是缓存未命中时的开销（--warm 保留缓存）
+- Celery 任务以 eager 模式在进程内执行，不需要消息队列；发布场景只发布文字动态，不触发媒体任务；
+  搜索日志在计时期间只缓冲，结束后再写入
+- SQL 次数是确定的，超过基线即视为退化；p50 延迟允许 --tolerance 比例和 --min-delta-ms 的波动
+"""
+import argparse
+import copy
+import json
+import math
+import os
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import django
+
+# 设置 Django 环境
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'moments_share.settings')
+django.setup()
+
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import Count
+from django.test.utils import (
+    override_settings,
+    setup_databases,
+    setup_test_environment,
+    teardown_databases,
+    teardown_test_environment,
+)
+from rest_framework.test import APIClient
+
+from core import datagen
+from core.profiling import Profile
+from interactions.models import Comment
+from moments import search_log
+from moments_share.celery import app as celery_app
+
+BASELINE_PATH = Path(__file__).with_name("baseline.json")
+
+
+def scenarios(hot_user, hot_moment_id):
+    """(场景名, 方法, 路径, 请求体, 请求用户)"""
+    admin = copy.copy(hot_user)
+    admin.is_staff = True
+    return [
+        ("feed", "get", "/api/v1/moments/feed/", None, hot_user),
+        ("search", "get", "/api/v1/moments/search/?keyword=咖啡", None, hot_user),
+        ("search_label", "get", "/api/v1/moments/search/?label=旅行", None, hot_user),
+        ("suggestions", "get", "/api/v1/moments/search/suggestions/?q=ka", None, hot_user),
+        ("hot_search", "get", "/api/v1/moments/search/hot/", None, hot_user),
+        ("conversations", "get", "/api/v1/interactions/messages/conversations/", None, hot_user),
+        ("comment_tree", "get", f"/api/v1/moments/{hot_moment_id}/comments/", None, hot_user),
+        ("admin_stats", "get", "/api/v1/admin/stats/", None, admin),
+        # 发布会新增数据，放在最后
+        ("publish", "post", "/api/v1/moments/",
+         {"content": "基准测试发布的动态", "type": "IMAGE", "labels": ["天气", "旅行"]}, hot_user),
+    ]
+
+
+def percentile(samples, p):
+    """最近秩法计算百分位数"""
+    ordered = sorted(samples)
+    return ordered[max(math.ceil(p / 100 * len(ordered)) - 1, 0)]
+
+
+def run_scenario(method, path, data, user, iterations, warm):
+    client = APIClient()
+    client.force_authenticate(user)
+    timings, queries = [], []
+    # 第一次请求用于预热（导入、编译正则、建立索引等），不计入结果
+    for i in range(iterations + 1):
+        if not warm:
+            cache.clear()
+        # 用 execute_wrapper 计数，connection.queries 只保留最近 9000 条，长时间运行后会计数为 0
+        profile = Profile(record_sql=False)
+        with connection.execute_wrapper(profile):
+            start = time.perf_counter()
+            response = getattr(client, method)(path, data, format="json")
+            elapsed = time.perf_counter() - start
+        if response.status_code >= 400:
+            raise RuntimeError(f"{method.upper()} {path} -> {response.status_code}: {response.content[:200]}")
+        if i:
+            timings.append(elapsed * 1000)
+            queries.append(profile.queries)
+    return {
+        "p50_ms": round(statistics.median(timings), 2),
+        "p99_ms": round(percentile(timings, 99), 2),
+        "queries": max(queries),
+    }
+
+
+def ensure_data(scale, seed):
+    if datagen.bench_users().count() == scale:
+        print(f"复用已有数据（scale={scale}）")
+        return
+    datagen.clear()
+    start = time.perf_counter()
+    counts = datagen.generate(scale, seed=seed, log=lambda message: print(f"  {message}"))
+    print(f"生成约 {sum(counts.values()):,} 行数据，耗时 {time.perf_counter() - start:.1f}s")
+
+
+def compare(results, baseline, tolerance, min_delta_ms):
+    """返回退化描述列表"""
+    regressions = []
+    for name, result in results.items():
+        base = baseline.get(name)
+        if not base:
+            continue
+        if result["queries"] > base["queries"]:
+            regressions.append(f"{name}: queries {base['queries']} -> {result['queries']}")
+        # p99 在几十次采样下接近最大值，受机器负载影响大，只报告不判定
+        limit = max(base["p50_ms"] * (1 + tolerance), base["p50_ms"] + min_delta_ms)
+        if result["p50_ms"] > limit:
+            regressions.append(f"{name}: p50_ms {base['p50_ms']} -> {result['p50_ms']} (limit {limit:.2f})")
+    return regressions
+
+
+def report(results, baseline):
+    print("=" * 78)
+    print(f"{'scenario':<16} {'p50 ms':>10} {'p99 ms':>10} {'queries':>8}   {'baseline p50/p99/queries':>28}")
+    print("-" * 78)
+    for name, r in results.items():
+        base = baseline.get(name)
+        base_text = f"{base['p50_ms']}/{base['p99_ms']}/{base['queries']}" if base else "-"
+        print(f"{name:<16} {r['p50_ms']:>10.2f} {r['p99_ms']:>10.2f} {r['queries']:>8}   {base_text:>28}")
+    print("=" * 78)
+
+
+def run(args):
+    stored = json.loads(BASELINE_PATH.read_text()) if BASELINE_PATH.exists() else {}
+    if stored and stored.get("scale") != args.scale:
+        print(f"⚠️ 基线的 scale 为 {stored.get('scale')}，与本次的 {args.scale} 不同，跳过对比")
+        stored = {}
+    baseline = stored.get("scenarios", {})
+
+    ensure_data(args.scale, args.seed)
+    hot_user = datagen.bench_users().order_by("id").first()
+    hot_moment_id = (
+        Comment.objects.values("moment_id").annotate(n=Count("id")).order_by("-n").first()["moment_id"]
+    )
+
+    results = {}
+    for name, method, path, data, user in scenarios(hot_user, hot_moment_id):
+        if args.only and name not in args.only:
+            continue
+        results[name] = run_scenario(method, path, data, user, args.iterations, args.warm)
+        print(f"  {name}: p50 {results[name]['p50_ms']:.2f} ms, {results[name]['queries']} queries")
+
+    report(results, baseline)
+    if args.save_baseline:
+        scenarios_data = {**baseline, **results} if args.only else results
+        BASELINE_PATH.write_text(json.dumps(
+            {"scale": args.scale, "iterations": args.iterations, "scenarios": scenarios_data},
+            ensure_ascii=False, indent=2,
+        ) + "\n")
+        print(f"基线已写入 {BASELINE_PATH}")
+        return 0
+
+    regressions = compare(results, baseline, args.tolerance, args.min_delta_ms)
+    for line in regressions:
+        print(f"❌ {line}")
+    if not regressions:
+        print("✅ 未发现退化" if baseline else "没有可对比的基线，使用 --save-baseline 生成")
+    return 1 if regressions else 0
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--scale", type=int, default=1000, help="生成的用户数，其他数据按比例放大")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--iterations", type=int, default=20, help="每个场景计时的请求次数")
+    parser.add_argument("--only", nargs="+", help="只运行指定的场景")
+    parser.add_argument("--warm", action="store_true", help="请求之间不清空缓存")
+    parser.add_argument("--tolerance", type=float, default=0.5, help="允许的 p50 延迟增长比例")
+    parser.add_argument("--min-delta-ms", type=float, default=5, help="允许的最小 p50 延迟增长（毫秒）")
+    parser.add_argument("--save-baseline", action="store_true", help="把本次结果保存为基线")
+    parser.add_argument("--keepdb", action="store_true", help="保留测试数据库供下次复用")
+    args = parser.parse_args()
+
+    setup_test_environment()
+    old_config = setup_databases(verbosity=0, interactive=False, keepdb=args.keepdb)
+    celery_app.conf.task_always_eager = True
+    try:
+        # 搜索日志在计时期间只缓冲不写入，避免后台写入被算进某次搜索请求
+        with tempfile.TemporaryDirectory() as media_root, override_settings(
+            MEDIA_ROOT=media_root,
+            PROFILING_SAMPLE_RATE=0,
+            SEARCH_LOG_BUFFER_SIZE=sys.maxsize,
+            SEARCH_LOG_FLUSH_INTERVAL=sys.maxsize,
+        ):
+            try:
+                status = run(args)
+            finally:
+                search_log.flush()
+    finally:
+        teardown_databases(old_config, verbosity=0, keepdb=args.keepdb)
+        teardown_test_environment()
+    sys.exit(status)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,227 @@
+#!/usr/bin/env python
+"""
+纯 CPU 热点函数的微基准测试：moments.utils.match_pinyin 与 core.dfa_filter.DFAFilter.exists
+
+每个目标函数在不同长度的中文语料（短句 / 段落 / 长文）和最坏输入上运行，报告每秒调用次数
+和单次调用的内存分配峰值，并与 benchmarks/microbench_baseline.json 对比，退化时以非零状态退出。
+
+用法:
+    python benchmarks/microbench.py                            # 与基线对比
+    python benchmarks/microbench.py --only dfa_exists          # 只测部分目标
+    python benchmarks/microbench.py --save-baseline            # 用本次结果覆盖基线
+    # 对比候选实现：在同样的用例上计时，并校验返回值与当前实现一致
+    python benchmarks/microbench.py --impl match_pinyin=moments.pinyin_v2:match_pinyin
+"""
+import argparse
+import importlib
+import json
+import os
+import random
+import sys
+import timeit
+import tracemalloc
+from pathlib import Path
+from typing import Callable, Dict, List, NamedTuple, Tuple
+
+import django
+
+# 设置 Django 环境
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'moments_share.settings')
+django.setup()
+
+from core.dfa_filter import gfw
+from moments.utils import match_pinyin
+
+BASELINE_PATH = Path(__file__).with_name("microbench_baseline.json")
+
+# 动态正文风格的语料，按需拼接成不同长度的文本
+CORPUS = [
+    "今天天气真不错，出来散散心", "终于下班了，需要大餐犒劳一下", "路边的猫咪好可爱，忍不住拍了一张",
+    "周末去爬山，风景独好，推荐大家也去", "打卡一家网红店，味道一般，但是拍照很好看",
+    "生活不仅有眼前的苟且，还有诗和远方", "熬夜写代码，这就是程序员的浪漫吗", "新买的咖啡机到了，自己在家做拿铁",
+    "今天学会了一道新菜，成就感满满", "公司团建去了海边，玩得很开心", "读完了一本好书，强烈推荐给大家",
+    "健身房打卡第三十天，坚持就是胜利", "和老朋友见面，聊了一下午", "看了场电影，剧情很感人",
+]
+LENGTHS = {"short": 12, "paragraph": 100, "article": 1000}
+
+
+class Case(NamedTuple):
+    name: str
+    args: Tuple
+
+
+class Target(NamedTuple):
+    func: Callable
+    cases: List[Case]
+
+
+def corpus_text(length: int, seed: int = 0) -> str:
+    rng = random.Random(seed)
+    parts, size = [], 0
+    while size < length:
+        sentence = rng.choice(CORPUS)
+        parts.append(sentence)
+        size += len(sentence) + 1
+    return "。".join(parts)[:length]
+
+
+def pinyin_cases() -> List[Case]:
+    cases = []
+    for label, length in LENGTHS.items():
+        text = corpus_text(length)
+        cases += [
+            Case(f"{label}/hanzi_hit", ("天气" if "天气" in text else text[2:4], text)),
+            Case(f"{label}/pinyin_hit", ("kafei", text + "咖啡")),
+            Case(f"{label}/initials_hit", ("kf", text + "咖啡")),
+            # 不命中时会走完分词和滑动窗口的全部分支
+            Case(f"{label}/miss", ("zzzzzzzz", text)),
+        ]
+    return cases
+
+
+def dfa_worst_prefix(chains: dict) -> str:
+    """词库中最长的、途中没有完整敏感词的前缀：重复它时每个起点都要走到最深处才失败"""
+    best, stack = "", [("", chains)]
+    while stack:
+        prefix, node = stack.pop()
+        if len(prefix) > len(best):
+            best = prefix
+        for char, child in node.items():
+            if char != gfw.delimit and isinstance(child, dict) and gfw.delimit not in child:
+                stack.append((prefix + char, child))
+    return best
+
+
+def dfa_shortest_keyword(chains: dict) -> str:
+    """词库中最短的一个敏感词，拼在正文末尾作为命中用例"""
+    queue = [("", chains)]
+    while queue:
+        prefix, node = queue.pop(0)
+        if prefix and gfw.delimit in node:
+            return prefix
+        queue += [(prefix + char, child) for char, child in sorted(node.items()) if char != gfw.delimit]
+    return ""
+
+
+def dfa_cases() -> List[Case]:
+    keyword = dfa_shortest_keyword(gfw.keyword_chains)
+    cases = []
+    for label, length in LENGTHS.items():
+        text = corpus_text(length)
+        cases += [
+            Case(f"{label}/clean", (text,)),
+            Case(f"{label}/hit_at_end", (text + keyword,)),
+        ]
+    prefix = dfa_worst_prefix(gfw.keyword_chains) or "a"
+    for label, length in LENGTHS.items():
+        cases.append(Case(f"{label}/worst_case", ((prefix * (length // len(prefix) + 1))[:length],)))
+    return cases
+
+
+TARGETS: Dict[str, Callable[[], Target]] = {
+    "match_pinyin": lambda: Target(match_pinyin, pinyin_cases()),
+    "dfa_exists": lambda: Target(gfw.exists, dfa_cases()),
+}
+
+
+def load_callable(spec: str) -> Callable:
+    """"package.module:attr.path" 形式的函数路径，例如 core.dfa_filter:gfw.exists"""
+    module_name, _, attr_path = spec.partition(":")
+    obj = importlib.import_module(module_name)
+    for attr in attr_path.split("."):
+        obj = getattr(obj, attr)
+    return obj
+
+
+def measure(func: Callable, args: Tuple, min_time: float, repeat: int) -> Dict[str, float]:
+    func(*args)  # 预热（拼音词典等的惰性加载）
+    timer = timeit.Timer(lambda: func(*args))
+    number, _ = timer.autorange()
+    number = max(1, int(number * min_time / 0.2))
+    best = min(timer.repeat(repeat=repeat, number=number))
+
+    tracemalloc.start()
+    try:
+        func(*args)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {"ops_per_sec": round(number / best, 1), "peak_bytes": peak}
+
+
+def compare(results, baseline, tolerance, min_peak_delta):
+    regressions = []
+    for key, result in results.items():
+        base = baseline.get(key)
+        if not base:
+            continue
+        if result["ops_per_sec"] < base["ops_per_sec"] * (1 - tolerance):
+            regressions.append(f"{key}: ops/s {base['ops_per_sec']} -> {result['ops_per_sec']}")
+        if result["peak_bytes"] > max(base["peak_bytes"] * (1 + tolerance), base["peak_bytes"] + min_peak_delta):
+            regressions.append(f"{key}: peak bytes {base['peak_bytes']} -> {result['peak_bytes']}")
+    return regressions
+
+
+def run(args) -> int:
+    stored = json.loads(BASELINE_PATH.read_text()) if BASELINE_PATH.exists() else {}
+    alternatives: Dict[str, List[Tuple[str, Callable]]] = {}
+    for i, spec in enumerate(args.impl or [], 1):
+        target_name, _, path = spec.partition("=")
+        alternatives.setdefault(target_name, []).append((f"alt{i}", load_callable(path)))
+        print(f"alt{i} = {path}")
+
+    results, mismatches = {}, []
+    print("=" * 92)
+    print(f"{'case':<40} {'impl':<16} {'ops/s':>12} {'peak KiB':>10} {'vs current':>10}")
+    print("-" * 92)
+    for target_name, build in TARGETS.items():
+        if args.only and target_name not in args.only:
+            continue
+        target = build()
+        for case in target.cases:
+            key = f"{target_name}:{case.name}"
+            current = measure(target.func, case.args, args.min_time, args.repeat)
+            results[key] = current
+            print(f"{key:<40} {'current':<16} {current['ops_per_sec']:>12,.1f} "
+                  f"{current['peak_bytes'] / 1024:>10.1f} {'':>10}")
+            expected = target.func(*case.args)
+            for name, func in alternatives.get(target_name, []):
+                if func(*case.args) != expected:
+                    mismatches.append(f"{key}: {name} returned a different result")
+                alt = measure(func, case.args, args.min_time, args.repeat)
+                print(f"{'':<40} {name:<16} {alt['ops_per_sec']:>12,.1f} "
+                      f"{alt['peak_bytes'] / 1024:>10.1f} {alt['ops_per_sec'] / current['ops_per_sec']:>9.2f}x")
+    print("=" * 92)
+
+    for line in mismatches:
+        print(f"❌ {line}")
+    if args.save_baseline:
+        baseline = {**stored, **results} if args.only else results
+        BASELINE_PATH.write_text(json.dumps(baseline, ensure_ascii=False, indent=2, sort_keys=True) + "\n")
+        print(f"基线已写入 {BASELINE_PATH}")
+        return 1 if mismatches else 0
+
+    regressions = compare(results, stored, args.tolerance, args.min_peak_delta)
+    for line in regressions:
+        print(f"❌ {line}")
+    if not regressions and not mismatches:
+        print("✅ 未发现退化" if stored else "没有可对比的基线，使用 --save-baseline 生成")
+    return 1 if regressions or mismatches else 0
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--only", nargs="+", choices=list(TARGETS), help="只测指定的目标函数")
+    parser.add_argument("--impl", action="append", metavar="TARGET=MODULE:FUNC", help="候选实现，可重复")
+    parser.add_argument("--min-time", type=float, default=0.2, help="每轮计时的最短时间（秒）")
+    parser.add_argument("--repeat", type=int, default=5, help="计时轮数，取最快一轮")
+    parser.add_argument("--tolerance", type=float, default=0.3, help="允许的吞吐下降 / 内存增长比例")
+    parser.add_argument("--min-peak-delta", type=int, default=1024, help="允许的最小内存峰值增长（字节）")
+    parser.add_argument("--save-baseline", action="store_true", help="把本次结果保存为基线")
+    args = parser.parse_args()
+    sys.exit(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -3,6 +3,7 @@ Shared pytest fixtures for MomentsShare tests.
 """
 import io
 from datetime import timedelta
+from unittest.mock import patch
 
 import pytest
 from django.utils import timezone
@@ -11,6 +12,36 @@ from rest_framework.test import APIClient
 from rest_framework_simplejwt.tokens import RefreshToken
 
 
+@pytest.fixture(autouse=True)
+def clear_cache():
+    """Clear the caches between tests so cached responses and metrics never leak across tests."""
+    from django.core.cache import caches
+    for cache in caches.all():
+        cache.clear()
+    yield
+    for cache in caches.all():
+        cache.clear()
+
+
+@pytest.fixture(autouse=True)
+def search_log_dispatch():
+    """Keep buffered search log batches away from the Celery broker; yields the mocked delay."""
+    from moments import search_log
+    search_log._drain()
+    search_log._retry_at = 0.0
+    with patch("moments.tasks.flush_search_log.delay") as mock_delay:
+        yield mock_delay
+        search_log._queue.join()
+    search_log._drain()
+
+
+@pytest.fixture(autouse=True)
+def stale_autocomplete_index():
+    """Force the in-process autocomplete index to resync from the test database."""
+    from moments import autocomplete
+    autocomplete.mark_stale()
+
+
 @pytest.fixture
 def api_client():
     """Return an unauthenticated API client."""
@@ -5,3 +5,7 @@ class CoreConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "core"
 
+    def ready(self):
+        from .profiling import install_serializer_timing
+
+        install_serializer_timing()
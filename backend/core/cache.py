@@ -0,0 +1,128 @@
+"""
+热点读接口的缓存工具
+
+- get_or_compute: 读缓存，未命中时只让一个请求回源计算（通过 cache.add 抢占锁），
+  其他并发请求短暂等待结果写入后直接读取，避免缓存失效瞬间大量请求同时打到数据库
+- 缓存后端异常时直接回源计算，缓存不可用不影响接口可用性
+- 各接口的缓存键集中定义在这里，写操作通过 invalidate_* 函数显式失效
+"""
+import logging
+import secrets
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = "ms"
+_MISSING = object()
+
+
+def cache_key(*parts) -> str:
+    return ":".join([KEY_PREFIX, *map(str, parts)])
+
+
+def get_or_compute(key: str, timeout: int, compute):
+    """返回缓存值；未命中时合并并发请求，只计算一次并写入缓存"""
+    try:
+        value = cache.get(key, _MISSING)
+    except Exception as e:
+        logger.warning(f"[cache] get {key} failed: {e}")
+        return compute()
+    if value is not _MISSING:
+        return value
+
+    lock_key = f"{key}:lock"
+    lock_token = secrets.token_hex(8)
+    try:
+        is_owner = cache.add(lock_key, lock_token, timeout=settings.CACHE_LOCK_TIMEOUT)
+    except Exception as e:
+        logger.warning(f"[cache] lock {key} failed: {e}")
+        return compute()
+
+    if not is_owner:
+        # 其他请求正在计算，等待其写入结果；超时或缓存出错后自己计算兜底
+        deadline = time.monotonic() + settings.CACHE_COALESCE_WAIT
+        while time.monotonic() < deadline:
+            time.sleep(0.05)
+            try:
+                value = cache.get(key, _MISSING)
+            except Exception as e:
+                logger.warning(f"[cache] get {key} failed: {e}")
+                break
+            if value is not _MISSING:
+                return value
+        return compute()
+
+    try:
+        value = compute()
+        try:
+            cache.set(key, value, timeout)
+        except Exception as e:
+            logger.warning(f"[cache] set {key} failed: {e}")
+        return value
+    finally:
+        _release_lock(lock_key, lock_token)
+
+
+def _release_lock(lock_key: str, lock_token: str):
+    """只删除自己持有的锁：计算超过锁的有效期时，锁可能已过期并被其他请求重新获取"""
+    try:
+        if cache.get(lock_key) == lock_token:
+            cache.delete(lock_key)
+    except Exception as e:
+        logger.warning(f"[cache] release {lock_key} failed: {e}")
+
+
+def invalidate(*keys: str):
+    try:
+        cache.delete_many(keys)
+    except Exception as e:
+        logger.warning(f"[cache] invalidate {keys} failed: {e}")
+
+
+def hot_search_key(window: str) -> str:
+    return cache_key("hot_search", window)
+
+
+def hot_keywords_key() -> str:
+    return cache_key("hot_keywords")
+
+
+def search_suggestions_key(query: str) -> str:
+    return cache_key("search_suggestions", query)
+
+
+def avg_score_key(moment_id) -> str:
+    return cache_key("avg_score", moment_id)
+
+
+def user_profile_key(user_id) -> str:
+    return cache_key("user_profile", user_id)
+
+
+def user_version_key(user_id) -> str:
+    return cache_key("user_version", user_id)
+
+
+def auth_user_key(user_id, version) -> str:
+    return cache_key("auth_user", user_id, version)
+
+
+def token_blacklist_key(jti) -> str:
+    return cache_key("token_blacklist", jti)
+
+
+def moment_detail_key(moment_id) -> str:
+    return cache_key("moment_detail", moment_id)
+
+
+def invalidate_hot_search():
+    from moments.leaderboard import WINDOWS
+
+    invalidate(*(hot_search_key(window) for window in WINDOWS))
+
+
+def invalidate_moments(*moment_ids):
+    invalidate(*(moment_detail_key(moment_id) for moment_id in moment_ids))
@@ -0,0 +1,328 @@
+"""
+可按规模放大的合成数据生成器（基准测试与大规模测试数据共用）
+
+以用户数 scale 为基准，按固定比例生成好友关系、动态、标签、评论（含回复）、点赞、评分、私信和搜索日志，
+scale=1000 约 13 万行，scale=10000 约 130 万行。全部通过 bulk_create 分批写入，不触发信号，
+写入后重建热门标签计数。使用固定的随机种子，同样的 scale 每次生成相同的数据分布：
+- 动态的作者、标签、评论、点赞按幂律分布，少数热门用户/标签/动态占大部分互动
+- 每个 scale 的第一个用户是热门用户，好友和私信会话明显多于其他用户
+
+media_variants > 0 时用 Pillow 在本地渲染对应数量的占位图和头像（线程池并行写入内容寻址存储），
+每条动态随机引用其中 1-3 张，每个用户引用一个头像；同样的序号渲染出同样的内容，重复生成时复用已有文件。
+
+生成的用户手机号以 BENCH_PHONE_PREFIX 开头，clear() 按此前缀删除（关联数据级联删除）。
+"""
+import colorsys
+import random
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from io import BytesIO
+from typing import Callable, Dict, List, Optional, Tuple
+
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.db import transaction
+from django.utils import timezone
+from PIL import Image as PILImage, ImageDraw, ImageOps
+
+from friends.models import Friendship
+from interactions.models import Comment, Like, Message, Rating
+from moments import leaderboard
+from moments.models import Image, Moment, MomentTag, SearchQuery, Tag
+from users.models import User
+
+from .storage import StoredBlob, content_storage
+
+BENCH_PHONE_PREFIX = "166"
+BENCH_PASSWORD = "Bench123456"
+
+# 每个用户平均的数据量
+FRIENDS_PER_USER = 10
+MOMENTS_PER_USER = 10
+MESSAGES_PER_USER = 5
+SEARCHES_PER_USER = 2
+# 每条动态平均的数据量
+TAGS_PER_MOMENT = 2
+COMMENTS_PER_MOMENT = 3
+LIKES_PER_MOMENT = 5
+RATINGS_PER_MOMENT = 1
+# 评论中回复的比例、热门用户的好友数与会话数
+REPLY_RATIO = 0.3
+HOT_USER_FRIENDS = 200
+HOT_USER_CONVERSATIONS = 100
+# 数据的时间跨度
+SPAN_DAYS = 90
+# 占位媒体的尺寸与每条动态的图片数范围
+PHOTO_SIZE = (800, 600)
+AVATAR_SIZE = (200, 200)
+IMAGES_PER_MOMENT = (1, 3)
+
+WORDS = [
+    "天气", "旅行", "美食", "咖啡", "读书", "电影", "健身", "跑步", "摄影", "宠物",
+    "猫咪", "周末", "加班", "程序员", "音乐", "风景", "爬山", "海边", "烘焙", "火锅",
+    "日常", "心情", "学习", "工作", "朋友", "生日", "下雨", "夕阳", "城市", "夜景",
+]
+SENTENCES = [
+    "今天{0}真不错，顺便聊聊{1}",
+    "分享一下最近的{0}，{1}也很推荐",
+    "周末和朋友一起{0}，下次试试{1}",
+    "关于{0}的一点想法，{1}同样值得一提",
+]
+
+
+def scaled_counts(scale: int, moments: Optional[int] = None) -> Dict[str, int]:
+    """scale 个用户时各类数据的大致行数，moments 指定动态总数（默认按每个用户 MOMENTS_PER_USER 条）"""
+    moments = scale * MOMENTS_PER_USER if moments is None else moments
+    return {
+        "users": scale,
+        "friendships": scale * FRIENDS_PER_USER // 2,
+        "moments": moments,
+        "moment_tags": moments * TAGS_PER_MOMENT,
+        "tags": max(len(WORDS), scale // 10),
+        "comments": moments * COMMENTS_PER_MOMENT,
+        "likes": moments * LIKES_PER_MOMENT,
+        "ratings": moments * RATINGS_PER_MOMENT,
+        "messages": scale * MESSAGES_PER_USER,
+        "search_queries": scale * SEARCHES_PER_USER,
+    }
+
+
+def placeholder_image(index: int, size: Tuple[int, int] = PHOTO_SIZE, label: str = "",
+                      format: str = "JPEG") -> bytes:
+    """离线占位图：按序号取色的渐变背景加上文字，序号相同时内容相同"""
+    hue = (index * 0.618033988749895) % 1
+    dark = tuple(int(c * 255) for c in colorsys.hsv_to_rgb(hue, 0.6, 0.45))
+    light = tuple(int(c * 255) for c in colorsys.hsv_to_rgb(hue, 0.3, 0.95))
+    image = ImageOps.colorize(PILImage.linear_gradient("L").resize(size), dark, light)
+    ImageDraw.Draw(image).text((size[0] // 20, size[1] // 20), label or f"#{index}", fill="white")
+    buffer = BytesIO()
+    image.save(buffer, format=format)
+    return buffer.getvalue()
+
+
+class _Generator:
+    def __init__(self, scale: int, seed: int, batch_size: int, log: Callable[[str], None],
+                 moments: Optional[int] = None, media_variants: int = 0, workers: Optional[int] = None):
+        self.scale = scale
+        self.rng = random.Random(seed)
+        self.batch_size = batch_size
+        self.log = log
+        self.now = timezone.now()
+        self.counts = scaled_counts(scale, moments)
+        self.media_variants = media_variants
+        self.workers = workers
+        # 每一次文件引用对应一项，最后统一登记引用计数
+        self.references: List[StoredBlob] = []
+
+    def skewed(self, items: list):
+        """按幂律分布挑选，靠前的元素被选中的概率更高"""
+        return items[min(int(len(items) * self.rng.random() ** 3), len(items) - 1)]
+
+    def timestamp(self, after=None):
+        start = after or self.now - timedelta(days=SPAN_DAYS)
+        return start + (self.now - start) * self.rng.random()
+
+    def bulk(self, model, objects: list, **kwargs) -> list:
+        model.objects.bulk_create(objects, batch_size=self.batch_size, **kwargs)
+        self.log(f"{model.__name__}: {len(objects)}")
+        return objects
+
+    def media(self) -> Tuple[List[StoredBlob], List[StoredBlob]]:
+        """并行渲染并写入 media_variants 张动态图片和头像，只写文件不写数据库"""
+        if not self.media_variants:
+            return [], []
+
+        def render(job):
+            name, index, size, format = job
+            return content_storage.write(name, ContentFile(placeholder_image(index, size, format=format)))
+
+        variants = range(self.media_variants)
+        jobs = [("images/placeholder.jpg", i, PHOTO_SIZE, "JPEG") for i in variants]
+        jobs += [("avatars/placeholder.png", i, AVATAR_SIZE, "PNG") for i in variants]
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            blobs = list(pool.map(render, jobs))
+        self.log(f"Media files: {len(blobs)}")
+        return blobs[:self.media_variants], blobs[self.media_variants:]
+
+    def users(self, avatars: List[StoredBlob]) -> List[int]:
+        # 只计算一次密码哈希，所有用户共用
+        password = make_password(BENCH_PASSWORD)
+        users = []
+        for i in range(self.scale):
+            user = User(
+                phone=f"{BENCH_PHONE_PREFIX}{i:08d}",
+                username=f"bench{i}",
+                nickname=f"用户{i}",
+                password=password,
+                created_at=self.timestamp(),
+            )
+            if avatars:
+                avatar = self.rng.choice(avatars)
+                user.avatar = avatar.name
+                self.references.append(avatar)
+            users.append(user)
+        self.bulk(User, users)
+        return [user.id for user in users]
+
+    def friendships(self, user_ids: List[int]):
+        pairs = set()
+        hot = user_ids[0]
+        for other in self.rng.sample(user_ids[1:], min(HOT_USER_FRIENDS, len(user_ids) - 1)):
+            pairs.add((hot, other))
+        target = min(self.counts["friendships"], len(user_ids) * (len(user_ids) - 1) // 2)
+        while len(pairs) < target:
+            a, b = self.rng.sample(user_ids, 2)
+            if (b, a) not in pairs:
+                pairs.add((a, b))
+        statuses = [Friendship.Status.ACCEPTED] * 8 + [Friendship.Status.PENDING] * 2
+        self.bulk(Friendship, [
+            Friendship(from_user_id=a, to_user_id=b, status=self.rng.choice(statuses), created_at=self.timestamp())
+            for a, b in pairs
+        ])
+
+    def tags(self) -> List[int]:
+        names = list(WORDS)
+        names += [f"{self.rng.choice(WORDS)}{i}" for i in range(self.counts["tags"] - len(WORDS))]
+        Tag.objects.bulk_create([Tag(name=name) for name in names], batch_size=self.batch_size, ignore_conflicts=True)
+        ids = list(Tag.objects.filter(name__in=names).values_list("id", flat=True))
+        self.log(f"Tag: {len(ids)}")
+        return ids
+
+    def moments(self, user_ids: List[int], tag_ids: List[int]) -> List[Moment]:
+        moments = []
+        for _ in range(self.counts["moments"]):
+            words = self.rng.sample(WORDS, 2)
+            moments.append(Moment(
+                author_id=self.skewed(user_ids),
+                content=self.rng.choice(SENTENCES).format(*words),
+                type=Moment.MomentType.IMAGE,
+                created_at=self.timestamp(),
+            ))
+        self.bulk(Moment, moments)
+        links = set()
+        for moment in moments:
+            for _ in range(TAGS_PER_MOMENT):
+                links.add((moment.id, self.skewed(tag_ids)))
+        self.bulk(MomentTag, [MomentTag(moment_id=m, tag_id=t) for m, t in links])
+        return moments
+
+    def images(self, moments: List[Moment], photos: List[StoredBlob]):
+        if not photos:
+            return
+        images = []
+        for moment in moments:
+            count = min(self.rng.randint(*IMAGES_PER_MOMENT), len(photos))
+            for order, photo in enumerate(self.rng.sample(photos, count), 1):
+                images.append(Image(moment_id=moment.id, image_file=photo.name, order=order))
+                self.references.append(photo)
+        self.bulk(Image, images)
+        self.counts["images"] = len(images)
+
+    def comments(self, user_ids: List[int], moments: List[Moment]):
+        total = self.counts["comments"]
+        roots = []
+        for _ in range(int(total * (1 - REPLY_RATIO))):
+            moment = self.skewed(moments)
+            roots.append(Comment(
+                moment_id=moment.id,
+                author_id=self.rng.choice(user_ids),
+                content=f"{self.rng.choice(WORDS)}不错",
+                created_at=self.timestamp(after=moment.created_at),
+            ))
+        self.bulk(Comment, roots)
+        replies = []
+        for _ in range(total - len(roots)):
+            parent = self.skewed(roots)
+            replies.append(Comment(
+                moment_id=parent.moment_id,
+                parent_id=parent.id,
+                author_id=self.rng.choice(user_ids),
+                content="同意",
+                created_at=self.timestamp(after=parent.created_at),
+            ))
+        self.bulk(Comment, replies)
+
+    def reactions(self, user_ids: List[int], moments: List[Moment]):
+        likes, ratings = set(), set()
+        for _ in range(self.counts["likes"]):
+            likes.add((self.skewed(moments).id, self.rng.choice(user_ids)))
+        for _ in range(self.counts["ratings"]):
+            ratings.add((self.skewed(moments).id, self.rng.choice(user_ids)))
+        self.bulk(Like, [Like(moment_id=m, user_id=u, created_at=self.timestamp()) for m, u in likes])
+        self.bulk(Rating, [
+            Rating(moment_id=m, user_id=u, score=self.rng.randint(1, 5), created_at=self.timestamp())
+            for m, u in ratings
+        ])
+
+    def messages(self, user_ids: List[int]):
+        hot = user_ids[0]
+        partners = self.rng.sample(user_ids[1:], min(HOT_USER_CONVERSATIONS, len(user_ids) - 1))
+        messages = []
+        for i in range(self.counts["messages"]):
+            if i < len(partners) * 3:
+                pair = [hot, partners[i % len(partners)]]
+                self.rng.shuffle(pair)
+            else:
+                pair = self.rng.sample(user_ids, 2)
+            messages.append(Message(
+                sender_id=pair[0],
+                receiver_id=pair[1],
+                content=f"{self.rng.choice(WORDS)}怎么样？",
+                is_read=self.rng.random() < 0.7,
+                created_at=self.timestamp(),
+            ))
+        self.bulk(Message, messages)
+
+    def search_queries(self, user_ids: List[int]):
+        sources = [SearchQuery.Source.SEARCH, SearchQuery.Source.SUGGEST]
+        self.bulk(SearchQuery, [
+            SearchQuery(
+                query=self.skewed(WORDS),
+                source=self.rng.choice(sources),
+                user_id=self.rng.choice(user_ids),
+                created_at=self.timestamp(),
+            )
+            for _ in range(self.counts["search_queries"])
+        ])
+
+
+def generate(scale: int, seed: int = 42, batch_size: int = 5000,
+             log: Optional[Callable[[str], None]] = None, moments: Optional[int] = None,
+             media_variants: int = 0, workers: Optional[int] = None) -> Dict[str, int]:
+    """
+    生成 scale 个用户规模的数据，返回各类数据的预计行数
+
+    moments 指定动态总数；media_variants 为渲染的占位图片/头像数量（0 不生成媒体），
+    workers 为渲染和写入媒体文件的线程数（默认由线程池决定）
+    """
+    gen = _Generator(scale, seed, batch_size, log or (lambda message: None), moments, media_variants, workers)
+    photos, avatars = gen.media()
+    try:
+        with transaction.atomic():
+            user_ids = gen.users(avatars)
+            gen.friendships(user_ids)
+            tag_ids = gen.tags()
+            moments = gen.moments(user_ids, tag_ids)
+            gen.images(moments, photos)
+            gen.comments(user_ids, moments)
+            gen.reactions(user_ids, moments)
+            gen.messages(user_ids)
+            gen.search_queries(user_ids)
+            content_storage.register(*gen.references)
+            leaderboard.rebuild()
+    finally:
+        # 清理没有用到的占位文件；事务回滚时连同已移入的文件一起清理
+        content_storage.discard(*photos, *avatars)
+    return gen.counts
+
+
+def bench_users():
+    return User.objects.filter(phone__startswith=BENCH_PHONE_PREFIX)
+
+
+def clear() -> int:
+    """删除生成的用户及其全部关联数据，返回删除的用户数"""
+    count = bench_users().count()
+    bench_users().delete()
+    leaderboard.rebuild()
+    return count
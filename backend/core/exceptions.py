@@ -9,5 +9,7 @@ def custom_exception_handler(exc, context):
         return Response({"detail": str(exc)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
     data = {"detail": response.data}
-    return Response(data, status=response.status_code)
+    # 保留限流响应的 Retry-After
+    headers = {"Retry-After": response["Retry-After"]} if response.has_header("Retry-After") else None
+    return Response(data, status=response.status_code, headers=headers)
 
@@ -4,27 +4,37 @@ MomentsShare 完整测试数据生成脚本
 功能：
 1. 创建测试用户（包含已知账号密码）
 2. 建立好友关系（发起申请、接受申请）
-3. 发布动态（从网络下载真实图片/视频）
+3. 发布动态（并发下载真实图片/视频并缓存到本地，离线或下载失败时使用本地生成的占位图）
 4. 创建评论、点赞、评分等互动数据
 5. 支持首次启动自动执行
+6. 批量模式（--scale）：离线生成大规模数据，用于性能测试
 
 使用方式：
     python manage.py seed_data          # 正常执行
     python manage.py seed_data --force  # 强制重新生成（清除旧数据）
+    python manage.py seed_data --offline  # 不联网，图片使用占位图（CI 环境）
+    python manage.py seed_data --scale 10000 --moments 20000  # 批量生成 1 万用户、2 万条动态
 """
 
+import hashlib
 import os
 import random
+import re
 import tempfile
+import time
 import urllib.request
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from io import BytesIO
 from pathlib import Path
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple
 
 from django.conf import settings
 from django.core.files.base import ContentFile
 from django.core.management.base import BaseCommand
 from django.db import transaction
 
+from core import datagen
 from users.models import User
 from moments.models import Moment, Image, Tag
 from friends.models import Friendship
@@ -228,6 +238,88 @@ VIDEO_URLS = [
     "https://sample-videos.com/video321/mp4/720/big_buck_bunny_720p_2mb.mp4",
 ]
 
+USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
+# 下载超时（秒）
+IMAGE_TIMEOUT = 10
+VIDEO_TIMEOUT = 30
+
+
+class MediaItem(NamedTuple):
+    url: str
+    kind: str  # avatar / image / video
+    size: Tuple[int, int] = (800, 600)
+
+
+def _picsum_size(url):
+    """从 picsum 的 URL 中取出宽高"""
+    match = re.search(r'/(\d+)/(\d+)', url)
+    return (int(match.group(1)), int(match.group(2))) if match else (800, 600)
+
+
+class MediaFetcher:
+    """
+    并发数有上限的媒体下载器：下载成功的内容按 URL 的哈希缓存到本地目录，再次运行时直接读取；
+    离线模式或下载失败时，头像和图片使用本地生成的占位图代替（不写入缓存），视频跳过
+    """
+
+    def __init__(self, cache_dir, workers=8, offline=False):
+        self.cache_dir = Path(cache_dir)
+        self.workers = workers
+        self.offline = offline
+        self.stats = Counter()
+
+    def _cache_path(self, url):
+        return self.cache_dir / hashlib.sha256(url.encode()).hexdigest()
+
+    def _download(self, url, timeout):
+        req = urllib.request.Request(url, headers={'User-Agent': USER_AGENT})
+        with urllib.request.urlopen(req, timeout=timeout) as response:
+            return response.read()
+
+    def _store(self, path, content):
+        """先写临时文件再改名，中断的下载不会留下不完整的缓存"""
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix='.part')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(content)
+        os.replace(tmp_path, path)
+
+    def fetch(self, item: MediaItem) -> Tuple[Optional[bytes], str]:
+        """返回 (内容, 来源)，来源为 cached / downloaded / placeholder / failed"""
+        path = self._cache_path(item.url)
+        if path.exists():
+            return path.read_bytes(), 'cached'
+        if not self.offline:
+            try:
+                content = self._download(item.url, VIDEO_TIMEOUT if item.kind == 'video' else IMAGE_TIMEOUT)
+            except Exception:
+                pass
+            else:
+                try:
+                    self._store(path, content)
+                except OSError:
+                    pass
+                return content, 'downloaded'
+        if item.kind == 'video':
+            return None, 'failed'
+        index = int(hashlib.sha256(item.url.encode()).hexdigest()[:8], 16)
+        image_format = 'PNG' if item.kind == 'avatar' else 'JPEG'
+        return datagen.placeholder_image(index, item.size, format=image_format), 'placeholder'
+
+    def fetch_all(self, items: List[MediaItem],
+                  progress: Optional[Callable[[int, int], None]] = None) -> Dict[str, Optional[bytes]]:
+        """并发获取全部媒体，返回 URL 到内容的映射（获取失败的为 None）"""
+        results = {}
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            futures = {pool.submit(self.fetch, item): item for item in items}
+            for done, future in enumerate(as_completed(futures), 1):
+                content, source = future.result()
+                results[futures[future].url] = content
+                self.stats[source] += 1
+                if progress:
+                    progress(done, len(items))
+        return results
+
 
 class Command(BaseCommand):
     help = '生成完整的测试数据，包括用户、好友关系、动态、评论、点赞等'
@@ -243,10 +335,63 @@ class Command(BaseCommand):
             action='store_true',
             help='跳过下载媒体文件（加速测试）',
         )
+        parser.add_argument(
+            '--offline',
+            action='store_true',
+            default=settings.SEED_OFFLINE,
+            help='不联网，头像和图片使用本地生成的占位图（已缓存的文件照常使用）',
+        )
+        parser.add_argument(
+            '--media-cache',
+            default=settings.SEED_MEDIA_CACHE_DIR,
+            help='下载媒体的本地缓存目录',
+        )
+        parser.add_argument(
+            '--download-workers',
+            type=int,
+            default=settings.SEED_DOWNLOAD_WORKERS,
+            help='同时下载的媒体文件数',
+        )
+        parser.add_argument(
+            '--scale',
+            type=int,
+            help='批量模式：生成的用户数，其他数据按比例生成（离线，不下载媒体）',
+        )
+        parser.add_argument(
+            '--moments',
+            type=int,
+            help=f'批量模式：动态总数，默认每个用户 {datagen.MOMENTS_PER_USER} 条',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=5000,
+            help='批量模式：每次 bulk_create 写入的行数',
+        )
+        parser.add_argument(
+            '--media-variants',
+            type=int,
+            default=50,
+            help='批量模式：本地渲染的占位图片和头像数量，动态和用户从中随机引用（配合 --skip-media 不生成）',
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            help='批量模式：渲染和写入媒体文件的线程数',
+        )
+        parser.add_argument(
+            '--seed',
+            type=int,
+            default=42,
+            help='批量模式：随机种子，相同参数生成相同的数据',
+        )
 
     def handle(self, *args, **options):
         force = options.get('force', False)
         skip_media = options.get('skip_media', False)
+        if options.get('scale'):
+            self._seed_scaled(options, force, skip_media)
+            return
         
         # 检查是否已有测试数据
         if not force and self._check_seed_data_exists():
@@ -256,13 +401,16 @@ class Command(BaseCommand):
         self.stdout.write(self.style.NOTICE('🚀 开始生成测试数据...'))
         
         try:
+            # 在事务之外先准备好全部媒体，下载期间不占用数据库事务
+            media = {} if skip_media else self._fetch_media(options)
+
             with transaction.atomic():
                 if force:
                     self._clean_data()
                 
-                users = self._create_users(skip_media)
+                users = self._create_users(media)
                 self._create_friendships(users)
-                moments = self._create_moments(users, skip_media)
+                moments = self._create_moments(users, media, skip_media)
                 self._create_interactions(users, moments)
                 self._create_messages(users)
                 self._mark_seed_complete()
@@ -275,6 +423,45 @@ class Command(BaseCommand):
             import traceback
             traceback.print_exc()
 
+    def _seed_scaled(self, options, force, skip_media):
+        """批量模式：bulk_create 分批写入，所有用户共用一次密码哈希，媒体使用本地渲染的占位图"""
+        scale = options['scale']
+        existing = datagen.bench_users().count()
+        if existing and not force:
+            self.stdout.write(self.style.WARNING(
+                f'⚠️ 已存在 {existing} 个批量生成的用户，跳过生成。使用 --force 强制重新生成。'
+            ))
+            return
+
+        self.stdout.write(self.style.NOTICE(f'🚀 开始批量生成测试数据（{scale} 个用户）...'))
+        try:
+            if existing:
+                self.stdout.write('  🧹 清理旧数据...')
+                datagen.clear()
+            start = time.perf_counter()
+            counts = datagen.generate(
+                scale,
+                seed=options['seed'],
+                batch_size=options['batch_size'],
+                log=lambda message: self.stdout.write(f'    ✅ {message}'),
+                moments=options.get('moments'),
+                media_variants=0 if skip_media else options['media_variants'],
+                workers=options.get('workers'),
+            )
+        except Exception as e:
+            self.stdout.write(self.style.ERROR(f'❌ 生成数据失败: {str(e)}'))
+            import traceback
+            traceback.print_exc()
+            return
+
+        elapsed = time.perf_counter() - start
+        self.stdout.write(self.style.SUCCESS(
+            f'🎉 批量数据生成完成！约 {sum(counts.values()):,} 行，耗时 {elapsed:.1f}s'
+        ))
+        self.stdout.write(
+            f'  💡 账号: {datagen.BENCH_PHONE_PREFIX}00000000 起连续编号，密码统一为 {datagen.BENCH_PASSWORD}'
+        )
+
     def _check_seed_data_exists(self):
         """检查是否已存在测试数据"""
         seed_marker = Path(settings.BASE_DIR) / '.seed_complete'
@@ -308,33 +495,40 @@ class Command(BaseCommand):
             seed_marker.unlink()
         self.stdout.write('  ✅ 旧数据清理完成')
 
-    def _download_image(self, url, timeout=10):
-        """从URL下载图片"""
-        try:
-            req = urllib.request.Request(
-                url,
-                headers={'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'}
-            )
-            with urllib.request.urlopen(req, timeout=timeout) as response:
-                return response.read()
-        except Exception as e:
-            self.stdout.write(self.style.WARNING(f'    ⚠️ 下载图片失败 {url}: {str(e)}'))
-            return None
+    def _media_items(self):
+        """种子数据用到的全部媒体：头像、动态图片和视频"""
+        items = [
+            MediaItem(get_avatar_url(user_data['avatar_seed']), 'avatar', (200, 200))
+            for user_data in TEST_USERS if user_data.get('avatar_seed')
+        ]
+        items += [MediaItem(url, 'image', _picsum_size(url)) for url in IMAGE_URLS]
+        items += [MediaItem(url, 'video') for url in VIDEO_URLS]
+        return items
 
-    def _download_video(self, url, timeout=30):
-        """从URL下载视频"""
-        try:
-            req = urllib.request.Request(
-                url,
-                headers={'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'}
-            )
-            with urllib.request.urlopen(req, timeout=timeout) as response:
-                return response.read()
-        except Exception as e:
-            self.stdout.write(self.style.WARNING(f'    ⚠️ 下载视频失败: {str(e)}'))
-            return None
+    def _fetch_media(self, options):
+        """并发获取媒体文件，终端中显示进度，结束后汇总各来源的数量"""
+        items = self._media_items()
+        fetcher = MediaFetcher(options['media_cache'], options['download_workers'], options['offline'])
+        self.stdout.write(f'  📥 准备媒体文件，共 {len(items)} 个...')
+        interactive = self.stdout.isatty()
+
+        def progress(done, total):
+            if interactive:
+                self.stdout.write(f'\r    {done}/{total}', ending='')
+
+        media = fetcher.fetch_all(items, progress)
+        if interactive:
+            self.stdout.write('')
+        stats = fetcher.stats
+        self.stdout.write(
+            f"  ✅ 媒体准备完成: 缓存 {stats['cached']}, 下载 {stats['downloaded']}, "
+            f"占位图 {stats['placeholder']}"
+        )
+        if stats['failed']:
+            self.stdout.write(self.style.WARNING(f"    ⚠️ {stats['failed']} 个视频获取失败，对应动态不含视频文件"))
+        return media
 
-    def _create_users(self, skip_media=False):
+    def _create_users(self, media):
         """创建测试用户"""
         self.stdout.write('  👥 创建测试用户...')
         users = []
@@ -359,10 +553,9 @@ class Command(BaseCommand):
                 user.set_password(user_data['password'])
                 user.save()
                 
-                # 下载并设置头像
-                if not skip_media and avatar_seed:
-                    avatar_url = f"https://api.dicebear.com/7.x/avataaars/png?seed={avatar_seed}"
-                    avatar_content = self._download_image(avatar_url)
+                # 设置头像
+                if avatar_seed:
+                    avatar_content = media.get(get_avatar_url(avatar_seed))
                     if avatar_content:
                         user.avatar.save(f"{user.username}_avatar.png", ContentFile(avatar_content))
                 
@@ -435,7 +628,7 @@ class Command(BaseCommand):
         
         self.stdout.write(f'  ✅ 好友关系创建完成')
 
-    def _create_moments(self, users, skip_media=False):
+    def _create_moments(self, users, media, skip_media=False):
         """创建动态"""
         self.stdout.write('  📝 创建动态...')
         moments = []
@@ -474,7 +667,7 @@ class Command(BaseCommand):
                         if not skip_media:
                             url = IMAGE_URLS[image_index % len(IMAGE_URLS)]
                             image_index += 1
-                            image_data = self._download_image(url)
+                            image_data = media.get(url)
                             
                             if image_data:
                                 img = Image(moment=moment, order=img_order)
@@ -491,7 +684,7 @@ class Command(BaseCommand):
                     if not skip_media and VIDEO_URLS:
                         url = VIDEO_URLS[video_index % len(VIDEO_URLS)]
                         video_index += 1
-                        video_data = self._download_video(url)
+                        video_data = media.get(url)
                         
                         if video_data:
                             moment.video_file.save(
@@ -503,7 +696,6 @@ class Command(BaseCommand):
                     moment.save()
                 
                 moments.append(moment)
-                self.stdout.write(f"    ✅ 动态: {user.nickname} - {moment_type} - {content_data['content'][:20]}...")
         
         self.stdout.write(f'  ✅ 动态创建完成，共 {len(moments)} 条')
         return moments
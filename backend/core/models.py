@@ -0,0 +1,15 @@
+from django.db import models
+from django.utils import timezone
+
+
+class MediaBlob(models.Model):
+    """内容寻址存储中的一个文件，按 SHA-256 去重，ref_count 为引用它的字段数量"""
+
+    path = models.CharField(max_length=255, unique=True)
+    sha256 = models.CharField(max_length=64, db_index=True)
+    size = models.PositiveBigIntegerField()
+    ref_count = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f"{self.path} (refs={self.ref_count})"
@@ -0,0 +1,232 @@
+"""
+按接口采样的请求性能统计
+
+被采样的请求（PROFILING_SAMPLE_RATE）记录 SQL 次数、SQL 耗时、序列化耗时、总耗时和响应大小：
+- 通过 Server-Timing 响应头返回本次请求的各项耗时，浏览器开发者工具可直接查看
+- 按 路由 + 方法 累加到 metrics 缓存中的计数器，由 /metrics/ 以 Prometheus 文本格式输出
+- PROFILING_DEBUG 开启时记录每条 SQL，同一请求中重复执行的 SQL 打印警告（通常是 N+1 查询）
+
+SQL 通过 connection.execute_wrapper 统计，不依赖 DEBUG；序列化耗时统计最外层的
+serializer.data（包含其中触发的延迟查询）。缓存不可用时只丢弃统计，不影响请求。
+
+计数器不设过期时间，保存在单独的 metrics 缓存中，不会被 default 缓存里的数据挤出。没有配置
+REDIS_CACHE_URL（CACHE_SHARED 为 False）时 metrics 是进程内缓存，计数器按进程分别累加，
+/metrics/ 只返回处理本次抓取的进程的统计，多进程部署需要配置 Redis 才能得到全局数据。
+"""
+import contextvars
+import logging
+import random
+import time
+from collections import Counter
+from typing import List, Optional
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connection
+from django.http import HttpResponse
+from rest_framework.serializers import BaseSerializer
+
+from .cache import cache_key
+
+logger = logging.getLogger(__name__)
+
+METRIC_PREFIX = "moments_share"
+# (指标名, 类型, 说明, 计数器单位换算)
+METRICS = [
+    ("requests_total", "counter", "Sampled requests", 1),
+    ("request_duration_seconds_total", "counter", "Total time spent handling sampled requests", 1e-6),
+    ("db_queries_total", "counter", "SQL queries issued by sampled requests", 1),
+    ("db_duration_seconds_total", "counter", "Time spent in SQL by sampled requests", 1e-6),
+    ("serializer_duration_seconds_total", "counter", "Time spent in serializer.data by sampled requests", 1e-6),
+    ("response_bytes_total", "counter", "Response body size of sampled requests", 1),
+    ("duplicate_queries_total", "counter", "Repeated SQL statements within one request (debug mode)", 1),
+]
+
+_current: contextvars.ContextVar[Optional["Profile"]] = contextvars.ContextVar("profile", default=None)
+
+
+class Profile:
+    def __init__(self, record_sql: bool):
+        self.queries = 0
+        self.db_time = 0.0
+        self.serializer_time = 0.0
+        self.serializer_depth = 0
+        self.statements: Optional[List[str]] = [] if record_sql else None
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_time += time.perf_counter() - start
+            self.queries += 1
+            if self.statements is not None:
+                self.statements.append(sql)
+
+    def duplicates(self) -> Counter:
+        """同一请求中执行超过一次的 SQL（参数不同的同一条语句也算重复）"""
+        counts = Counter(self.statements or [])
+        return Counter({sql: n for sql, n in counts.items() if n > 1})
+
+
+_serializer_data = BaseSerializer.data
+
+
+@property
+def _timed_serializer_data(self):
+    profile = _current.get()
+    if profile is None:
+        return _serializer_data.fget(self)
+    # 嵌套调用 .data 时只统计最外层
+    profile.serializer_depth += 1
+    start = time.perf_counter()
+    try:
+        return _serializer_data.fget(self)
+    finally:
+        profile.serializer_depth -= 1
+        if not profile.serializer_depth:
+            profile.serializer_time += time.perf_counter() - start
+
+
+def install_serializer_timing():
+    BaseSerializer.data = _timed_serializer_data
+
+
+def _metrics_cache():
+    return caches["metrics"]
+
+
+def _metric_key(name: str, label: str) -> str:
+    return cache_key("profiling", name, label)
+
+
+def _label_seen_key(label: str) -> str:
+    return cache_key("profiling", "label", label)
+
+
+def _label_count_key() -> str:
+    return cache_key("profiling", "labels")
+
+
+def _label_slot_key(slot: int) -> str:
+    return cache_key("profiling", "labels", slot)
+
+
+def _register_label(label: str):
+    # 每个标签占一个编号槽位：cache.add 保证并发的首次请求中只有一个登记，不会互相覆盖
+    cache = _metrics_cache()
+    if cache.add(_label_seen_key(label), True, None):
+        cache.add(_label_count_key(), 0, None)
+        cache.set(_label_slot_key(cache.incr(_label_count_key())), label, None)
+
+
+def _labels() -> List[str]:
+    cache = _metrics_cache()
+    count = cache.get(_label_count_key()) or 0
+    slots = cache.get_many([_label_slot_key(slot) for slot in range(1, count + 1)])
+    return sorted(set(slots.values()))
+
+
+def _record(label: str, values: dict):
+    try:
+        _register_label(label)
+        cache = _metrics_cache()
+        for name, value in values.items():
+            if not value:
+                continue
+            key = _metric_key(name, label)
+            cache.add(key, 0, None)
+            cache.incr(key, value)
+    except Exception as e:
+        logger.warning(f"[profiling] record metrics failed: {e}")
+
+
+def _view_label(request) -> str:
+    match = getattr(request, "resolver_match", None)
+    route = "/" + match.route if match else "unmatched"
+    return f"{request.method}|{route}"
+
+
+class ProfilingMiddleware:
+    """按 PROFILING_SAMPLE_RATE 采样请求，统计 SQL、序列化耗时和响应大小"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if random.random() >= settings.PROFILING_SAMPLE_RATE:
+            return self.get_response(request)
+
+        profile = Profile(record_sql=settings.PROFILING_DEBUG)
+        token = _current.set(profile)
+        start = time.perf_counter()
+        try:
+            with connection.execute_wrapper(profile):
+                response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        total = time.perf_counter() - start
+
+        label = _view_label(request)
+        size = 0 if response.streaming else len(response.content)
+        duplicates = profile.duplicates()
+        # 除第一次执行外多出来的次数
+        repeated = sum(duplicates.values()) - len(duplicates)
+        if duplicates:
+            sql, times = duplicates.most_common(1)[0]
+            logger.warning(
+                f"[profiling] {label}: {len(duplicates)} statement(s) repeated {repeated} extra time(s), "
+                f"e.g. {times}x {sql[:200]}"
+            )
+            response["X-Duplicate-Queries"] = str(repeated)
+
+        response["Server-Timing"] = ", ".join([
+            f'db;dur={profile.db_time * 1000:.1f};desc="{profile.queries} queries"',
+            f"serializer;dur={profile.serializer_time * 1000:.1f}",
+            f"total;dur={total * 1000:.1f}",
+        ])
+        _record(label, {
+            "requests_total": 1,
+            "request_duration_seconds_total": int(total * 1e6),
+            "db_queries_total": profile.queries,
+            "db_duration_seconds_total": int(profile.db_time * 1e6),
+            "serializer_duration_seconds_total": int(profile.serializer_time * 1e6),
+            "response_bytes_total": size,
+            "duplicate_queries_total": repeated,
+        })
+        return response
+
+
+def render_metrics() -> str:
+    """Prometheus 文本格式的统计数据"""
+    try:
+        labels = _labels()
+        values = _metrics_cache().get_many([_metric_key(name, label) for name, *_ in METRICS for label in labels])
+    except Exception as e:
+        logger.warning(f"[profiling] read metrics failed: {e}")
+        labels, values = [], {}
+
+    lines = []
+    for name, kind, help_text, scale in METRICS:
+        metric = f"{METRIC_PREFIX}_{name}"
+        lines.append(f"# HELP {metric} {help_text}")
+        lines.append(f"# TYPE {metric} {kind}")
+        for label in labels:
+            method, route = label.split("|", 1)
+            value = round(values.get(_metric_key(name, label), 0) * scale, 6)
+            lines.append(f'{metric}{{method="{method}",route="{route}"}} {value}')
+    return "\n".join(lines) + "\n"
+
+
+def metrics_view(request):
+    """
+    Prometheus 抓取接口，需携带 Authorization: Bearer <PROFILING_METRICS_TOKEN>；
+    开启采样但没有配置 token 时拒绝访问，只有关闭采样时才允许不配置 token
+    """
+    token = settings.PROFILING_METRICS_TOKEN
+    if not token:
+        if settings.PROFILING_SAMPLE_RATE > 0:
+            return HttpResponse(status=403)
+    elif request.headers.get("Authorization") != f"Bearer {token}":
+        return HttpResponse(status=401)
+    return HttpResponse(render_metrics(), content_type="text/plain; version=0.0.4; charset=utf-8")
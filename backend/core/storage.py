@@ -0,0 +1,162 @@
+"""
+内容寻址的文件存储
+
+上传内容在写入临时文件的同时计算 SHA-256，最终保存为 <upload_to>/<哈希前两位>/<哈希><扩展名>。
+内容相同的文件只保存一份，并在 MediaBlob 中记录引用计数；delete() 只减少计数，
+计数归零时才真正删除文件。不在 MediaBlob 中的旧文件按普通文件处理。
+
+检查目标文件是否存在、移动临时文件、增减引用计数和删除文件都在 MediaBlob 行锁内进行，
+并发的登记和删除不会留下指向已删除文件的记录。
+"""
+import hashlib
+import os
+import posixpath
+import tempfile
+from collections import Counter, defaultdict
+from typing import NamedTuple
+
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+from django.db import transaction
+from django.db.models import F
+from django.utils.deconstruct import deconstructible
+
+from .models import MediaBlob
+
+INCOMING_DIR = ".incoming"
+
+
+class StoredBlob(NamedTuple):
+    name: str
+    sha256: str
+    size: int
+    temp_path: str  # 尚未登记的临时文件，register() 时才移动到 name
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    def get_available_name(self, name, max_length=None):
+        # 文件名由内容决定，同名即同内容，不需要改名
+        return name
+
+    def write(self, name, content) -> StoredBlob:
+        """
+        只写文件不写数据库（可在线程池中调用）：边读边算哈希写入临时文件，
+        临时文件由 register() 移动到目标路径，或由 discard() 删除
+        """
+        if not hasattr(content, "chunks"):
+            content = File(content, name)
+        incoming = self.path(INCOMING_DIR)
+        os.makedirs(incoming, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=incoming)
+        digest = hashlib.sha256()
+        size = 0
+        try:
+            with os.fdopen(fd, "wb") as f:
+                for chunk in content.chunks():
+                    if isinstance(chunk, str):
+                        chunk = chunk.encode()
+                    digest.update(chunk)
+                    f.write(chunk)
+                    size += len(chunk)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+
+        sha256 = digest.hexdigest()
+        extension = posixpath.splitext(name)[1].lower()
+        name = posixpath.join(posixpath.dirname(name), sha256[:2], sha256 + extension)
+        return StoredBlob(name, sha256, size, tmp_path)
+
+    def _lock(self, blobs):
+        """确保每个文件都有 MediaBlob 行并加行锁，返回 {path: MediaBlob}"""
+        unique = {blob.name: blob for blob in blobs}
+        rows = {}
+        # 插入后、加锁前行可能被并发的 delete() 删掉，缺的行重新插入
+        while len(rows) < len(unique):
+            MediaBlob.objects.bulk_create(
+                [
+                    MediaBlob(path=blob.name, sha256=blob.sha256, size=blob.size)
+                    for blob in unique.values() if blob.name not in rows
+                ],
+                ignore_conflicts=True,
+            )
+            rows = {row.path: row for row in MediaBlob.objects.select_for_update().filter(path__in=unique)}
+        return rows
+
+    def _place(self, blob: StoredBlob):
+        """持有行锁时调用：目标文件不存在时移入临时文件，否则丢弃临时文件"""
+        if not os.path.exists(blob.temp_path):
+            return
+        full_path = self.path(blob.name)
+        if os.path.exists(full_path):
+            os.remove(blob.temp_path)
+            return
+        os.makedirs(os.path.dirname(full_path), exist_ok=True)
+        os.replace(blob.temp_path, full_path)
+        if self.file_permissions_mode is not None:
+            os.chmod(full_path, self.file_permissions_mode)
+
+    def register(self, *blobs: StoredBlob):
+        """为已写入的文件各增加一次引用（批量处理，查询次数与文件数量无关）"""
+        if not blobs:
+            return
+        with transaction.atomic(savepoint=False):
+            self._lock(blobs)
+            for blob in blobs:
+                self._place(blob)
+            increments = defaultdict(list)
+            for name, count in Counter(blob.name for blob in blobs).items():
+                increments[count].append(name)
+            for count, names in increments.items():
+                MediaBlob.objects.filter(path__in=names).update(ref_count=F("ref_count") + count)
+
+    def discard(self, *blobs: StoredBlob):
+        """
+        放弃未能登记引用的文件（register() 所在事务回滚后调用）：删除临时文件；
+        已移动到目标路径的文件在行锁内确认没有其他引用后才删除
+        """
+        placed = []
+        for blob in blobs:
+            if os.path.exists(blob.temp_path):
+                os.remove(blob.temp_path)
+            else:
+                placed.append(blob)
+        if not placed:
+            return
+        with transaction.atomic():
+            for path, row in self._lock(placed).items():
+                if row.ref_count == 0:
+                    row.delete()
+                    super().delete(path)
+
+    def _save(self, name, content):
+        blob = self.write(name, content)
+        self.register(blob)
+        return blob.name
+
+    def delete(self, name):
+        if not name:
+            raise ValueError("The name must be given to delete().")
+        with transaction.atomic():
+            blob = MediaBlob.objects.select_for_update().filter(path=name).first()
+            if blob is not None and blob.ref_count > 1:
+                MediaBlob.objects.filter(pk=blob.pk).update(ref_count=F("ref_count") - 1)
+                return
+            if blob is not None:
+                blob.delete()
+            super().delete(name)
+
+    def release(self, name):
+        """模型记录被删除或文件被替换时调用：只处理由本存储保存的文件"""
+        if name and MediaBlob.objects.filter(path=name).exists():
+            self.delete(name)
+
+
+content_storage = ContentAddressedStorage()
+
+
+def release_on_commit(name):
+    """事务提交后释放文件引用（事务回滚时不释放）"""
+    if name:
+        transaction.on_commit(lambda: content_storage.release(name))
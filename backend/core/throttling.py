@@ -0,0 +1,119 @@
+"""
+登录/注册接口的滑动窗口限流
+
+计数器保存在 Django 缓存中（配置 REDIS_CACHE_URL 时为 Redis，多进程共享；否则为进程内缓存），
+每个窗口一个计数键，用 cache.incr 原子递增。滑动窗口按上一个窗口的计数加权估算：
+    估算值 = 上一窗口计数 × 上一窗口仍在滑动窗口内的比例 + 当前窗口计数
+限流在视图的 initial 阶段执行，超限请求在解析序列化器、计算密码哈希之前就被拒绝。
+缓存不可用时放行，限流故障不影响登录。
+"""
+import logging
+import math
+import time
+from typing import Dict, Optional, Tuple
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.throttling import BaseThrottle
+
+from .cache import cache_key
+
+logger = logging.getLogger(__name__)
+
+PERIODS = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+
+
+def parse_rate(rate: str) -> Tuple[int, int]:
+    """把 "5/min" 解析为 (5, 60)"""
+    num, period = rate.split("/")
+    return int(num), PERIODS[period[0]]
+
+
+def hit(scope: str, ident: str, limit: int, window: int) -> Tuple[bool, Optional[float]]:
+    """记录一次请求，返回 (是否放行, 建议的重试等待秒数)"""
+    now = time.time()
+    index = int(now // window)
+    key = cache_key("throttle", scope, ident, index)
+    try:
+        cache.add(key, 0, window * 2)
+        current = cache.incr(key)
+        previous = cache.get(cache_key("throttle", scope, ident, index - 1), 0)
+    except Exception as e:
+        logger.warning(f"[throttle] {scope} counter unavailable: {e}")
+        return True, None
+    remaining = window - (now - index * window)
+    if previous * remaining / window + current <= limit:
+        return True, None
+    return False, math.ceil(remaining)
+
+
+def _incr_metric(scope: str, outcome: str):
+    key = cache_key("throttle_metrics", scope, outcome)
+    try:
+        cache.add(key, 0, None)
+        cache.incr(key)
+    except Exception:
+        pass
+
+
+def throttle_metrics() -> Dict[str, Dict[str, int]]:
+    """各限流规则累计放行和拒绝的请求数"""
+    keys = {
+        (scope, outcome): cache_key("throttle_metrics", scope, outcome)
+        for scope in settings.THROTTLE_RATES
+        for outcome in ("allowed", "rejected")
+    }
+    try:
+        values = cache.get_many(keys.values())
+    except Exception as e:
+        logger.warning(f"[throttle] read metrics failed: {e}")
+        values = {}
+    metrics = {scope: {"allowed": 0, "rejected": 0} for scope in settings.THROTTLE_RATES}
+    for (scope, outcome), key in keys.items():
+        metrics[scope][outcome] = values.get(key, 0)
+    return metrics
+
+
+class SlidingWindowThrottle(BaseThrottle):
+    """按 settings.THROTTLE_RATES[scope] 限流，子类提供限流对象的标识"""
+    scope: str = None
+
+    def get_ident_value(self, request) -> Optional[str]:
+        raise NotImplementedError
+
+    def allow_request(self, request, view):
+        self.retry_after = None
+        ident = self.get_ident_value(request)
+        if not ident:
+            return True
+        limit, window = parse_rate(settings.THROTTLE_RATES[self.scope])
+        allowed, self.retry_after = hit(self.scope, ident, limit, window)
+        _incr_metric(self.scope, "allowed" if allowed else "rejected")
+        if not allowed:
+            logger.info(f"[throttle] {self.scope} rejected {ident}")
+        return allowed
+
+    def wait(self):
+        return self.retry_after
+
+
+class LoginIPThrottle(SlidingWindowThrottle):
+    scope = "login_ip"
+
+    def get_ident_value(self, request):
+        return self.get_ident(request)
+
+
+class LoginPhoneThrottle(SlidingWindowThrottle):
+    scope = "login_phone"
+
+    def get_ident_value(self, request):
+        phone = request.data.get("phone") if hasattr(request.data, "get") else None
+        return str(phone).strip()[:20] if phone else None
+
+
+class RegisterIPThrottle(SlidingWindowThrottle):
+    scope = "register_ip"
+
+    def get_ident_value(self, request):
+        return self.get_ident(request)
@@ -5,3 +5,5 @@ class InteractionsConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "interactions"
 
+    def ready(self):
+        from . import signals  # noqa: F401
@@ -0,0 +1,29 @@
+# Generated by Django 4.2.30 on 2026-10-19 15:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("interactions", "0005_message"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="comment",
+            index=models.Index(
+                condition=models.Q(("is_deleted", False), ("parent__isnull", True)),
+                fields=["moment", "created_at"],
+                name="comment_visible_root_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="comment",
+            index=models.Index(
+                condition=models.Q(("is_deleted", False)),
+                fields=["parent", "created_at"],
+                name="comment_visible_reply_idx",
+            ),
+        ),
+    ]
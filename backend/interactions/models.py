@@ -7,6 +7,12 @@ from moments.models import Moment
 User = settings.AUTH_USER_MODEL
 
 
+class CommentQuerySet(models.QuerySet):
+    def visible(self):
+        """未删除的评论，命中 is_deleted=False 的部分索引"""
+        return self.filter(is_deleted=False)
+
+
 class Comment(models.Model):
     moment = models.ForeignKey(Moment, on_delete=models.CASCADE, related_name="comments")
     author = models.ForeignKey(User, on_delete=models.CASCADE, related_name="comments")
@@ -15,8 +21,24 @@ class Comment(models.Model):
     created_at = models.DateTimeField(default=timezone.now)
     is_deleted = models.BooleanField(default=False)
 
+    objects = CommentQuerySet.as_manager()
+
     class Meta:
         ordering = ["created_at", "id"]
+        indexes = [
+            # 动态下的一级评论
+            models.Index(
+                fields=["moment", "created_at"],
+                condition=models.Q(is_deleted=False, parent__isnull=True),
+                name="comment_visible_root_idx",
+            ),
+            # 评论的回复
+            models.Index(
+                fields=["parent", "created_at"],
+                condition=models.Q(is_deleted=False),
+                name="comment_visible_reply_idx",
+            ),
+        ]
 
     def __str__(self):
         return f"{self.author} on {self.moment_id}"
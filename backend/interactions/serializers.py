@@ -15,7 +15,7 @@ class CommentSerializer(serializers.ModelSerializer):
         read_only_fields = ["author", "moment", "parent", "created_at", "replies"]
 
     def get_replies(self, obj):
-        qs = obj.replies.filter(is_deleted=False)
+        qs = obj.replies.visible()
         return CommentSerializer(qs, many=True).data
 
     def validate(self, attrs):
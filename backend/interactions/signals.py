@@ -0,0 +1,21 @@
+"""
+点赞、评分写入后失效相关缓存
+"""
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from core.cache import avg_score_key, invalidate, invalidate_moments
+
+from .models import Like, Rating
+
+
+@receiver(post_save, sender=Like)
+@receiver(post_delete, sender=Like)
+def invalidate_moment_likes(sender, instance, **kwargs):
+    invalidate_moments(instance.moment_id)
+
+
+@receiver(post_save, sender=Rating)
+@receiver(post_delete, sender=Rating)
+def invalidate_avg_score(sender, instance, **kwargs):
+    invalidate(avg_score_key(instance.moment_id))
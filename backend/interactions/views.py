@@ -1,8 +1,10 @@
+from django.conf import settings
 from django.db.models import Avg, Q, Max, Count
 from drf_spectacular.utils import extend_schema, extend_schema_view, OpenApiExample, OpenApiParameter
 from rest_framework import generics, permissions, status
 from rest_framework.response import Response
 
+from core.cache import avg_score_key, get_or_compute
 from moments.models import Moment
 from users.models import User
 from .models import Comment, Rating, Like, Message
@@ -41,7 +43,7 @@ class CommentListCreateView(generics.ListCreateAPIView):
 
     def get_queryset(self):
         moment_id = self.kwargs.get("moment_id")
-        return Comment.objects.filter(moment_id=moment_id, parent__isnull=True, is_deleted=False)
+        return Comment.objects.visible().filter(moment_id=moment_id, parent__isnull=True)
 
     def get_serializer_context(self):
         context = super().get_serializer_context()
@@ -104,7 +106,11 @@ class AvgScoreView(generics.GenericAPIView):
         if not moment_id:
             return Response({"detail": "Missing moment_id"}, status=status.HTTP_400_BAD_REQUEST)
         
-        avg_score = Rating.objects.filter(moment_id=moment_id).aggregate(Avg("score"))["score__avg"]
+        avg_score = get_or_compute(
+            avg_score_key(moment_id),
+            settings.CACHE_TTL_AVG_SCORE,
+            lambda: Rating.objects.filter(moment_id=moment_id).aggregate(Avg("score"))["score__avg"],
+        )
         return Response({"moment_id": int(moment_id), "avg_score": avg_score or 0.0})
 
 
@@ -5,3 +5,5 @@ class MomentsConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "moments"
 
+    def ready(self):
+        from . import signals  # noqa: F401
@@ -0,0 +1,232 @@
+"""
+搜索建议的前缀树索引
+
+索引的词条包括全部标签和近期的热门搜索词，每个词条按原文、全拼、首字母
+以及从每个字开始的后缀写入前缀树（"天气" 可以被 "tq"、"tianqi"、"qi"、"气" 命中）。
+每个节点保存子树中得分最高的 top_k 个词条，查询只需沿前缀走到节点后直接返回。
+
+索引保存在进程内，距上次同步超过 AUTOCOMPLETE_REFRESH_SECONDS 时重新读取词条得分，
+只更新有变化的词条及其所在路径，不重建整棵树。
+"""
+import threading
+import time
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from django.conf import settings
+from django.db.models import Sum
+from django.db.models.functions import Coalesce
+
+from .models import SearchQuery, Tag
+from .utils import pinyin_syllables
+
+# 词条 = (类型, 文本)，同名的标签和搜索词是两个词条
+Term = Tuple[str, str]
+TAG = "tag"
+KEYWORD = "keyword"
+
+# 只索引每个键的前若干个字符，更长的查询在候选中再按完整前缀过滤
+MAX_KEY_LENGTH = 20
+
+
+class Entry(NamedTuple):
+    score: int
+    ref: Optional[int]
+
+
+class _Node:
+    __slots__ = ("children", "terms", "top")
+
+    def __init__(self):
+        self.children: Dict[str, "_Node"] = {}
+        # 键在此节点结束的词条
+        self.terms: set = set()
+        # 子树中得分最高的词条
+        self.top: List[Term] = []
+
+
+def normalize(text: str) -> str:
+    return " ".join((text or "").split()).lower()
+
+
+def term_keys(text: str) -> List[str]:
+    """词条写入索引的全部键：原文、全拼、首字母，以及从每个字开始的后缀"""
+    text = normalize(text)
+    syllables = pinyin_syllables(text)
+    initials = pinyin_syllables(text, initials=True)
+    keys = set()
+    for i in range(len(text)):
+        keys.add(text[i:])
+        keys.add("".join(syllables[i:]).replace(" ", ""))
+        keys.add("".join(initials[i:]).replace(" ", ""))
+    return sorted(key[:MAX_KEY_LENGTH] for key in keys if key.strip())
+
+
+class AutocompleteIndex:
+    def __init__(self, top_k: int = 10):
+        self.top_k = top_k
+        self.root = _Node()
+        self.entries: Dict[Term, Entry] = {}
+        self.keys: Dict[Term, List[str]] = {}
+
+    def __len__(self):
+        return len(self.entries)
+
+    def _rank(self, terms) -> List[Term]:
+        # 增量更新时其他路径上可能还留着已删除的词条，跳过即可
+        terms = [term for term in terms if term in self.entries]
+        return sorted(terms, key=lambda term: (-self.entries[term].score, term[1]))[: self.top_k]
+
+    def _recompute(self, node: _Node):
+        candidates = set(node.terms)
+        for child in node.children.values():
+            candidates.update(child.top)
+        node.top = self._rank(candidates)
+
+    def _path(self, key: str, create: bool) -> List[_Node]:
+        path = [self.root]
+        for char in key:
+            node = path[-1].children.get(char)
+            if node is None:
+                if not create:
+                    break
+                node = path[-1].children[char] = _Node()
+            path.append(node)
+        return path
+
+    def _refresh_path(self, key: str):
+        """自底向上重新计算路径上各节点的 top_k，并剪掉空节点"""
+        path = self._path(key, create=False)
+        for depth in range(len(path) - 1, -1, -1):
+            node = path[depth]
+            if depth and not node.terms and not node.children:
+                del path[depth - 1].children[key[depth - 1]]
+                continue
+            self._recompute(node)
+
+    def upsert(self, term: Term, score: int, ref: Optional[int] = None):
+        self.entries[term] = Entry(score, ref)
+        if term not in self.keys:
+            self.keys[term] = term_keys(term[1])
+            for key in self.keys[term]:
+                self._path(key, create=True)[-1].terms.add(term)
+        for key in self.keys[term]:
+            self._refresh_path(key)
+
+    def remove(self, term: Term):
+        if term not in self.entries:
+            return
+        keys = self.keys.pop(term)
+        del self.entries[term]
+        for key in keys:
+            self._path(key, create=False)[-1].terms.discard(term)
+        for key in keys:
+            self._refresh_path(key)
+
+    def build(self, entries: Dict[Term, Entry]):
+        """一次性构建：先写入全部词条，再后序遍历计算每个节点的 top_k"""
+        self.root = _Node()
+        self.entries = dict(entries)
+        self.keys = {}
+        for term in self.entries:
+            self.keys[term] = term_keys(term[1])
+            for key in self.keys[term]:
+                self._path(key, create=True)[-1].terms.add(term)
+        stack, order = [self.root], []
+        while stack:
+            node = stack.pop()
+            order.append(node)
+            stack.extend(node.children.values())
+        for node in reversed(order):
+            self._recompute(node)
+
+    def sync(self, entries: Dict[Term, Entry]) -> int:
+        """与最新的词条得分对齐，只更新有变化的词条，返回更新的词条数"""
+        if not self.entries:
+            self.build(entries)
+            return len(entries)
+        changed = 0
+        for term in [term for term in self.entries if term not in entries]:
+            self.remove(term)
+            changed += 1
+        for term, entry in entries.items():
+            if self.entries.get(term) != entry:
+                self.upsert(term, entry.score, entry.ref)
+                changed += 1
+        return changed
+
+    def search(self, query: str, limit: int = 10) -> List[Tuple[Term, Entry]]:
+        query = normalize(query)
+        if not query:
+            return []
+        node = self.root
+        for char in query[:MAX_KEY_LENGTH]:
+            node = node.children.get(char)
+            if node is None:
+                return []
+        terms = node.top
+        if len(query) > MAX_KEY_LENGTH:
+            compact = query.replace(" ", "")
+            terms = [
+                term for term in terms
+                if any(key.startswith(query) or key.startswith(compact) for key in term_keys(term[1]))
+            ]
+        # 与 sync() 并发时节点上可能还留着刚删除的词条，跳过即可
+        results = []
+        for term in terms:
+            entry = self.entries.get(term)
+            if entry is not None:
+                results.append((term, entry))
+                if len(results) >= limit:
+                    break
+        return results
+
+
+def load_entries() -> Dict[Term, Entry]:
+    """全部标签（得分为累计使用次数）和近期搜索次数最多的搜索词"""
+    from .search_log import top_queries
+
+    entries = {
+        (TAG, name): Entry(score, tag_id)
+        for tag_id, name, score in Tag.objects.annotate(
+            score=Coalesce(Sum("usage_buckets__count"), 0)
+        ).values_list("id", "name", "score")
+    }
+    for row in top_queries(SearchQuery.Source.SEARCH, settings.AUTOCOMPLETE_KEYWORDS):
+        entries[(KEYWORD, row["keyword"])] = Entry(row["count"], None)
+    return entries
+
+
+_index = AutocompleteIndex(top_k=settings.AUTOCOMPLETE_TOP_K)
+_sync_lock = threading.Lock()
+_synced_at: Optional[float] = None
+
+
+def mark_stale():
+    """让下一次查询重新同步索引（本进程新建标签后调用）"""
+    global _synced_at
+    _synced_at = None
+
+
+def get_index() -> AutocompleteIndex:
+    global _synced_at
+    stale = _synced_at is None or time.monotonic() - _synced_at >= settings.AUTOCOMPLETE_REFRESH_SECONDS
+    # 只让一个线程同步，其他线程继续使用现有索引（首次构建时等待）
+    if stale and _sync_lock.acquire(blocking=_synced_at is None):
+        try:
+            _index.sync(load_entries())
+            _synced_at = time.monotonic()
+        finally:
+            _sync_lock.release()
+    return _index
+
+
+def suggest(query: str, limit: int = 10) -> dict:
+    """返回与搜索建议接口相同结构的结果：热门搜索词作为 suggestions，标签作为 tags"""
+    index = get_index()
+    suggestions, tags = [], []
+    for (kind, text), entry in index.search(query, limit * 2):
+        if kind == TAG and len(tags) < limit:
+            tags.append({"id": entry.ref, "name": text})
+        elif kind == KEYWORD and len(suggestions) < limit:
+            suggestions.append({"text": text, "keyword": text, "moment_id": None})
+    return {"suggestions": suggestions, "tags": tags}
@@ -0,0 +1,129 @@
+"""
+图片衍生版本生成（缩略图 / 中图 / 大图，WebP + JPEG）
+"""
+import io
+import logging
+from typing import List
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+from PIL import Image as PILImage
+from PIL import ImageOps
+
+from core.cache import invalidate_moments
+
+from .models import Image, ImageDerivative
+
+logger = logging.getLogger(__name__)
+
+# 各档位的最大边长（像素），不会放大原图
+VARIANT_MAX_SIDE = {
+    ImageDerivative.Variant.THUMBNAIL: 320,
+    ImageDerivative.Variant.MEDIUM: 720,
+    ImageDerivative.Variant.LARGE: 1280,
+}
+
+FORMAT_EXTENSION = {
+    ImageDerivative.Format.WEBP: "webp",
+    ImageDerivative.Format.JPEG: "jpg",
+}
+
+
+def derivative_path(image: Image, variant: str, image_format: str) -> str:
+    return f"derivatives/{image.id}/{variant}.{FORMAT_EXTENSION[image_format]}"
+
+
+def reuse_duplicate_derivatives(image: Image) -> List[ImageDerivative]:
+    """
+    内容寻址存储下相同内容的图片共用同一个文件名，
+    如果其他图片已经生成过衍生版本，直接复制记录（共用衍生文件），不再重复解码缩放
+    """
+    source_id = (
+        ImageDerivative.objects.filter(image__image_file=image.image_file.name)
+        .exclude(image=image)
+        .values_list("image_id", flat=True)
+        .first()
+    )
+    if source_id is None:
+        return []
+    derivatives = [
+        ImageDerivative(
+            image=image,
+            variant=d.variant,
+            format=d.format,
+            file=d.file.name,
+            width=d.width,
+            height=d.height,
+            size_bytes=d.size_bytes,
+        )
+        for d in ImageDerivative.objects.filter(image_id=source_id)
+    ]
+    with transaction.atomic():
+        ImageDerivative.objects.filter(image=image).delete()
+        ImageDerivative.objects.bulk_create(derivatives)
+    return derivatives
+
+
+def generate_derivatives(image: Image, reuse: bool = True) -> List[ImageDerivative]:
+    """
+    为一张图片生成全部衍生版本并写入数据库（已有的衍生版本会被替换）
+    原图只解码一次，从大到小依次缩放，每档都基于上一档结果缩小以减少计算量
+    reuse=True 时优先复用相同内容图片的衍生版本
+    """
+    if not image.image_file:
+        return []
+    if reuse:
+        reused = reuse_duplicate_derivatives(image)
+        if reused:
+            return reused
+
+    quality = settings.IMAGE_DERIVATIVE_QUALITY
+    derivatives = []
+    with image.image_file.open("rb") as f, PILImage.open(f) as original:
+        largest = max(VARIANT_MAX_SIDE.values())
+        if original.format == "JPEG":
+            original.draft("RGB", (largest, largest))
+        current = ImageOps.exif_transpose(original)
+        if current.mode not in ("RGB", "L"):
+            current = current.convert("RGB")
+
+        for variant, max_side in sorted(VARIANT_MAX_SIDE.items(), key=lambda item: -item[1]):
+            current = current.copy()
+            current.thumbnail((max_side, max_side), PILImage.LANCZOS)
+            for image_format in FORMAT_EXTENSION:
+                buffer = io.BytesIO()
+                current.save(buffer, format=image_format, quality=quality, optimize=True)
+                path = derivative_path(image, variant, image_format)
+                if default_storage.exists(path):
+                    default_storage.delete(path)
+                saved_path = default_storage.save(path, ContentFile(buffer.getvalue()))
+                derivatives.append(ImageDerivative(
+                    image=image,
+                    variant=variant,
+                    format=image_format,
+                    file=saved_path,
+                    width=current.width,
+                    height=current.height,
+                    size_bytes=buffer.tell(),
+                ))
+
+    with transaction.atomic():
+        ImageDerivative.objects.filter(image=image).delete()
+        ImageDerivative.objects.bulk_create(derivatives)
+    return derivatives
+
+
+def generate_moment_derivatives(moment_id: int) -> int:
+    """为一条动态的全部图片生成衍生版本，返回成功处理的图片数"""
+    done = 0
+    for image in Image.objects.filter(moment_id=moment_id):
+        try:
+            if generate_derivatives(image):
+                done += 1
+        except Exception as e:
+            # 单张图片损坏不影响其他图片
+            logger.error(f"[generate_derivatives] Image {image.id} failed: {e}")
+    invalidate_moments(moment_id)
+    return done
@@ -0,0 +1,86 @@
+"""
+图文动态的图片入库
+
+1. 写入前只读取图片头信息，拒绝损坏、格式不支持、文件或像素过大的图片
+2. 在有界线程池中并发把文件写入内容寻址存储（线程中只写文件，不访问数据库）
+3. 登记引用计数，并用一次 bulk_create 插入全部 Image 记录
+"""
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import List
+
+from django.conf import settings
+from django.db import transaction
+from PIL import Image as PILImage
+from rest_framework import serializers
+
+from core.storage import StoredBlob
+
+from .models import Image, Moment
+
+logger = logging.getLogger(__name__)
+
+ALLOWED_FORMATS = {"JPEG", "PNG", "GIF", "WEBP"}
+
+# 所有请求共用一个线程池，限制同时写存储的文件数
+_ingest_executor = ThreadPoolExecutor(
+    max_workers=settings.IMAGE_INGEST_WORKERS, thread_name_prefix="image-ingest"
+)
+
+
+def inspect_image(upload):
+    """只解析图片头，校验格式、文件大小和像素数，不合格时抛出 ValidationError"""
+    name = getattr(upload, "name", "") or "图片"
+    if upload.size and upload.size > settings.IMAGE_UPLOAD_MAX_SIZE:
+        raise serializers.ValidationError({"images": f"{name} 文件过大"})
+    try:
+        upload.seek(0)
+        with PILImage.open(upload) as img:
+            image_format, (width, height) = img.format, img.size
+    except (OSError, PILImage.DecompressionBombError, ValueError):
+        raise serializers.ValidationError({"images": f"{name} 不是有效的图片"})
+    finally:
+        upload.seek(0)
+    if image_format not in ALLOWED_FORMATS:
+        raise serializers.ValidationError({"images": f"{name} 格式不支持"})
+    if width * height > settings.IMAGE_UPLOAD_MAX_PIXELS:
+        raise serializers.ValidationError({"images": f"{name} 分辨率过大"})
+
+
+def _store(upload) -> StoredBlob:
+    field = Image._meta.get_field("image_file")
+    return field.storage.write(field.generate_filename(None, upload.name), upload)
+
+
+def ingest_images(moment: Moment, uploads) -> List[Image]:
+    """
+    并发写入图片文件（内容相同的图片只存一份），再在当前线程登记引用并批量插入记录；
+    任一文件写入失败或登记失败时清理本次写入的文件
+    """
+    uploads = list(uploads or [])
+    if not uploads:
+        return []
+
+    storage = Image._meta.get_field("image_file").storage
+    futures = [_ingest_executor.submit(_store, upload) for upload in uploads]
+    blobs, error = [], None
+    for future in futures:
+        try:
+            blobs.append(future.result())
+        except Exception as e:
+            error = error or e
+    if error:
+        storage.discard(*blobs)
+        raise error
+
+    try:
+        # 使用真正的保存点：失败时先回滚到保存点，外层事务仍可用，discard() 才能查询引用计数
+        with transaction.atomic():
+            storage.register(*blobs)
+            return Image.objects.bulk_create([
+                Image(moment=moment, image_file=blob.name, order=idx)
+                for idx, blob in enumerate(blobs, start=1)
+            ])
+    except Exception:
+        storage.discard(*blobs)
+        raise
@@ -0,0 +1,118 @@
+"""
+热门标签排行榜
+
+TagUsage 按动态发布时间所在的小时分桶记录每个标签的使用次数：
+- 关联标签时对应桶 +1，删除（含软删除）动态时 -1，恢复时 +1
+- 查询某个时间窗口内的热门标签只需汇总窗口内的桶，与动态总量无关
+- compact_buckets 定期把较早的小时桶合并为天桶，控制表的大小
+"""
+from collections import Counter, defaultdict
+from datetime import datetime, timedelta
+from datetime import timezone as dt_timezone
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Sum
+from django.db.models.functions import ExtractHour
+from django.utils import timezone
+
+from .models import Moment, MomentTag, TagUsage
+
+# 热门标签支持的时间窗口，None 表示全部时间
+WINDOWS = {
+    "24h": timedelta(hours=24),
+    "7d": timedelta(days=7),
+    "30d": timedelta(days=30),
+    "all": None,
+}
+
+
+def bucket_of(moment_time: datetime) -> datetime:
+    """所在的 UTC 整点"""
+    return moment_time.astimezone(dt_timezone.utc).replace(minute=0, second=0, microsecond=0)
+
+
+def apply_usage(deltas: Dict[Tuple[int, datetime], int]):
+    """
+    批量累加 {(tag_id, bucket): 增量}
+    先补齐缺失的桶，再按 (桶, 增量) 分组更新，发布一条动态只需两次查询
+    """
+    deltas = {key: delta for key, delta in deltas.items() if delta}
+    if not deltas:
+        return
+    groups = defaultdict(list)
+    for (tag_id, bucket), delta in deltas.items():
+        groups[(bucket, delta)].append(tag_id)
+    with transaction.atomic(savepoint=False):
+        TagUsage.objects.bulk_create(
+            [TagUsage(tag_id=tag_id, bucket=bucket) for tag_id, bucket in deltas],
+            ignore_conflicts=True,
+        )
+        for (bucket, delta), tag_ids in groups.items():
+            TagUsage.objects.filter(bucket=bucket, tag_id__in=tag_ids).update(count=F("count") + delta)
+
+
+def record_links(links: Iterable[Tuple[int, int, datetime]], sign: int = 1):
+    """按 (moment_id, tag_id, 动态发布时间) 记录新增（sign=1）或移除（sign=-1）的标签关联"""
+    deltas = Counter()
+    for _, tag_id, created_at in links:
+        deltas[(tag_id, bucket_of(created_at))] += sign
+    apply_usage(deltas)
+
+
+def record_moment(moment: Moment, sign: int):
+    """动态删除（sign=-1）或恢复（sign=1）时调整其全部标签的计数"""
+    tag_ids = MomentTag.objects.filter(moment_id=moment.id).values_list("tag_id", flat=True)
+    record_links(((moment.id, tag_id, moment.created_at) for tag_id in tag_ids), sign)
+
+
+def top_tags(window: Optional[str] = None, limit: int = 10) -> List[Dict]:
+    """返回时间窗口内使用次数最多的标签"""
+    window = window if window in WINDOWS else settings.HOT_TAG_DEFAULT_WINDOW
+    qs = TagUsage.objects.all()
+    if WINDOWS[window] is not None:
+        qs = qs.filter(bucket__gte=bucket_of(timezone.now() - WINDOWS[window]))
+    rows = (
+        qs.values("tag_id", "tag__name")
+        .annotate(total=Sum("count"))
+        .filter(total__gt=0)
+        .order_by("-total", "-tag_id")[:limit]
+    )
+    return [{"id": row["tag_id"], "name": row["tag__name"], "count": row["total"]} for row in rows]
+
+
+def compact_buckets(older_than: timedelta = None) -> int:
+    """把早于 older_than 的小时桶合并为天桶，返回合并掉的行数"""
+    older_than = older_than or timedelta(days=settings.HOT_TAG_COMPACT_AFTER_DAYS)
+    cutoff = bucket_of(timezone.now() - older_than).replace(hour=0)
+    # 按 UTC 取小时（__hour 查询会换算到 TIME_ZONE），0 点的是天桶
+    hourly = (
+        TagUsage.objects.filter(bucket__lt=cutoff)
+        .annotate(utc_hour=ExtractHour("bucket", tzinfo=dt_timezone.utc))
+        .exclude(utc_hour=0)
+    )
+    deltas = Counter()
+    ids = []
+    for usage in hourly.only("id", "tag_id", "bucket", "count"):
+        deltas[(usage.tag_id, usage.bucket.replace(hour=0))] += usage.count
+        ids.append(usage.id)
+    with transaction.atomic():
+        TagUsage.objects.filter(id__in=ids).delete()
+        apply_usage(deltas)
+    return len(ids)
+
+
+def rebuild() -> int:
+    """根据现有的标签关联重新计算全部计数，返回写入的桶数量"""
+    deltas = Counter()
+    links = MomentTag.objects.filter(moment__is_deleted=False).values_list("tag_id", "moment__created_at")
+    for tag_id, created_at in links.iterator():
+        deltas[(tag_id, bucket_of(created_at))] += 1
+    with transaction.atomic():
+        TagUsage.objects.all().delete()
+        TagUsage.objects.bulk_create(
+            [TagUsage(tag_id=tag_id, bucket=bucket, count=count) for (tag_id, bucket), count in deltas.items()],
+            batch_size=1000,
+        )
+    return len(deltas)
@@ -0,0 +1,54 @@
+"""
+为历史图片补全衍生版本（缩略图 / 中图 / 大图）
+
+使用方式：
+    python manage.py generate_image_derivatives            # 只处理还没有衍生版本的图片
+    python manage.py generate_image_derivatives --all      # 重新生成全部图片
+    python manage.py generate_image_derivatives --async    # 按动态交给 Celery 后台执行
+"""
+from django.core.management.base import BaseCommand
+
+from moments.derivatives import generate_derivatives
+from moments.models import Image
+from moments.tasks import generate_image_derivatives
+
+
+class Command(BaseCommand):
+    help = '为历史图片补全缩略图/中图/大图衍生版本'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', dest='regenerate', action='store_true', help='重新生成全部图片的衍生版本')
+        parser.add_argument('--chunk-size', type=int, default=200, help='每次从数据库读取的图片数量')
+        parser.add_argument('--async', dest='run_async', action='store_true', help='按动态交给 Celery 后台执行')
+
+    def handle(self, *args, **options):
+        qs = Image.objects.filter(moment__is_deleted=False)
+        if not options['regenerate']:
+            qs = qs.filter(derivatives__isnull=True)
+
+        if options['run_async']:
+            moment_ids = list(qs.order_by().values_list('moment_id', flat=True).distinct())
+            for moment_id in moment_ids:
+                generate_image_derivatives.delay(moment_id)
+            self.stdout.write(self.style.SUCCESS(f'✅ 已提交 {len(moment_ids)} 个后台任务'))
+            return
+
+        self.stdout.write(self.style.NOTICE('🚀 开始生成图片衍生版本...'))
+        done = failed = 0
+        last_id = 0
+        while True:
+            # 按 id 游标分页，避免大表 OFFSET 扫描
+            images = list(qs.filter(id__gt=last_id).order_by('id')[:options['chunk_size']])
+            if not images:
+                break
+            for image in images:
+                try:
+                    generate_derivatives(image, reuse=not options['regenerate'])
+                    done += 1
+                except Exception as e:
+                    failed += 1
+                    self.stdout.write(self.style.WARNING(f'  ⚠️ 图片 {image.id} 处理失败: {e}'))
+            last_id = images[-1].id
+            self.stdout.write(f'  已处理到 id {last_id}（成功 {done}，失败 {failed}）')
+
+        self.stdout.write(self.style.SUCCESS(f'🎉 衍生版本生成完成: 成功 {done} 张，失败 {failed} 张'))
@@ -0,0 +1,28 @@
+"""
+根据现有的标签关联重建热门标签排行榜计数
+
+使用方式：
+    python manage.py rebuild_tag_leaderboard              # 重新计算全部小时桶
+    python manage.py rebuild_tag_leaderboard --compact    # 重建后把较早的小时桶合并为天桶
+"""
+from django.core.management.base import BaseCommand
+
+from core.cache import invalidate_hot_search
+from moments import leaderboard
+
+
+class Command(BaseCommand):
+    help = '根据现有的标签关联重建热门标签排行榜计数'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--compact', action='store_true', help='重建后合并较早的小时桶')
+
+    def handle(self, *args, **options):
+        self.stdout.write(self.style.NOTICE('🚀 开始重建热门标签计数...'))
+        buckets = leaderboard.rebuild()
+        self.stdout.write(f'  写入 {buckets} 个小时桶')
+        if options['compact']:
+            merged = leaderboard.compact_buckets()
+            self.stdout.write(f'  合并 {merged} 个小时桶')
+        invalidate_hot_search()
+        self.stdout.write(self.style.SUCCESS('🎉 热门标签计数重建完成'))
@@ -0,0 +1,46 @@
+# Generated by Django 4.2.30 on 2026-10-19 14:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("moments", "0002_initial"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="moment",
+            name="video_duration",
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="moment",
+            name="video_playlist",
+            field=models.FileField(blank=True, null=True, upload_to="hls/"),
+        ),
+        migrations.AddField(
+            model_name="moment",
+            name="video_poster",
+            field=models.ImageField(blank=True, null=True, upload_to="hls/"),
+        ),
+        migrations.AddField(
+            model_name="moment",
+            name="video_progress",
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.AlterField(
+            model_name="moment",
+            name="video_status",
+            field=models.CharField(
+                choices=[
+                    ("PROCESSING", "PROCESSING"),
+                    ("READY", "READY"),
+                    ("FAILED", "FAILED"),
+                ],
+                default="READY",
+                max_length=15,
+            ),
+        ),
+    ]
@@ -0,0 +1,61 @@
+# Generated by Django 4.2.30 on 2026-10-19 14:13
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("moments", "0003_video_transcoding"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ImageDerivative",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "variant",
+                    models.CharField(
+                        choices=[
+                            ("thumbnail", "thumbnail"),
+                            ("medium", "medium"),
+                            ("large", "large"),
+                        ],
+                        max_length=10,
+                    ),
+                ),
+                (
+                    "format",
+                    models.CharField(
+                        choices=[("WEBP", "WEBP"), ("JPEG", "JPEG")], max_length=4
+                    ),
+                ),
+                ("file", models.ImageField(upload_to="derivatives/")),
+                ("width", models.PositiveIntegerField()),
+                ("height", models.PositiveIntegerField()),
+                ("size_bytes", models.PositiveIntegerField()),
+                (
+                    "image",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="derivatives",
+                        to="moments.image",
+                    ),
+                ),
+            ],
+            options={
+                "ordering": ["width", "id"],
+                "unique_together": {("image", "variant", "format")},
+            },
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 4.2.30 on 2026-10-19 14:26
+
+import core.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0001_initial"),
+        ("moments", "0005_video_uploads"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="image",
+            name="image_file",
+            field=models.ImageField(
+                storage=core.storage.ContentAddressedStorage(), upload_to="images/"
+            ),
+        ),
+        migrations.AlterField(
+            model_name="moment",
+            name="video_file",
+            field=models.FileField(
+                blank=True,
+                null=True,
+                storage=core.storage.ContentAddressedStorage(),
+                upload_to="videos/",
+            ),
+        ),
+    ]
@@ -0,0 +1,70 @@
+# Generated by Django 4.2.30 on 2026-10-19 14:38
+
+from django.db import migrations, models
+import django.db.models.deletion
+from collections import Counter
+from datetime import timezone
+
+
+def backfill_tag_usage(apps, schema_editor):
+    MomentTag = apps.get_model("moments", "MomentTag")
+    TagUsage = apps.get_model("moments", "TagUsage")
+    counts = Counter()
+    links = MomentTag.objects.filter(moment__is_deleted=False).values_list(
+        "tag_id", "moment__created_at"
+    )
+    for tag_id, created_at in links.iterator():
+        bucket = created_at.astimezone(timezone.utc).replace(
+            minute=0, second=0, microsecond=0
+        )
+        counts[(tag_id, bucket)] += 1
+    TagUsage.objects.bulk_create(
+        [
+            TagUsage(tag_id=tag_id, bucket=bucket, count=count)
+            for (tag_id, bucket), count in counts.items()
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("moments", "0006_content_addressed_storage"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="TagUsage",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("bucket", models.DateTimeField()),
+                ("count", models.IntegerField(default=0)),
+                (
+                    "tag",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="usage_buckets",
+                        to="moments.tag",
+                    ),
+                ),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["bucket"], name="moments_tag_bucket_ec1161_idx"
+                    )
+                ],
+                "unique_together": {("tag", "bucket")},
+            },
+        ),
+        migrations.RunPython(backfill_tag_usage, migrations.RunPython.noop),
+    ]
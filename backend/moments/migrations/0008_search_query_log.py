@@ -0,0 +1,58 @@
+# Generated by Django 4.2.30 on 2026-10-19 14:43
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ("moments", "0007_tag_usage"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="SearchQuery",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("query", models.CharField(max_length=50)),
+                (
+                    "source",
+                    models.CharField(
+                        choices=[("SEARCH", "SEARCH"), ("SUGGEST", "SUGGEST")],
+                        max_length=10,
+                    ),
+                ),
+                ("created_at", models.DateTimeField(default=django.utils.timezone.now)),
+                (
+                    "user",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name="+",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["source", "created_at"],
+                        name="moments_sea_source_c97c7b_idx",
+                    )
+                ],
+            },
+        ),
+    ]
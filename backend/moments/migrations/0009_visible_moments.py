@@ -0,0 +1,43 @@
+# Generated by Django 4.2.30 on 2026-10-19 15:37
+
+from django.db import migrations, models
+
+
+def backfill_is_visible(apps, schema_editor):
+    """新字段默认为 True，把已删除的动态和未转码完成的视频标记为不可见"""
+    Moment = apps.get_model("moments", "Moment")
+    Moment.objects.filter(
+        models.Q(is_deleted=True) | (~models.Q(type="IMAGE") & ~models.Q(video_status="READY"))
+    ).update(is_visible=False)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("moments", "0008_search_query_log"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="moment",
+            name="is_visible",
+            field=models.BooleanField(default=True, editable=False),
+        ),
+        migrations.RunPython(backfill_is_visible, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name="moment",
+            index=models.Index(
+                condition=models.Q(("is_visible", True)),
+                fields=["author", "-created_at"],
+                name="moment_visible_author_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="moment",
+            index=models.Index(
+                condition=models.Q(("is_visible", True)),
+                fields=["-created_at"],
+                name="moment_visible_recent_idx",
+            ),
+        ),
+    ]
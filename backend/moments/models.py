@@ -1,7 +1,12 @@
+import uuid
+
 from django.conf import settings
-from django.db import models
+from django.db import models, transaction
+from django.db.models import Case, Q, Value, When
 from django.utils import timezone
 
+from core.storage import content_storage
+
 User = settings.AUTH_USER_MODEL
 
 
@@ -12,6 +17,33 @@ class Tag(models.Model):
         return self.name
 
 
+# 影响动态可见性的字段，修改它们时需要重新计算 is_visible
+VISIBILITY_FIELDS = {"is_deleted", "type", "video_status"}
+
+
+class MomentQuerySet(models.QuerySet):
+    def visible(self):
+        """用户端可见的动态，命中 is_visible=True 的部分索引"""
+        return self.filter(is_visible=True)
+
+    def update(self, **kwargs):
+        # queryset.update 不经过 save()，修改可见性相关字段后在同一事务中按新值重新计算 is_visible
+        if not VISIBILITY_FIELDS & kwargs.keys():
+            return super().update(**kwargs)
+        with transaction.atomic(using=self.db):
+            ids = list(self.values_list("pk", flat=True))
+            rows = super().update(**kwargs)
+            visible = Case(When(self.model.visible_condition(), then=Value(True)), default=Value(False))
+            self.model._base_manager.using(self.db).filter(pk__in=ids).update(is_visible=visible)
+        return rows
+
+    def bulk_create(self, objs, *args, **kwargs):
+        objs = list(objs)
+        for obj in objs:
+            obj.is_visible = obj.compute_visible()
+        return super().bulk_create(objs, *args, **kwargs)
+
+
 class Moment(models.Model):
     class MomentType(models.TextChoices):
         IMAGE = "IMAGE", "IMAGE"
@@ -20,21 +52,57 @@ class Moment(models.Model):
     class VideoStatus(models.TextChoices):
         PROCESSING = "PROCESSING", "PROCESSING"
         READY = "READY", "READY"
+        FAILED = "FAILED", "FAILED"
 
     author = models.ForeignKey(User, on_delete=models.CASCADE, related_name="moments")
     content = models.TextField(blank=True, null=True)
     type = models.CharField(max_length=10, choices=MomentType.choices)
-    video_file = models.FileField(upload_to="videos/", blank=True, null=True)
+    video_file = models.FileField(upload_to="videos/", storage=content_storage, blank=True, null=True)
     video_status = models.CharField(
         max_length=15, choices=VideoStatus.choices, default=VideoStatus.READY
     )
+    # 转码进度（0-100）、时长、HLS 主播放列表和封面，由 moments.tasks 中的转码任务写入
+    video_progress = models.PositiveSmallIntegerField(default=0)
+    video_duration = models.FloatField(blank=True, null=True)
+    video_playlist = models.FileField(upload_to="hls/", blank=True, null=True)
+    video_poster = models.ImageField(upload_to="hls/", blank=True, null=True)
     is_deleted = models.BooleanField(default=False)
+    # 未删除，且是图片动态或已转码完成的视频；由 save()/MomentQuerySet 根据上面三个字段维护
+    is_visible = models.BooleanField(default=True, editable=False)
     created_at = models.DateTimeField(default=timezone.now)
     tags = models.ManyToManyField(Tag, through="MomentTag", blank=True, related_name="moments")
 
+    objects = MomentQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # 信息流、我的动态、用户主页
+            models.Index(
+                fields=["author", "-created_at"], condition=Q(is_visible=True), name="moment_visible_author_idx"
+            ),
+            # 搜索和搜索建议
+            models.Index(fields=["-created_at"], condition=Q(is_visible=True), name="moment_visible_recent_idx"),
+        ]
+
     def __str__(self):
         return f"{self.author} - {self.type} - {self.created_at}"
 
+    @classmethod
+    def visible_condition(cls) -> Q:
+        return Q(is_deleted=False) & (Q(type=cls.MomentType.IMAGE) | Q(video_status=cls.VideoStatus.READY))
+
+    def compute_visible(self) -> bool:
+        return not self.is_deleted and (
+            self.type == self.MomentType.IMAGE or self.video_status == self.VideoStatus.READY
+        )
+
+    def save(self, *args, **kwargs):
+        self.is_visible = self.compute_visible()
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None and VISIBILITY_FIELDS & set(update_fields):
+            kwargs["update_fields"] = {*update_fields, "is_visible"}
+        super().save(*args, **kwargs)
+
 
 class MomentTag(models.Model):
     moment = models.ForeignKey(Moment, on_delete=models.CASCADE)
@@ -44,9 +112,27 @@ class MomentTag(models.Model):
         unique_together = ("moment", "tag")
 
 
+class TagUsage(models.Model):
+    """
+    标签使用量的时间分桶计数（热门标签排行榜），发布/删除动态时增量维护
+    近期为小时桶，较早的小时桶会被定期合并为天桶
+    """
+
+    tag = models.ForeignKey(Tag, on_delete=models.CASCADE, related_name="usage_buckets")
+    bucket = models.DateTimeField()
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        unique_together = ("tag", "bucket")
+        indexes = [models.Index(fields=["bucket"])]
+
+    def __str__(self):
+        return f"{self.tag_id}@{self.bucket:%Y-%m-%d %H}: {self.count}"
+
+
 class Image(models.Model):
     moment = models.ForeignKey(Moment, on_delete=models.CASCADE, related_name="images")
-    image_file = models.ImageField(upload_to="images/")
+    image_file = models.ImageField(upload_to="images/", storage=content_storage)
     order = models.PositiveIntegerField(default=1)
 
     class Meta:
@@ -55,3 +141,73 @@ class Image(models.Model):
     def __str__(self):
         return f"Image {self.order} for moment {self.moment_id}"
 
+
+
+class ImageDerivative(models.Model):
+    """图片的缩略图/中图/大图衍生版本，由 moments.tasks.generate_image_derivatives 异步生成"""
+
+    class Variant(models.TextChoices):
+        THUMBNAIL = "thumbnail", "thumbnail"
+        MEDIUM = "medium", "medium"
+        LARGE = "large", "large"
+
+    class Format(models.TextChoices):
+        WEBP = "WEBP", "WEBP"
+        JPEG = "JPEG", "JPEG"
+
+    image = models.ForeignKey(Image, on_delete=models.CASCADE, related_name="derivatives")
+    variant = models.CharField(max_length=10, choices=Variant.choices)
+    format = models.CharField(max_length=4, choices=Format.choices)
+    file = models.ImageField(upload_to="derivatives/")
+    width = models.PositiveIntegerField()
+    height = models.PositiveIntegerField()
+    size_bytes = models.PositiveIntegerField()
+
+    class Meta:
+        unique_together = ("image", "variant", "format")
+        ordering = ["width", "id"]
+
+    def __str__(self):
+        return f"{self.variant} {self.format} for image {self.image_id}"
+
+
+class VideoUpload(models.Model):
+    """视频分块上传会话：分块写入临时文件，完成并校验后生成视频动态"""
+
+    class Status(models.TextChoices):
+        UPLOADING = "UPLOADING", "UPLOADING"
+        COMPLETED = "COMPLETED", "COMPLETED"
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="video_uploads")
+    filename = models.CharField(max_length=255)
+    total_size = models.PositiveBigIntegerField()
+    # 客户端提供的整个文件的 SHA-256（十六进制）
+    checksum = models.CharField(max_length=64)
+    received_bytes = models.PositiveBigIntegerField(default=0)
+    status = models.CharField(max_length=10, choices=Status.choices, default=Status.UPLOADING)
+    moment = models.ForeignKey(Moment, on_delete=models.SET_NULL, blank=True, null=True, related_name="+")
+    created_at = models.DateTimeField(default=timezone.now)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Upload {self.id} ({self.received_bytes}/{self.total_size})"
+
+
+class SearchQuery(models.Model):
+    """搜索日志：由 moments.search_log 在进程内缓冲后批量写入，用于统计热门搜索词"""
+
+    class Source(models.TextChoices):
+        SEARCH = "SEARCH", "SEARCH"
+        SUGGEST = "SUGGEST", "SUGGEST"
+
+    query = models.CharField(max_length=50)
+    source = models.CharField(max_length=10, choices=Source.choices)
+    user = models.ForeignKey(User, on_delete=models.SET_NULL, blank=True, null=True, related_name="+")
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [models.Index(fields=["source", "created_at"])]
+
+    def __str__(self):
+        return f"{self.source}: {self.query}"
@@ -0,0 +1,187 @@
+"""
+搜索日志与热门搜索词
+
+- record: 把一次搜索追加到进程内缓冲区，攒够 SEARCH_LOG_BUFFER_SIZE 条或距上次写入超过
+  SEARCH_LOG_FLUSH_INTERVAL 秒时交给后台线程投递给 Celery 批量写入，请求线程不写数据库也不等消息队列；
+  投递失败的批次放回缓冲区，隔 SEARCH_LOG_FLUSH_INTERVAL 秒后重试
+- aggregate: 定时汇总最近 SEARCH_TRENDS_WINDOW_HOURS 小时的日志，缓存热门搜索词，
+  并为输入最多的搜索建议查询预先计算结果
+"""
+import atexit
+import logging
+import queue
+import threading
+import time
+from datetime import timedelta
+from typing import Dict, List, Optional
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from core.cache import hot_keywords_key, search_suggestions_key
+
+from .models import SearchQuery
+from .suggestions import build_suggestions
+
+logger = logging.getLogger(__name__)
+
+QUERY_MAX_LENGTH = SearchQuery._meta.get_field("query").max_length
+# 预计算搜索建议时使用的条数（与搜索建议接口的默认值一致）
+SUGGESTION_LIMIT = 10
+# 消息队列不可用或投递变慢时，缓冲区和待投递队列各自最多保留的批数，超出后丢弃最早的日志
+MAX_PENDING_BATCHES = 10
+
+_lock = threading.Lock()
+_buffer: List[dict] = []
+_last_flush = time.monotonic()
+_retry_at = 0.0
+_queue: "queue.Queue[List[dict]]" = queue.Queue(maxsize=MAX_PENDING_BATCHES)
+_worker: Optional[threading.Thread] = None
+
+
+def normalize_query(query: str) -> str:
+    """去掉首尾和重复空白、转小写并截断，同一个搜索词只记为一种写法"""
+    return " ".join((query or "").split()).lower()[:QUERY_MAX_LENGTH]
+
+
+def _drain() -> List[dict]:
+    global _buffer, _last_flush
+    batch, _buffer = _buffer, []
+    _last_flush = time.monotonic()
+    return batch
+
+
+def _dispatch(batch: List[dict]):
+    global _buffer, _retry_at
+    from .tasks import flush_search_log
+
+    try:
+        flush_search_log.delay(batch)
+    except Exception as e:
+        # 搜索日志只用于统计：消息队列不可用时把本批放回缓冲区稍后重试，积压过多时丢弃最早的日志
+        with _lock:
+            pending = batch + _buffer
+            _buffer = pending[-settings.SEARCH_LOG_BUFFER_SIZE * MAX_PENDING_BATCHES:]
+            _retry_at = time.monotonic() + settings.SEARCH_LOG_FLUSH_INTERVAL
+        dropped = len(pending) - len(_buffer)
+        logger.warning(f"[search_log] dispatch of {len(batch)} entries failed, {dropped} dropped: {e}")
+
+
+def _run():
+    while True:
+        batch = _queue.get()
+        try:
+            _dispatch(batch)
+        finally:
+            _queue.task_done()
+
+
+def _submit(batch: List[dict]):
+    """交给后台线程投递（调用方持有 _lock），投递顺序与提交顺序一致"""
+    global _worker
+    if _worker is None:
+        _worker = threading.Thread(target=_run, name="search-log", daemon=True)
+        _worker.start()
+    while True:
+        try:
+            _queue.put_nowait(batch)
+            return
+        except queue.Full:
+            pass
+        # 投递跟不上时丢弃最早的一批，内存占用不会无限增长
+        try:
+            dropped = _queue.get_nowait()
+        except queue.Empty:
+            continue
+        _queue.task_done()
+        logger.warning(f"[search_log] dispatch queue full, dropped {len(dropped)} entries")
+
+
+def record(query: str, source: str, user_id: Optional[int] = None):
+    query = normalize_query(query)
+    if not query:
+        return
+    entry = {"query": query, "source": source, "user_id": user_id, "created_at": timezone.now().isoformat()}
+    with _lock:
+        _buffer.append(entry)
+        now = time.monotonic()
+        due = now >= _retry_at and (
+            len(_buffer) >= settings.SEARCH_LOG_BUFFER_SIZE
+            or now - _last_flush >= settings.SEARCH_LOG_FLUSH_INTERVAL
+        )
+        if due:
+            _submit(_drain())
+
+
+@atexit.register
+def flush():
+    """立即提交缓冲区中的全部日志并等待投递完成（进程退出时自动调用）"""
+    with _lock:
+        batch = _drain()
+        if batch:
+            _submit(batch)
+    _queue.join()
+
+
+def save_entries(entries: List[dict]) -> int:
+    SearchQuery.objects.bulk_create(
+        [
+            SearchQuery(
+                query=entry["query"],
+                source=entry["source"],
+                user_id=entry.get("user_id"),
+                created_at=parse_datetime(entry["created_at"]),
+            )
+            for entry in entries
+        ],
+        batch_size=500,
+    )
+    return len(entries)
+
+
+def top_queries(source: str, limit: int) -> List[Dict]:
+    """最近 SEARCH_TRENDS_WINDOW_HOURS 小时内出现次数最多的查询"""
+    since = timezone.now() - timedelta(hours=settings.SEARCH_TRENDS_WINDOW_HOURS)
+    rows = (
+        SearchQuery.objects.filter(source=source, created_at__gte=since)
+        .values("query")
+        .annotate(count=Count("id"))
+        .order_by("-count", "query")[:limit]
+    )
+    return [{"keyword": row["query"], "count": row["count"]} for row in rows]
+
+
+def trending_keywords() -> List[Dict]:
+    return top_queries(SearchQuery.Source.SEARCH, settings.SEARCH_TRENDS_KEYWORDS)
+
+
+def cached_suggestions(query: str, limit: int) -> Optional[dict]:
+    """返回预先计算的搜索建议，没有时返回 None"""
+    if limit != SUGGESTION_LIMIT or normalize_query(query) != query:
+        return None
+    try:
+        return cache.get(search_suggestions_key(query))
+    except Exception as e:
+        logger.warning(f"[search_log] read suggestions cache failed: {e}")
+        return None
+
+
+def aggregate() -> Dict[str, int]:
+    """刷新热门搜索词和高频查询的搜索建议缓存，并清理过期日志"""
+    ttl = settings.SEARCH_TRENDS_INTERVAL * 2
+    keywords = trending_keywords()
+    cache.set(hot_keywords_key(), keywords, ttl)
+
+    queries = top_queries(SearchQuery.Source.SUGGEST, settings.SEARCH_PRECOMPUTE_QUERIES)
+    precomputed = {
+        search_suggestions_key(row["keyword"]): build_suggestions(row["keyword"], SUGGESTION_LIMIT)
+        for row in queries
+    }
+    cache.set_many(precomputed, ttl)
+
+    cutoff = timezone.now() - timedelta(days=settings.SEARCH_LOG_RETENTION_DAYS)
+    pruned, _ = SearchQuery.objects.filter(created_at__lt=cutoff).delete()
+    return {"keywords": len(keywords), "precomputed": len(queries), "pruned": pruned}
@@ -1,16 +1,56 @@
+from django.conf import settings
+from django.db import transaction
 from rest_framework import serializers
 
 # 1. 修改导入：引入我们新建的 DFA 过滤器实例 gfw
 from core.dfa_filter import gfw
 from users.serializers import UserInfoSerializer
-from .models import Image, Moment, Tag
-from .tasks import transcode_video
+from .ingest import ingest_images, inspect_image
+from .models import Image, ImageDerivative, Moment, Tag, VideoUpload
+from .tagging import attach_tags
+from .tasks import generate_image_derivatives, transcode_video
+from .utils import PinyinText
 
 
 class ImageSerializer(serializers.ModelSerializer):
+    variants = serializers.SerializerMethodField()
+    srcset = serializers.SerializerMethodField()
+
     class Meta:
         model = Image
-        fields = ["id", "image_file", "order"]
+        fields = ["id", "image_file", "order", "variants", "srcset"]
+
+    def _url(self, file):
+        url = file.url
+        request = self.context.get("request")
+        return request.build_absolute_uri(url) if request else url
+
+    def get_variants(self, obj):
+        """各档位衍生图，未生成时为空列表（客户端回退到 image_file）"""
+        return [
+            {
+                "variant": d.variant,
+                "format": d.format,
+                "url": self._url(d.file),
+                "width": d.width,
+                "height": d.height,
+                "size_bytes": d.size_bytes,
+            }
+            for d in obj.derivatives.all()
+        ]
+
+    def get_srcset(self, obj):
+        """按格式生成 srcset 字符串，例如 {"WEBP": "a.webp 320w, b.webp 720w"}"""
+        srcset = {}
+        for image_format in ImageDerivative.Format.values:
+            entries = [
+                f"{self._url(d.file)} {d.width}w"
+                for d in obj.derivatives.all()
+                if d.format == image_format
+            ]
+            if entries:
+                srcset[image_format] = ", ".join(entries)
+        return srcset
 
 
 class TagSerializer(serializers.ModelSerializer):
@@ -19,6 +59,31 @@ class TagSerializer(serializers.ModelSerializer):
         fields = ["id", "name"]
 
 
+def check_sensitive(content, labels):
+    """发布内容与标签的敏感词检查（普通发布和分块上传共用）"""
+    # 2. 修改验证逻辑：使用 DFA 算法检测
+    # gfw.exists 返回两个值：(是否敏感, 敏感词是什么)
+    is_sensitive, word = gfw.exists(content)
+    if is_sensitive:
+        # 可以在这里把 word 打印到日志里方便调试，但返回给用户时建议模糊处理
+        # print(f"拦截敏感词: {word}")
+        raise serializers.ValidationError({"content": f"发布失败：内容包含违规信息，请文明发言。"})
+
+    # 3. 新增：标签敏感词检查
+    if labels:
+        sensitive_labels = []
+        for label in labels:
+            is_label_sensitive, sensitive_word = gfw.exists(label)
+            if is_label_sensitive:
+                sensitive_labels.append(f"#{label}")
+
+        if sensitive_labels:
+            label_list = "、".join(sensitive_labels)
+            raise serializers.ValidationError({
+                "labels": f"发布失败：标签 {label_list} 包含违规信息，请修改后重试。"
+            })
+
+
 class MomentCreateSerializer(serializers.ModelSerializer):
     images = serializers.ListField(
         child=serializers.ImageField(), allow_empty=True, required=False, write_only=True
@@ -39,27 +104,7 @@ class MomentCreateSerializer(serializers.ModelSerializer):
         content = attrs.get("content", "")
         labels = attrs.get("labels", [])
 
-        # 2. 修改验证逻辑：使用 DFA 算法检测
-        # gfw.exists 返回两个值：(是否敏感, 敏感词是什么)
-        is_sensitive, word = gfw.exists(content)
-        if is_sensitive:
-            # 可以在这里把 word 打印到日志里方便调试，但返回给用户时建议模糊处理
-            # print(f"拦截敏感词: {word}")
-            raise serializers.ValidationError({"content": f"发布失败：内容包含违规信息，请文明发言。"})
-
-        # 3. 新增：标签敏感词检查
-        if labels:
-            sensitive_labels = []
-            for label in labels:
-                is_label_sensitive, sensitive_word = gfw.exists(label)
-                if is_label_sensitive:
-                    sensitive_labels.append(f"#{label}")
-
-            if sensitive_labels:
-                label_list = "、".join(sensitive_labels)
-                raise serializers.ValidationError({
-                    "labels": f"发布失败：标签 {label_list} 包含违规信息，请修改后重试。"
-                })
+        check_sensitive(content, labels)
 
         if moment_type == Moment.MomentType.IMAGE:
             if video:
@@ -68,6 +113,8 @@ class MomentCreateSerializer(serializers.ModelSerializer):
                 images = []
             if len(images) > 9:
                 raise serializers.ValidationError({"images": "图片最多9张"})
+            for image in images:
+                inspect_image(image)
         elif moment_type == Moment.MomentType.VIDEO:
             if images:
                 raise serializers.ValidationError({"images": "视频动态不能上传图片"})
@@ -84,25 +131,22 @@ class MomentCreateSerializer(serializers.ModelSerializer):
         labels = validated_data.pop("labels", [])
         validated_data.pop("images", None)
         validated_data["author"] = request.user
-        moment = Moment.objects.create(**validated_data)
-
-        # Handle tags
-        for name in labels or []:
-            tag, _ = Tag.objects.get_or_create(name=name[:10])
-            moment.tags.add(tag)
-
-        # Handle media
-        if moment.type == Moment.MomentType.IMAGE:
-            for idx, img in enumerate(images or [], start=1):
-                Image.objects.create(moment=moment, image_file=img, order=idx)
-            moment.video_status = Moment.VideoStatus.READY
+        if validated_data["type"] == Moment.MomentType.IMAGE:
+            validated_data["video_status"] = Moment.VideoStatus.READY
         else:
-            moment.video_file = video
-            moment.video_status = Moment.VideoStatus.PROCESSING
-            moment.save(update_fields=["video_file", "video_status"])
-            # trigger async task
-            transcode_video.delay(moment.id)
-        moment.save()
+            validated_data["video_file"] = video
+            validated_data["video_status"] = Moment.VideoStatus.PROCESSING
+
+        # 动态、图片、标签在同一个事务内写入，异步任务在提交后再派发，避免读到未提交的数据
+        with transaction.atomic():
+            moment = Moment.objects.create(**validated_data)
+            attach_tags({moment.id: labels})
+            if moment.type == Moment.MomentType.IMAGE:
+                ingest_images(moment, images)
+                if images:
+                    transaction.on_commit(lambda: generate_image_derivatives.delay(moment.id))
+            else:
+                transaction.on_commit(lambda: transcode_video.delay(moment.id))
         return moment
 
 
@@ -122,6 +166,9 @@ class MomentListSerializer(serializers.ModelSerializer):
             "type",
             "video_file",
             "video_status",
+            "video_progress",
+            "video_playlist",
+            "video_poster",
             "is_deleted",
             "created_at",
             "images",
@@ -142,4 +189,61 @@ class MomentListSerializer(serializers.ModelSerializer):
 
 class MomentDetailSerializer(MomentListSerializer):
     class Meta(MomentListSerializer.Meta):
-        fields = MomentListSerializer.Meta.fields
\ No newline at end of file
+        fields = MomentListSerializer.Meta.fields
+
+
+class MomentSearchSerializer(MomentListSerializer):
+    """搜索结果：额外返回关键词在 content 中命中的字符范围 [start, end)，拼音命中时同样是原文位置"""
+    highlight = serializers.SerializerMethodField()
+
+    class Meta(MomentListSerializer.Meta):
+        fields = MomentListSerializer.Meta.fields + ["highlight"]
+
+    def get_highlight(self, obj):
+        keyword = self.context.get("keyword")
+        if not keyword or not obj.content:
+            return None
+        # 拼音匹配阶段已经算过的范围直接复用
+        spans = self.context.get("highlights", {})
+        span = spans[obj.id] if obj.id in spans else PinyinText(obj.content).find(keyword)
+        return list(span) if span else None
+
+
+class VideoUploadSerializer(serializers.ModelSerializer):
+    chunk_size = serializers.SerializerMethodField()
+
+    class Meta:
+        model = VideoUpload
+        fields = ["id", "filename", "total_size", "checksum", "received_bytes", "status", "chunk_size", "moment"]
+        read_only_fields = ["id", "received_bytes", "status", "moment"]
+
+    def get_chunk_size(self, obj):
+        return settings.VIDEO_UPLOAD_CHUNK_SIZE
+
+    def validate_total_size(self, value):
+        if value <= 0:
+            raise serializers.ValidationError("文件大小无效")
+        if value > settings.VIDEO_UPLOAD_MAX_SIZE:
+            raise serializers.ValidationError("视频文件过大")
+        return value
+
+    def validate_checksum(self, value):
+        value = value.lower()
+        if len(value) != 64 or any(c not in "0123456789abcdef" for c in value):
+            raise serializers.ValidationError("checksum 需为 SHA-256 十六进制字符串")
+        return value
+
+    def create(self, validated_data):
+        validated_data["user"] = self.context["request"].user
+        return super().create(validated_data)
+
+
+class VideoUploadCompleteSerializer(serializers.Serializer):
+    content = serializers.CharField(required=False, allow_blank=True, default="")
+    labels = serializers.ListField(
+        child=serializers.CharField(max_length=10), allow_empty=True, required=False, default=list
+    )
+
+    def validate(self, attrs):
+        check_sensitive(attrs["content"], attrs["labels"])
+        return attrs
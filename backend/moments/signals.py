@@ -0,0 +1,46 @@
+"""
+- 内容寻址存储的引用计数维护：记录删除后释放对应文件的引用
+- 动态写入后失效详情缓存和热门标签缓存
+- 动态删除/恢复时调整热门标签排行榜计数
+"""
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from core.cache import invalidate_hot_search, invalidate_moments
+from core.storage import release_on_commit
+
+from . import leaderboard
+from .models import Image, Moment
+
+
+@receiver(post_delete, sender=Image)
+def release_image_file(sender, instance, **kwargs):
+    release_on_commit(instance.image_file.name)
+
+
+@receiver(post_delete, sender=Moment)
+def release_video_file(sender, instance, **kwargs):
+    release_on_commit(instance.video_file.name)
+
+
+@receiver(post_save, sender=Moment)
+@receiver(post_delete, sender=Moment)
+def invalidate_moment_cache(sender, instance, **kwargs):
+    invalidate_moments(instance.id)
+    invalidate_hot_search()
+
+
+@receiver(pre_save, sender=Moment)
+def track_moment_visibility(sender, instance, update_fields=None, **kwargs):
+    if instance.pk is None or (update_fields is not None and "is_deleted" not in update_fields):
+        return
+    was_deleted = Moment.objects.filter(pk=instance.pk).values_list("is_deleted", flat=True).first()
+    if was_deleted is not None and was_deleted != instance.is_deleted:
+        leaderboard.record_moment(instance, -1 if instance.is_deleted else 1)
+
+
+@receiver(pre_delete, sender=Moment)
+def remove_moment_tag_usage(sender, instance, **kwargs):
+    # 关联的 MomentTag 会被级联删除，必须在删除前扣减
+    if not instance.is_deleted:
+        leaderboard.record_moment(instance, -1)
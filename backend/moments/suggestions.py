@@ -0,0 +1,85 @@
+"""
+搜索建议的计算逻辑（搜索建议接口和高频查询预计算共用）
+"""
+
+from django.conf import settings
+
+from . import autocomplete
+from .models import Moment, Tag
+from .utils import PinyinText, match_pinyin
+
+
+def build_suggestions(query: str, limit: int = 10) -> dict:
+    """
+    返回匹配 query 的热门搜索词和标签，只查前缀树索引，每次输入不访问数据库；
+    开启 SEARCH_SUGGEST_CONTENT 时内容片段排在前面，热门搜索词补足剩余条数，前缀树没有命中标签时再扫描全部标签
+    """
+    indexed = autocomplete.suggest(query, limit)
+    if not settings.SEARCH_SUGGEST_CONTENT:
+        return indexed
+    suggestions = content_suggestions(query, limit) + indexed["suggestions"]
+    return {
+        "suggestions": suggestions[:limit],
+        "tags": indexed["tags"] or tag_suggestions(query, limit),
+    }
+
+
+def content_suggestions(query: str, limit: int = 10) -> list:
+    """返回匹配 query 的动态内容片段"""
+    suggestions = []
+
+    # 获取匹配的动态内容片段（支持拼音匹配）
+    # 先获取所有可能的记录
+    base_qs = Moment.objects.visible()
+    
+    # 先尝试直接匹配
+    direct_moments = list(base_qs.filter(content__icontains=query).order_by("-created_at")[:limit])
+    direct_ids = {m.id for m in direct_moments}
+    
+    # 判断是否需要拼音匹配
+    is_pinyin_query = query.isalpha() and len(query) <= 20
+    need_pinyin_match = is_pinyin_query or len(direct_moments) < limit
+    
+    # 每条内容只转换一次拼音，匹配时记下命中的原文范围，后面直接用来截取片段
+    matches = []
+    for m in direct_moments:
+        text = PinyinText(m.content)
+        matches.append((m, text, text.find(query)))
+    if need_pinyin_match:
+        # 从所有记录中查找拼音匹配
+        candidates = base_qs.exclude(id__in=direct_ids).order_by("-created_at")[:500]  # 增加候选数量
+        for m in candidates:
+            if len(matches) >= limit:
+                break
+            text = PinyinText(m.content)
+            span = text.find(query)
+            if span:
+                matches.append((m, text, span))
+    
+    for moment, text, span in matches[:limit]:
+        if span:
+            # 提取关键词前后各30个字符，highlight 为命中部分在片段中的位置
+            suggestions.append({
+                **text.snippet(span),
+                "keyword": query,
+                "moment_id": moment.id
+            })
+    
+    return suggestions[:limit]
+
+
+def tag_suggestions(query: str, limit: int = 10) -> list:
+    """返回匹配 query 的标签（支持拼音匹配）"""
+    all_tags = Tag.objects.all()
+    matching_tags = []
+    
+    # 先尝试直接匹配
+    direct_matches = [tag for tag in all_tags if query.lower() in tag.name.lower()]
+    matching_tags.extend(direct_matches)
+    
+    # 如果结果不足，尝试拼音匹配
+    if len(matching_tags) < limit:
+        pinyin_matches = [tag for tag in all_tags if match_pinyin(query, tag.name) and tag not in matching_tags]
+        matching_tags.extend(pinyin_matches)
+    
+    return [{"id": tag.id, "name": tag.name} for tag in matching_tags[:limit]]
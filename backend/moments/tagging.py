@@ -0,0 +1,76 @@
+"""
+标签批量处理工具函数
+"""
+from typing import Dict, Iterable, List
+
+from core.cache import invalidate_hot_search, invalidate_moments
+
+from . import autocomplete, leaderboard
+from .models import Moment, MomentTag, Tag
+
+TAG_MAX_LENGTH = 10
+
+
+def normalize_tag_names(names: Iterable[str]) -> List[str]:
+    """
+    清洗标签名：去除首尾空白、截断到最大长度、去重（保持原有顺序）
+    """
+    result = []
+    seen = set()
+    for name in names or []:
+        name = str(name).strip()[:TAG_MAX_LENGTH]
+        if name and name not in seen:
+            seen.add(name)
+            result.append(name)
+    return result
+
+
+def resolve_tags(names: Iterable[str]) -> Dict[str, Tag]:
+    """
+    批量获取或创建标签，返回 {标签名: Tag}
+    最多 3 次查询：查询已有标签、批量插入缺失标签、回查新插入的标签
+    """
+    names = normalize_tag_names(names)
+    if not names:
+        return {}
+    tags = {tag.name: tag for tag in Tag.objects.filter(name__in=names)}
+    missing = [name for name in names if name not in tags]
+    if missing:
+        # ignore_conflicts: 并发创建同名标签时不报错
+        Tag.objects.bulk_create([Tag(name=name) for name in missing], ignore_conflicts=True)
+        tags.update({tag.name: tag for tag in Tag.objects.filter(name__in=missing)})
+    return tags
+
+
+def attach_tags(moment_tag_names: Dict[int, Iterable[str]]) -> int:
+    """
+    批量为多条动态关联标签，参数为 {moment_id: [标签名]}
+    返回新增的关联数量（已存在的关联会被跳过），新增关联同时计入热门标签排行榜
+    """
+    moment_tag_names = {
+        moment_id: normalize_tag_names(names) for moment_id, names in moment_tag_names.items()
+    }
+    all_names = [name for names in moment_tag_names.values() for name in names]
+    tags = resolve_tags(all_names)
+    if not tags:
+        return 0
+    existing = set(
+        MomentTag.objects.filter(moment_id__in=moment_tag_names, tag__in=tags.values())
+        .values_list("moment_id", "tag_id")
+    )
+    links = [
+        MomentTag(moment_id=moment_id, tag=tags[name])
+        for moment_id, names in moment_tag_names.items()
+        for name in names
+        if name in tags and (moment_id, tags[name].id) not in existing
+    ]
+    if not links:
+        return 0
+    created_at = dict(Moment.objects.filter(id__in=moment_tag_names).values_list("id", "created_at"))
+    MomentTag.objects.bulk_create(links, ignore_conflicts=True)
+    leaderboard.record_links((link.moment_id, link.tag_id, created_at[link.moment_id]) for link in links)
+    # bulk_create 不触发信号，这里显式失效缓存；本进程的搜索建议索引在下次查询时同步新标签
+    invalidate_hot_search()
+    autocomplete.mark_stale()
+    invalidate_moments(*moment_tag_names)
+    return len(links)
@@ -1,20 +1,205 @@
-import time
+import logging
+import shutil
+from datetime import timedelta
+from pathlib import Path
 
 from celery import shared_task
-from django.db import transaction
+from django.conf import settings
+from django.utils import timezone
 
-from .models import Moment
+from core.cache import invalidate_moments
+
+from . import leaderboard, search_log, transcoding, uploads
+from .derivatives import generate_moment_derivatives
+from .models import Moment, VideoUpload
+
+logger = logging.getLogger(__name__)
+
+# 转码分块占 90% 进度，生成播放列表和封面占最后 10%
+CHUNK_PROGRESS_SHARE = 90
+
+
+def _update_moment(moment_id: int, **fields):
+    """更新动态字段并失效详情缓存（queryset.update 不触发 post_save 信号）"""
+    Moment.objects.filter(id=moment_id).update(**fields)
+    invalidate_moments(moment_id)
+
+
+def _mark_failed(moment_id: int, error: Exception):
+    logger.error(f"[transcode_video] Moment {moment_id} failed: {error}")
+    _update_moment(moment_id, video_status=Moment.VideoStatus.FAILED)
+
+
+def _reuse_duplicate_transcode(moment: Moment) -> bool:
+    """
+    内容寻址存储下相同内容的视频共用同一个文件名，
+    已有转码完成的相同视频时直接复用其播放列表和封面，不再重复转码
+    """
+    twin = (
+        Moment.objects.filter(video_file=moment.video_file.name, video_status=Moment.VideoStatus.READY)
+        .exclude(id=moment.id)
+        .exclude(video_playlist__isnull=True)
+        .exclude(video_playlist="")
+        .values("video_duration", "video_playlist", "video_poster")
+        .first()
+    )
+    if twin is None:
+        return False
+    _update_moment(moment.id, video_status=Moment.VideoStatus.READY, video_progress=100, **twin)
+    logger.info(f"[transcode_video] Moment {moment.id} reused transcode of {twin['video_playlist']}")
+    return True
 
 
 @shared_task
 def transcode_video(moment_id: int):
+    """
+    视频转码入口：探测源文件并规划分块，然后逐块串行派发 transcode_video_chunk。
+    每个任务只处理一块，长视频不会长时间独占 worker。
+    """
     try:
         moment = Moment.objects.get(id=moment_id)
     except Moment.DoesNotExist:
         return
-    # Simulate processing delay
-    time.sleep(1)
-    with transaction.atomic():
-        moment.video_status = Moment.VideoStatus.READY
-        moment.save(update_fields=["video_status"])
 
+    if moment.video_file and _reuse_duplicate_transcode(moment):
+        return
+
+    if not moment.video_file or not transcoding.ffmpeg_available():
+        # 没有源文件或环境缺少 ffmpeg 时直接使用原始文件
+        if moment.video_file:
+            logger.warning("[transcode_video] ffmpeg not available, serving original file")
+        _update_moment(moment_id, video_status=Moment.VideoStatus.READY, video_progress=100)
+        return
+
+    source = moment.video_file.path
+    try:
+        info = transcoding.probe(source)
+    except transcoding.TranscodeError as e:
+        _mark_failed(moment_id, e)
+        return
+
+    out_dir = transcoding.output_dir(moment_id)
+    shutil.rmtree(out_dir, ignore_errors=True)
+    job = {
+        "source": source,
+        "out_dir": str(out_dir),
+        "renditions": [r["name"] for r in transcoding.select_renditions(info.height)],
+        "chunks": transcoding.plan_chunks(info.duration),
+        "has_audio": info.has_audio,
+        "duration": info.duration,
+        "width": info.width,
+        "height": info.height,
+    }
+    _update_moment(
+        moment_id,
+        video_status=Moment.VideoStatus.PROCESSING,
+        video_progress=0,
+        video_duration=info.duration,
+    )
+    logger.info(
+        f"[transcode_video] Moment {moment_id}: {info.duration:.1f}s {info.width}x{info.height}, "
+        f"{len(job['chunks'])} chunk(s), renditions {job['renditions']}"
+    )
+    transcode_video_chunk.delay(moment_id, 0, job)
+
+
+def _renditions(job):
+    return [r for r in transcoding.RENDITIONS if r["name"] in job["renditions"]]
+
+
+@shared_task
+def transcode_video_chunk(moment_id: int, index: int, job: dict):
+    """转码第 index 块并更新进度，然后派发下一块或收尾任务"""
+    if not Moment.objects.filter(id=moment_id).exists():
+        return
+    start, length = job["chunks"][index]
+    try:
+        transcoding.transcode_chunk(
+            job["source"],
+            Path(job["out_dir"]),
+            _renditions(job),
+            index,
+            start,
+            length,
+            job["has_audio"],
+        )
+    except transcoding.TranscodeError as e:
+        _mark_failed(moment_id, e)
+        return
+
+    total = len(job["chunks"])
+    _update_moment(moment_id, video_progress=(index + 1) * CHUNK_PROGRESS_SHARE // total)
+    if index + 1 < total:
+        transcode_video_chunk.delay(moment_id, index + 1, job)
+    else:
+        finalize_video.delay(moment_id, job)
+
+
+@shared_task
+def finalize_video(moment_id: int, job: dict):
+    """合并播放列表、截取封面并把动态标记为 READY"""
+    out_dir = Path(job["out_dir"])
+    try:
+        master = transcoding.write_playlists(
+            out_dir, _renditions(job), len(job["chunks"]), job["width"], job["height"]
+        )
+        poster = transcoding.extract_poster(job["source"], out_dir / "poster.jpg", job["duration"])
+    except (transcoding.TranscodeError, OSError) as e:
+        _mark_failed(moment_id, e)
+        return
+
+    media_root = Path(settings.MEDIA_ROOT)
+    _update_moment(
+        moment_id,
+        video_status=Moment.VideoStatus.READY,
+        video_progress=100,
+        video_playlist=str(master.relative_to(media_root)),
+        video_poster=str(poster.relative_to(media_root)),
+    )
+    logger.info(f"[transcode_video] Moment {moment_id} ready: {master}")
+
+
+@shared_task
+def generate_image_derivatives(moment_id: int):
+    """为图文动态的图片生成缩略图/中图/大图"""
+    done = generate_moment_derivatives(moment_id)
+    logger.info(f"[generate_image_derivatives] Moment {moment_id}: {done} image(s) processed")
+    return done
+
+
+@shared_task
+def cleanup_stale_uploads():
+    """清理超过保留时长仍未完成的分块上传及其临时文件"""
+    cutoff = timezone.now() - timedelta(hours=settings.VIDEO_UPLOAD_EXPIRE_HOURS)
+    stale = VideoUpload.objects.filter(status=VideoUpload.Status.UPLOADING, updated_at__lt=cutoff)
+    count = 0
+    for upload in stale:
+        uploads.discard(upload)
+        upload.delete()
+        count += 1
+    if count:
+        logger.info(f"[cleanup_stale_uploads] Removed {count} stale upload(s)")
+    return count
+
+
+@shared_task
+def compact_tag_usage():
+    """把较早的热门标签小时桶合并为天桶"""
+    merged = leaderboard.compact_buckets()
+    if merged:
+        logger.info(f"[compact_tag_usage] Merged {merged} hourly bucket(s)")
+    return merged
+
+
+@shared_task
+def flush_search_log(entries: list):
+    """批量写入一批缓冲的搜索日志"""
+    return search_log.save_entries(entries)
+
+
+@shared_task
+def aggregate_search_trends():
+    """汇总热门搜索词并预计算高频查询的搜索建议"""
+    stats = search_log.aggregate()
+    logger.info(f"[aggregate_search_trends] {stats}")
+    return stats
@@ -0,0 +1,202 @@
+"""
+视频转码工具函数（基于 ffmpeg / ffprobe）
+
+转码流程：
+1. probe: 读取时长、分辨率、是否有音轨
+2. 按源分辨率选择码率阶梯（不放大）
+3. 按时间分块转码，每块输出若干 HLS 分片（块长度是分片长度的整数倍，分片边界对齐）
+4. 合并各块的分片列表生成每个码率的 index.m3u8，并生成 master.m3u8 与封面图
+"""
+import json
+import logging
+import math
+import shutil
+import subprocess
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# 码率阶梯：高度、视频码率、音频码率、HLS 带宽声明（bps）
+RENDITIONS = [
+    {"name": "360p", "height": 360, "video_bitrate": "800k", "audio_bitrate": "96k", "bandwidth": 900_000},
+    {"name": "720p", "height": 720, "video_bitrate": "2800k", "audio_bitrate": "128k", "bandwidth": 3_000_000},
+    {"name": "1080p", "height": 1080, "video_bitrate": "5000k", "audio_bitrate": "192k", "bandwidth": 5_400_000},
+]
+
+
+class TranscodeError(Exception):
+    """ffmpeg / ffprobe 执行失败"""
+
+
+@dataclass
+class VideoInfo:
+    duration: float
+    width: int
+    height: int
+    has_audio: bool
+
+
+def ffmpeg_available() -> bool:
+    return bool(shutil.which(settings.FFMPEG_BINARY) and shutil.which(settings.FFPROBE_BINARY))
+
+
+def _run(cmd: List[str]) -> str:
+    result = subprocess.run(cmd, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise TranscodeError(f"{cmd[0]} failed: {result.stderr.strip()[-500:]}")
+    return result.stdout
+
+
+def probe(path: str) -> VideoInfo:
+    """读取视频基本信息"""
+    output = _run([
+        settings.FFPROBE_BINARY, "-v", "error",
+        "-show_entries", "format=duration:stream=codec_type,width,height",
+        "-of", "json", str(path),
+    ])
+    data = json.loads(output)
+    streams = data.get("streams", [])
+    video = next((s for s in streams if s.get("codec_type") == "video"), None)
+    if video is None:
+        raise TranscodeError("no video stream found")
+    duration = float(data.get("format", {}).get("duration") or 0)
+    if duration <= 0:
+        raise TranscodeError("unable to determine duration")
+    return VideoInfo(
+        duration=duration,
+        width=int(video.get("width") or 0),
+        height=int(video.get("height") or 0),
+        has_audio=any(s.get("codec_type") == "audio" for s in streams),
+    )
+
+
+def select_renditions(source_height: int) -> List[Dict]:
+    """选择不高于源分辨率的码率档位，至少保留最低一档"""
+    selected = [r for r in RENDITIONS if r["height"] <= source_height]
+    return selected or RENDITIONS[:1]
+
+
+def plan_chunks(duration: float) -> List[Tuple[float, float]]:
+    """
+    按 VIDEO_TRANSCODE_CHUNK_SECONDS 把视频切成若干 (开始时间, 时长) 块
+    块长度向上取整为 HLS 分片长度的整数倍，保证各块的分片边界对齐
+    """
+    segment = settings.VIDEO_HLS_SEGMENT_SECONDS
+    chunk = max(segment, math.ceil(settings.VIDEO_TRANSCODE_CHUNK_SECONDS / segment) * segment)
+    chunks = []
+    start = 0.0
+    while start < duration:
+        chunks.append((start, min(chunk, duration - start)))
+        start += chunk
+    return chunks
+
+
+def output_dir(moment_id: int) -> Path:
+    return Path(settings.MEDIA_ROOT) / "hls" / str(moment_id)
+
+
+def chunk_playlist_name(index: int) -> str:
+    return f"chunk_{index:04d}.m3u8"
+
+
+def transcode_chunk(
+    source: str,
+    out_dir: Path,
+    renditions: List[Dict],
+    index: int,
+    start: float,
+    length: float,
+    has_audio: bool,
+):
+    """把 [start, start + length) 这一段转码为每个码率档位的 HLS 分片"""
+    segment = settings.VIDEO_HLS_SEGMENT_SECONDS
+    for rendition in renditions:
+        rendition_dir = out_dir / rendition["name"]
+        rendition_dir.mkdir(parents=True, exist_ok=True)
+        cmd = [
+            settings.FFMPEG_BINARY, "-y", "-v", "error",
+            "-ss", f"{start:.3f}", "-i", str(source), "-t", f"{length:.3f}",
+            "-map", "0:v:0",
+            "-vf", f"scale=-2:'min({rendition['height']},ih)'",
+            "-c:v", "libx264", "-preset", "veryfast", "-profile:v", "main", "-pix_fmt", "yuv420p",
+            "-b:v", rendition["video_bitrate"], "-maxrate", rendition["video_bitrate"],
+            "-bufsize", rendition["video_bitrate"],
+            "-force_key_frames", f"expr:gte(t,n_forced*{segment})",
+        ]
+        if has_audio:
+            cmd += ["-map", "0:a:0", "-c:a", "aac", "-b:a", rendition["audio_bitrate"], "-ac", "2"]
+        cmd += [
+            "-output_ts_offset", f"{start:.3f}",
+            "-f", "hls", "-hls_time", str(segment), "-hls_playlist_type", "vod",
+            "-hls_segment_filename", str(rendition_dir / f"c{index:04d}_%03d.ts"),
+            str(rendition_dir / chunk_playlist_name(index)),
+        ]
+        _run(cmd)
+
+
+def _read_chunk_entries(playlist: Path) -> List[Tuple[float, str]]:
+    """读取分块播放列表中的 (分片时长, 分片文件名)"""
+    entries = []
+    duration = None
+    for line in playlist.read_text().splitlines():
+        line = line.strip()
+        if line.startswith("#EXTINF:"):
+            duration = float(line[len("#EXTINF:"):].split(",")[0])
+        elif line and not line.startswith("#") and duration is not None:
+            entries.append((duration, line))
+            duration = None
+    return entries
+
+
+def write_playlists(out_dir: Path, renditions: List[Dict], chunk_count: int, width: int, height: int) -> Path:
+    """合并分块播放列表，生成各档位的 index.m3u8 与 master.m3u8，返回 master 路径"""
+    for rendition in renditions:
+        rendition_dir = out_dir / rendition["name"]
+        lines = []
+        max_duration = 0.0
+        for index in range(chunk_count):
+            chunk_playlist = rendition_dir / chunk_playlist_name(index)
+            entries = _read_chunk_entries(chunk_playlist)
+            if index > 0 and entries:
+                lines.append("#EXT-X-DISCONTINUITY")
+            for duration, uri in entries:
+                max_duration = max(max_duration, duration)
+                lines += [f"#EXTINF:{duration:.6f},", uri]
+            chunk_playlist.unlink()
+        header = [
+            "#EXTM3U",
+            "#EXT-X-VERSION:3",
+            f"#EXT-X-TARGETDURATION:{math.ceil(max_duration)}",
+            "#EXT-X-MEDIA-SEQUENCE:0",
+            "#EXT-X-PLAYLIST-TYPE:VOD",
+        ]
+        (rendition_dir / "index.m3u8").write_text("\n".join(header + lines + ["#EXT-X-ENDLIST", ""]))
+
+    master = ["#EXTM3U", "#EXT-X-VERSION:3"]
+    for rendition in renditions:
+        rendition_height = min(rendition["height"], height) if height else rendition["height"]
+        rendition_width = round(width * rendition_height / height / 2) * 2 if height else 0
+        master.append(
+            f"#EXT-X-STREAM-INF:BANDWIDTH={rendition['bandwidth']},"
+            f"RESOLUTION={rendition_width}x{rendition_height}"
+        )
+        master.append(f"{rendition['name']}/index.m3u8")
+    master_path = out_dir / "master.m3u8"
+    master_path.write_text("\n".join(master + [""]))
+    return master_path
+
+
+def extract_poster(source: str, dest: Path, duration: float) -> Path:
+    """截取一帧作为封面（默认第 1 秒，短视频取中间帧）"""
+    at = min(1.0, duration / 2)
+    dest.parent.mkdir(parents=True, exist_ok=True)
+    _run([
+        settings.FFMPEG_BINARY, "-y", "-v", "error",
+        "-ss", f"{at:.3f}", "-i", str(source),
+        "-frames:v", "1", "-q:v", "3", str(dest),
+    ])
+    return dest
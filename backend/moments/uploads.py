@@ -0,0 +1,78 @@
+"""
+视频分块上传的文件操作
+
+分块按偏移量顺序写入 MEDIA_ROOT/uploads/<upload_id>.part，每次只在内存中保留一小段缓冲，
+重传同一偏移量的分块会覆盖之前写了一半的数据；全部到达后流式计算 SHA-256 校验，
+再把文件转存到 videos/ 下交给转码任务。
+"""
+import hashlib
+import os
+from pathlib import Path
+
+from django.conf import settings
+from django.core.files import File
+
+from .models import VideoUpload
+
+# 读写时的缓冲区大小
+BUFFER_SIZE = 64 * 1024
+
+
+class ChunkError(Exception):
+    """分块数据不完整或超出声明的大小"""
+
+
+def part_path(upload: VideoUpload) -> Path:
+    return Path(settings.MEDIA_ROOT) / "uploads" / f"{upload.id}.part"
+
+
+def write_chunk(upload: VideoUpload, offset: int, stream, length: int) -> int:
+    """
+    从 stream 读取 length 字节写入临时文件的 offset 处，返回写入后的文件有效长度
+    数据不足 length（客户端中途断开）时回滚到 offset 并抛出 ChunkError
+    """
+    if offset + length > upload.total_size:
+        raise ChunkError("chunk exceeds declared file size")
+
+    path = part_path(upload)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "r+b" if path.exists() else "w+b") as f:
+        f.seek(offset)
+        remaining = length
+        while remaining > 0:
+            data = stream.read(min(BUFFER_SIZE, remaining))
+            if not data:
+                break
+            f.write(data)
+            remaining -= len(data)
+        if remaining > 0:
+            f.truncate(offset)
+            raise ChunkError(f"incomplete chunk: {length - remaining}/{length} bytes received")
+        f.truncate(offset + length)
+    return offset + length
+
+
+def file_sha256(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(BUFFER_SIZE), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def verify_checksum(upload: VideoUpload) -> bool:
+    return file_sha256(part_path(upload)) == upload.checksum.lower()
+
+
+def attach_to_moment(upload: VideoUpload, moment):
+    """把已校验的临时文件保存为动态的视频文件（分块复制，不整体读入内存）"""
+    path = part_path(upload)
+    with open(path, "rb") as f:
+        moment.video_file.save(upload.filename, File(f), save=False)
+
+
+def discard(upload: VideoUpload):
+    try:
+        os.remove(part_path(upload))
+    except FileNotFoundError:
+        pass
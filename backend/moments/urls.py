@@ -1,6 +1,18 @@
 from django.urls import path
 
-from .views import FeedView, MomentCreateView, MomentDetailView, MyMomentsView, UserMomentsView, SearchView, SearchSuggestionsView, HotSearchView
+from .views import (
+    FeedView,
+    HotSearchView,
+    MomentCreateView,
+    MomentDetailView,
+    MyMomentsView,
+    SearchSuggestionsView,
+    SearchView,
+    UserMomentsView,
+    VideoUploadCompleteView,
+    VideoUploadCreateView,
+    VideoUploadDetailView,
+)
 
 urlpatterns = [
     path("", MomentCreateView.as_view(), name="moment-create"),
@@ -10,6 +22,9 @@ urlpatterns = [
     path("search/", SearchView.as_view(), name="moment-search"),
     path("search/suggestions/", SearchSuggestionsView.as_view(), name="moment-search-suggestions"),
     path("search/hot/", HotSearchView.as_view(), name="moment-hot-search"),
+    path("uploads/", VideoUploadCreateView.as_view(), name="moment-upload-create"),
+    path("uploads/<uuid:upload_id>/", VideoUploadDetailView.as_view(), name="moment-upload-detail"),
+    path("uploads/<uuid:upload_id>/complete/", VideoUploadCompleteView.as_view(), name="moment-upload-complete"),
     path("<int:pk>/", MomentDetailView.as_view(), name="moment-detail"),
 ]
 
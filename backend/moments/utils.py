@@ -1,6 +1,7 @@
 """
 拼音匹配工具函数
 """
+from functools import cached_property
 from typing import List, Optional
 import logging
 
@@ -40,6 +41,81 @@ def get_pinyin_initials(text: str) -> str:
     return "".join(lazy_pinyin(text, style=Style.FIRST_LETTER))
 
 
+def pinyin_syllables(text: str, initials: bool = False) -> List[str]:
+    """
+    逐字返回拼音（按词组判断多音字），非汉字字符原样保留，结果与 text 一一对应
+    例如: "ab银行" -> ["a", "b", "yin", "hang"]，initials=True 时 -> ["a", "b", "y", "h"]
+    """
+    if not text:
+        return []
+    if not PYPINYIN_AVAILABLE:
+        return list(text)
+    style = Style.FIRST_LETTER if initials else Style.NORMAL
+    return lazy_pinyin(text, style=style, errors=lambda chars: list(chars))
+
+
+class PinyinText:
+    """
+    带偏移映射的拼音表示：文本只转换一次，全拼和首字母中的每个字母都记录它属于原文的第几个字，
+    拼音或首字母命中时可以换算回原文中准确的字符范围；原文直接命中时不做拼音转换
+    例如: PinyinText("今天天气真好").find("tianqi") -> (2, 4)，即原文中的 "天气"
+    """
+
+    def __init__(self, text: str):
+        self.text = text or ""
+        self.lower = self.text.lower()
+
+    @cached_property
+    def _pinyin(self):
+        return self._join(pinyin_syllables(self.lower))
+
+    @cached_property
+    def _initials(self):
+        return self._join(pinyin_syllables(self.lower, initials=True))
+
+    @staticmethod
+    def _join(syllables: List[str]):
+        joined, owner = [], []
+        for index, syllable in enumerate(syllables):
+            joined.append(syllable)
+            owner.extend([index] * len(syllable))
+        return "".join(joined), owner
+
+    def _locate(self, needle: str, haystack: str, owner: List[int]) -> Optional[tuple]:
+        idx = haystack.find(needle) if needle else -1
+        if idx == -1:
+            return None
+        return owner[idx], owner[idx + len(needle) - 1] + 1
+
+    def find(self, query: str) -> Optional[tuple]:
+        """
+        返回 query 在原文中命中的 (start, end) 字符范围，未命中返回 None
+        依次尝试原文、全拼、首字母；查询词包含中文时再用它的拼音匹配（同音字）
+        """
+        query = (query or "").lower().strip()
+        if not query or not self.text:
+            return None
+        idx = self.lower.find(query)
+        if idx != -1:
+            return idx, idx + len(query)
+        span = self._locate(query, *self._pinyin) or self._locate(query, *self._initials)
+        if span is None and any('\u4e00' <= char <= '\u9fff' for char in query):
+            span = (
+                self._locate("".join(pinyin_syllables(query)), *self._pinyin)
+                or self._locate("".join(pinyin_syllables(query, initials=True)), *self._initials)
+            )
+        return span
+
+    def snippet(self, span: tuple, context: int = 30) -> dict:
+        """截取命中位置前后各 context 个字，返回片段和命中部分在片段中的范围"""
+        start = max(0, span[0] - context)
+        end = min(len(self.text), span[1] + context)
+        prefix = "..." if start > 0 else ""
+        text = prefix + self.text[start:end] + ("..." if end < len(self.text) else "")
+        offset = len(prefix) - start
+        return {"text": text, "highlight": [span[0] + offset, span[1] + offset]}
+
+
 def match_pinyin(query: str, text: str) -> bool:
     """
     检查查询词是否匹配文本（支持中文、全拼、首字母）
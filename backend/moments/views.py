@@ -1,14 +1,32 @@
 from datetime import datetime
 
+from django.conf import settings
+from django.db import transaction
 from django.db.models import Q
+from django.shortcuts import get_object_or_404
+from django.utils import timezone
 from drf_spectacular.utils import extend_schema, OpenApiParameter, OpenApiExample
-from rest_framework import generics, permissions
+from rest_framework import generics, permissions, status
 from rest_framework.response import Response
+from rest_framework.views import APIView
 
+from core.cache import get_or_compute, hot_keywords_key, hot_search_key, moment_detail_key
 from friends.models import Friendship
-from .models import Moment, Tag
-from .serializers import MomentCreateSerializer, MomentDetailSerializer, MomentListSerializer
-from .utils import match_pinyin
+from interactions.models import Like
+from . import leaderboard, search_log, uploads
+from .models import Moment, SearchQuery, Tag, VideoUpload
+from .serializers import (
+    MomentCreateSerializer,
+    MomentDetailSerializer,
+    MomentListSerializer,
+    MomentSearchSerializer,
+    VideoUploadCompleteSerializer,
+    VideoUploadSerializer,
+)
+from .suggestions import build_suggestions
+from .tagging import attach_tags
+from .tasks import transcode_video
+from .utils import PinyinText, match_pinyin
 
 
 @extend_schema(
@@ -25,6 +43,137 @@ class MomentCreateView(generics.CreateAPIView):
     permission_classes = [permissions.IsAuthenticated]
 
 
+@extend_schema(
+    tags=["动态"],
+    summary="创建视频分块上传",
+    description="声明文件名、总大小和 SHA-256 校验值，返回上传 ID 与建议的分块大小。",
+)
+class VideoUploadCreateView(generics.CreateAPIView):
+    """创建视频分块上传接口"""
+    queryset = VideoUpload.objects.all()
+    serializer_class = VideoUploadSerializer
+    permission_classes = [permissions.IsAuthenticated]
+
+
+class VideoUploadDetailView(APIView):
+    """视频分块上传：查询进度 / 上传分块"""
+    permission_classes = [permissions.IsAuthenticated]
+
+    @extend_schema(
+        tags=["动态"],
+        summary="查询分块上传进度",
+        description="返回已接收的字节数，断线后客户端从 received_bytes 处继续上传。",
+        responses=VideoUploadSerializer,
+    )
+    def get(self, request, upload_id):
+        upload = get_object_or_404(VideoUpload, id=upload_id, user=request.user)
+        return Response(VideoUploadSerializer(upload).data)
+
+    @extend_schema(
+        tags=["动态"],
+        summary="上传视频分块",
+        description="请求体为原始二进制数据（application/octet-stream），offset 必须等于当前的 received_bytes。",
+        parameters=[
+            OpenApiParameter(
+                name="offset",
+                type=int,
+                location=OpenApiParameter.QUERY,
+                description="分块在文件中的起始字节偏移",
+                required=True,
+            ),
+        ],
+        request={"application/octet-stream": bytes},
+        responses=VideoUploadSerializer,
+    )
+    def put(self, request, upload_id):
+        upload = get_object_or_404(VideoUpload, id=upload_id, user=request.user)
+        if upload.status != VideoUpload.Status.UPLOADING:
+            return Response({"detail": "上传已完成"}, status=status.HTTP_409_CONFLICT)
+        try:
+            offset = int(request.query_params.get("offset", ""))
+            length = int(request.META.get("CONTENT_LENGTH") or 0)
+        except ValueError:
+            return Response({"detail": "参数错误"}, status=status.HTTP_400_BAD_REQUEST)
+        if length <= 0:
+            return Response({"detail": "分块为空"}, status=status.HTTP_400_BAD_REQUEST)
+        if length > settings.VIDEO_UPLOAD_CHUNK_SIZE:
+            return Response({"detail": "分块过大"}, status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+        if offset != upload.received_bytes:
+            return Response(
+                {"detail": "偏移量不匹配", "received_bytes": upload.received_bytes},
+                status=status.HTTP_409_CONFLICT,
+            )
+
+        # 直接读取请求体流写入临时文件，不经过 Django 的文件上传缓冲
+        try:
+            received = uploads.write_chunk(upload, offset, request.stream, length)
+        except uploads.ChunkError as e:
+            return Response({"detail": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        # 以旧偏移量为条件更新，防止同一会话的并发分块互相覆盖进度
+        updated = VideoUpload.objects.filter(
+            id=upload.id, status=VideoUpload.Status.UPLOADING, received_bytes=offset
+        ).update(received_bytes=received, updated_at=timezone.now())
+        upload.refresh_from_db()
+        if not updated:
+            return Response(
+                {"detail": "偏移量不匹配", "received_bytes": upload.received_bytes},
+                status=status.HTTP_409_CONFLICT,
+            )
+        return Response(VideoUploadSerializer(upload).data)
+
+
+@extend_schema(
+    tags=["动态"],
+    summary="完成视频分块上传",
+    description="校验文件完整性后发布视频动态并提交转码，返回新动态。校验失败时需要重新上传。",
+    request=VideoUploadCompleteSerializer,
+    responses=MomentDetailSerializer,
+)
+class VideoUploadCompleteView(APIView):
+    """完成视频分块上传接口"""
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request, upload_id):
+        upload = get_object_or_404(VideoUpload, id=upload_id, user=request.user)
+        if upload.status == VideoUpload.Status.COMPLETED:
+            return Response({"detail": "上传已完成", "moment": upload.moment_id}, status=status.HTTP_409_CONFLICT)
+        if upload.received_bytes != upload.total_size:
+            return Response(
+                {"detail": "上传未完成", "received_bytes": upload.received_bytes},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        serializer = VideoUploadCompleteSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        if not uploads.verify_checksum(upload):
+            uploads.discard(upload)
+            VideoUpload.objects.filter(id=upload.id).update(received_bytes=0)
+            return Response({"detail": "文件校验失败，请重新上传"}, status=status.HTTP_400_BAD_REQUEST)
+
+        with transaction.atomic():
+            upload = VideoUpload.objects.select_for_update().get(id=upload.id)
+            if upload.status == VideoUpload.Status.COMPLETED:
+                return Response({"detail": "上传已完成", "moment": upload.moment_id}, status=status.HTTP_409_CONFLICT)
+            moment = Moment(
+                author=request.user,
+                content=serializer.validated_data["content"],
+                type=Moment.MomentType.VIDEO,
+                video_status=Moment.VideoStatus.PROCESSING,
+            )
+            uploads.attach_to_moment(upload, moment)
+            moment.save()
+            attach_tags({moment.id: serializer.validated_data["labels"]})
+            upload.status = VideoUpload.Status.COMPLETED
+            upload.moment = moment
+            upload.save(update_fields=["status", "moment", "updated_at"])
+            transaction.on_commit(lambda: transcode_video.delay(moment.id))
+
+        uploads.discard(upload)
+        data = MomentDetailSerializer(moment, context={"request": request}).data
+        return Response(data, status=status.HTTP_201_CREATED)
+
+
 @extend_schema(
     tags=["动态"],
     summary="获取动态详情",
@@ -37,18 +186,24 @@ class MomentDetailView(generics.RetrieveAPIView):
     permission_classes = [permissions.IsAuthenticated]
 
     def get_queryset(self):
-        # Return all moments, filtering is done in get_object
-        return Moment.objects.all()
+        # Return all moments, filtering is done in retrieve
+        return Moment.objects.select_related("author").prefetch_related("images__derivatives")
 
-    def get_object(self):
-        obj = super().get_object()
-        user = self.request.user
-        if obj.is_deleted:
-            self.permission_denied(self.request, message="内容已删除")
-        if obj.type == Moment.MomentType.VIDEO and obj.video_status != Moment.VideoStatus.READY:
-            if obj.author != user:
-                self.permission_denied(self.request, message="视频处理中")
-        return obj
+    def retrieve(self, request, *args, **kwargs):
+        moment_id = kwargs["pk"]
+
+        def load():
+            return dict(self.get_serializer(self.get_object()).data)
+
+        # 动态内容按 ID 缓存，点赞状态与访问者有关，每次单独查询
+        data = dict(get_or_compute(moment_detail_key(moment_id), settings.CACHE_TTL_MOMENT_DETAIL, load))
+        if data["is_deleted"]:
+            self.permission_denied(request, message="内容已删除")
+        if data["type"] == Moment.MomentType.VIDEO and data["video_status"] != Moment.VideoStatus.READY:
+            if data["author"]["id"] != request.user.id:
+                self.permission_denied(request, message="视频处理中")
+        data["is_liked"] = Like.objects.filter(moment_id=moment_id, user=request.user).exists()
+        return Response(data)
 
 
 @extend_schema(
@@ -72,8 +227,9 @@ class FeedView(generics.ListAPIView):
             ids.update(pair)
         ids.add(user.id)
         return (
-            Moment.objects.filter(author_id__in=ids, is_deleted=False)
-            .filter(Q(type=Moment.MomentType.IMAGE) | Q(video_status=Moment.VideoStatus.READY))
+            Moment.objects.visible()
+            .filter(author_id__in=ids)
+            .prefetch_related("images__derivatives")
             .order_by("-created_at")
         )
 
@@ -126,8 +282,9 @@ class MyMomentsView(generics.ListAPIView):
     def get_queryset(self):
         user = self.request.user
         return (
-            Moment.objects.filter(author=user, is_deleted=False)
-            .filter(Q(type=Moment.MomentType.IMAGE) | Q(video_status=Moment.VideoStatus.READY))
+            Moment.objects.visible()
+            .filter(author=user)
+            .prefetch_related("images__derivatives")
             .order_by("-created_at")
         )
 
@@ -145,8 +302,9 @@ class UserMomentsView(generics.ListAPIView):
     def get_queryset(self):
         user_id = self.kwargs.get("user_id")
         return (
-            Moment.objects.filter(author_id=user_id, is_deleted=False)
-            .filter(Q(type=Moment.MomentType.IMAGE) | Q(video_status=Moment.VideoStatus.READY))
+            Moment.objects.visible()
+            .filter(author_id=user_id)
+            .prefetch_related("images__derivatives")
             .order_by("-created_at")
         )
 
@@ -188,13 +346,24 @@ class UserMomentsView(generics.ListAPIView):
 )
 class SearchView(generics.ListAPIView):
     """动态搜索接口"""
-    serializer_class = MomentListSerializer
+    serializer_class = MomentSearchSerializer
     permission_classes = [permissions.IsAuthenticated]
 
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context["keyword"] = self.request.query_params.get("keyword")
+        context["highlights"] = getattr(self, "highlights", {})
+        return context
+
+    def list(self, request, *args, **kwargs):
+        keyword = request.query_params.get("keyword")
+        # 翻页不重复计入搜索日志
+        if keyword and request.query_params.get("page", "1") == "1":
+            search_log.record(keyword, SearchQuery.Source.SEARCH, request.user.id)
+        return super().list(request, *args, **kwargs)
+
     def get_queryset(self):
-        qs = Moment.objects.filter(is_deleted=False).filter(
-            Q(type=Moment.MomentType.IMAGE) | Q(video_status=Moment.VideoStatus.READY)
-        )
+        qs = Moment.objects.visible()
         keyword = self.request.query_params.get("keyword")
         label = self.request.query_params.get("label")
         start_date = self.request.query_params.get("start_date")
@@ -247,11 +416,14 @@ class SearchView(generics.ListAPIView):
                 candidates_qs = qs.order_by("-created_at")[:1000]  # 增加候选数量
                 candidates = list(candidates_qs)
                 
-                # 进行拼音匹配
+                # 进行拼音匹配，记下命中范围供序列化时高亮，不再重复转换拼音
                 pinyin_matches = []
+                self.highlights = {}
                 for m in candidates:
-                    if m.content and match_pinyin(keyword, m.content):
+                    span = PinyinText(m.content).find(keyword) if m.content else None
+                    if span:
                         pinyin_matches.append(m)
+                        self.highlights[m.id] = span
                 
                 if pinyin_matches:
                     # 合并直接匹配和拼音匹配的结果
@@ -268,7 +440,7 @@ class SearchView(generics.ListAPIView):
                 # 不需要拼音匹配，直接使用直接匹配结果
                 qs = direct_matches
         
-        return qs.order_by("-created_at")
+        return qs.prefetch_related("images__derivatives").order_by("-created_at")
 
 
 @extend_schema(
@@ -306,126 +478,45 @@ class SearchSuggestionsView(generics.GenericAPIView):
                 "tags": []
             })
         
-        suggestions = []
-        tags = []
-        
-        # 获取匹配的动态内容片段（支持拼音匹配）
-        # 先获取所有可能的记录
-        base_qs = Moment.objects.filter(
-            is_deleted=False
-        ).filter(
-            Q(type=Moment.MomentType.IMAGE) | Q(video_status=Moment.VideoStatus.READY)
-        )
-        
-        # 先尝试直接匹配
-        direct_moments = list(base_qs.filter(content__icontains=query).order_by("-created_at")[:limit])
-        direct_ids = {m.id for m in direct_moments}
-        
-        # 判断是否需要拼音匹配
-        is_pinyin_query = query.isalpha() and len(query) <= 20
-        need_pinyin_match = is_pinyin_query or len(direct_moments) < limit
-        
-        if need_pinyin_match:
-            # 从所有记录中查找拼音匹配
-            candidates = list(base_qs.order_by("-created_at")[:500])  # 增加候选数量
-            pinyin_matches = []
-            for m in candidates:
-                if m.id not in direct_ids and m.content and match_pinyin(query, m.content):
-                    pinyin_matches.append(m)
-                    if len(pinyin_matches) >= limit:
-                        break
-            
-            # 合并结果
-            moments = direct_moments + pinyin_matches[:limit - len(direct_moments)]
-        else:
-            moments = direct_moments
-        
-        for moment in moments:
-            if moment.content:
-                # 提取包含关键词的内容片段
-                content = moment.content
-                # 尝试找到匹配位置（支持拼音）
-                idx = -1
-                query_lower = query.lower()
-                content_lower = content.lower()
-                
-                # 先尝试直接匹配
-                idx = content_lower.find(query_lower)
-                
-                # 如果没找到，尝试在拼音中查找
-                if idx == -1:
-                    from .utils import get_pinyin, get_pinyin_initials
-                    content_pinyin = get_pinyin(content).lower()
-                    content_initials = get_pinyin_initials(content).lower()
-                    
-                    # 在拼音全拼中查找
-                    pinyin_idx = content_pinyin.find(query_lower)
-                    if pinyin_idx != -1:
-                        # 找到拼音位置，尝试映射回原文位置（简化处理）
-                        idx = 0  # 简化处理，从开头显示
-                    
-                    # 在首字母中查找
-                    if idx == -1:
-                        initials_idx = content_initials.find(query_lower)
-                        if initials_idx != -1:
-                            idx = 0
-                
-                if idx != -1:
-                    # 提取关键词前后各30个字符
-                    start = max(0, idx - 30)
-                    end = min(len(content), idx + len(query) + 30)
-                    snippet = content[start:end]
-                    if start > 0:
-                        snippet = "..." + snippet
-                    if end < len(content):
-                        snippet = snippet + "..."
-                    suggestions.append({
-                        "text": snippet,
-                        "keyword": query,
-                        "moment_id": moment.id
-                    })
-        
-        # 获取匹配的标签（支持拼音匹配）
-        all_tags = Tag.objects.all()
-        matching_tags = []
-        
-        # 先尝试直接匹配
-        direct_matches = [tag for tag in all_tags if query.lower() in tag.name.lower()]
-        matching_tags.extend(direct_matches)
-        
-        # 如果结果不足，尝试拼音匹配
-        if len(matching_tags) < limit:
-            pinyin_matches = [tag for tag in all_tags if match_pinyin(query, tag.name) and tag not in matching_tags]
-            matching_tags.extend(pinyin_matches)
-        
-        tags = [{"id": tag.id, "name": tag.name} for tag in matching_tags[:limit]]
-        
-        return Response({
-            "suggestions": suggestions[:limit],
-            "tags": tags
-        })
+        search_log.record(query, SearchQuery.Source.SUGGEST, request.user.id)
+        # 高频查询的结果由 aggregate_search_trends 预先计算并缓存
+        cached = search_log.cached_suggestions(query, limit)
+        if cached is not None:
+            return Response(cached)
+        # 其余查询由前缀树索引返回标签和热门搜索词（开启 SEARCH_SUGGEST_CONTENT 时合并动态内容片段）
+        return Response(build_suggestions(query, limit))
 
 
 @extend_schema(
     tags=["动态"],
     summary="热门搜索",
-    description="获取热门搜索标签和关键词。",
+    description="获取热门搜索标签和关键词。标签按时间窗口内的使用次数排序，关键词按最近的搜索次数排序。",
+    parameters=[
+        OpenApiParameter(
+            name="window",
+            type=str,
+            location=OpenApiParameter.QUERY,
+            description="统计时间窗口：24h / 7d / 30d / all，默认 7d",
+            required=False,
+        ),
+    ],
 )
 class HotSearchView(generics.GenericAPIView):
     """热门搜索接口"""
     permission_classes = [permissions.IsAuthenticated]
 
     def get(self, request):
-        # 获取使用频率最高的标签（通过MomentTag关联统计）
-        from django.db.models import Count
-        hot_tags = Tag.objects.filter(
-            moments__is_deleted=False
-        ).annotate(
-            usage_count=Count('moments', distinct=True)
-        ).order_by('-usage_count', '-id')[:10]
-        
-        tags = [{"id": tag.id, "name": tag.name, "count": tag.usage_count} for tag in hot_tags]
-        
+        window = request.query_params.get("window")
+        if window not in leaderboard.WINDOWS:
+            window = settings.HOT_TAG_DEFAULT_WINDOW
+        tags = get_or_compute(
+            hot_search_key(window), settings.CACHE_TTL_HOT_SEARCH, lambda: leaderboard.top_tags(window)
+        )
+        # 热门搜索词由 aggregate_search_trends 定时刷新，缓存缺失时现算
+        keywords = get_or_compute(
+            hot_keywords_key(), settings.SEARCH_TRENDS_INTERVAL, search_log.trending_keywords
+        )
         return Response({
-            "tags": tags
+            "tags": tags,
+            "keywords": keywords
         })
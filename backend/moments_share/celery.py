@@ -1,6 +1,7 @@
 import os
 
 from celery import Celery
+from celery.signals import worker_process_init
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "moments_share.settings")
 
@@ -9,7 +10,17 @@ app.config_from_object("django.conf:settings", namespace="CELERY")
 app.autodiscover_tasks()
 
 
+@worker_process_init.connect
+def warmup_ai_clients(**kwargs):
+    """Pre-build pooled LLM clients in each worker process."""
+    from ai_service.services import warmup_llm_clients
+
+    try:
+        warmup_llm_clients()
+    except Exception as e:
+        print(f"[celery] AI client warmup failed: {e}")
+
+
 @app.task(bind=True)
 def debug_task(self):
     print(f"Request: {self.request!r}")
-
@@ -1,3 +1,4 @@
+import importlib.util
 import os
 from datetime import timedelta
 from pathlib import Path
@@ -30,6 +31,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "core.profiling.ProfilingMiddleware",
     "corsheaders.middleware.CorsMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
@@ -79,6 +81,31 @@ AUTHENTICATION_BACKENDS = [
     "django.contrib.auth.backends.ModelBackend",
 ]
 
+# 密码哈希：PASSWORD_HASHER 选择新密码使用的算法（pbkdf2 / scrypt / argon2，argon2 需要安装 argon2-cffi），
+# 各算法的参数可按 python manage.py benchmark_password_hashers 的结果调整；
+# 修改后已有用户在下次登录时自动按新配置重新哈希
+PASSWORD_HASHER = os.getenv("PASSWORD_HASHER", "pbkdf2")
+PASSWORD_PBKDF2_ITERATIONS = int(os.getenv("PASSWORD_PBKDF2_ITERATIONS", "600000"))
+PASSWORD_SCRYPT_WORK_FACTOR = int(os.getenv("PASSWORD_SCRYPT_WORK_FACTOR", str(2**14)))
+PASSWORD_SCRYPT_BLOCK_SIZE = int(os.getenv("PASSWORD_SCRYPT_BLOCK_SIZE", "8"))
+PASSWORD_SCRYPT_PARALLELISM = int(os.getenv("PASSWORD_SCRYPT_PARALLELISM", "1"))
+PASSWORD_ARGON2_TIME_COST = int(os.getenv("PASSWORD_ARGON2_TIME_COST", "2"))
+PASSWORD_ARGON2_MEMORY_COST = int(os.getenv("PASSWORD_ARGON2_MEMORY_COST", "102400"))
+PASSWORD_ARGON2_PARALLELISM = int(os.getenv("PASSWORD_ARGON2_PARALLELISM", "8"))
+_PASSWORD_HASHER_CLASSES = {
+    "pbkdf2": "users.hashers.TunedPBKDF2PasswordHasher",
+    "scrypt": "users.hashers.TunedScryptPasswordHasher",
+    "argon2": "users.hashers.TunedArgon2PasswordHasher",
+}
+if PASSWORD_HASHER not in _PASSWORD_HASHER_CLASSES or (
+    PASSWORD_HASHER == "argon2" and importlib.util.find_spec("argon2") is None
+):
+    PASSWORD_HASHER = "pbkdf2"
+# 首选算法放在第一位，其余算法只用于校验旧密码
+PASSWORD_HASHERS = [_PASSWORD_HASHER_CLASSES[PASSWORD_HASHER]] + [
+    path for name, path in _PASSWORD_HASHER_CLASSES.items() if name != PASSWORD_HASHER
+]
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         "NAME": "django.contrib.auth.password_validation.UserAttributeSimilarityValidator",
@@ -103,12 +130,77 @@ STATIC_URL = "/static/"
 STATIC_ROOT = BASE_DIR / "staticfiles"
 MEDIA_URL = "/media/"
 MEDIA_ROOT = BASE_DIR / "media"
+# seed_data 下载媒体的本地缓存目录与并发数；SEED_OFFLINE=True 时不联网，图片全部使用本地生成的占位图
+SEED_MEDIA_CACHE_DIR = os.getenv("SEED_MEDIA_CACHE_DIR", str(BASE_DIR / ".seed_cache"))
+SEED_DOWNLOAD_WORKERS = int(os.getenv("SEED_DOWNLOAD_WORKERS", "8"))
+SEED_OFFLINE = os.getenv("SEED_OFFLINE", "False") == "True"
 
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
+# 缓存：配置 REDIS_CACHE_URL 时使用 Redis，否则退回进程内缓存（本地开发/测试无需 Redis）
+# metrics 保存请求采样的计数器（core.profiling），不设过期时间，单独使用一个缓存，不会被其他缓存数据挤出；
+# 进程内缓存时各进程分别计数，/metrics/ 只返回处理抓取请求的那个进程的统计
+REDIS_CACHE_URL = os.getenv("REDIS_CACHE_URL", "")
+if REDIS_CACHE_URL:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": REDIS_CACHE_URL,
+        },
+        "metrics": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": REDIS_CACHE_URL,
+        },
+    }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+            "LOCATION": "moments-share",
+        },
+        "metrics": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+            "LOCATION": "moments-share-metrics",
+            # 每个路由约 10 个键，上限远大于路由数，计数器不会被淘汰
+            "OPTIONS": {"MAX_ENTRIES": 100000},
+        },
+    }
+# 缓存是否由所有进程共享：进程内缓存的失效只对本进程生效，认证用户等需要跨进程立即失效的数据只在共享缓存上缓存
+CACHE_SHARED = bool(REDIS_CACHE_URL)
+# 各接口缓存时间（秒）
+CACHE_TTL_HOT_SEARCH = int(os.getenv("CACHE_TTL_HOT_SEARCH", "60"))
+CACHE_TTL_AVG_SCORE = int(os.getenv("CACHE_TTL_AVG_SCORE", "300"))
+CACHE_TTL_USER_PROFILE = int(os.getenv("CACHE_TTL_USER_PROFILE", "300"))
+CACHE_TTL_MOMENT_DETAIL = int(os.getenv("CACHE_TTL_MOMENT_DETAIL", "60"))
+# JWT 认证时缓存的用户对象
+CACHE_TTL_AUTH_USER = int(os.getenv("CACHE_TTL_AUTH_USER", "300"))
+# refresh token 是否在黑名单中的查询结果
+CACHE_TTL_TOKEN_BLACKLIST = int(os.getenv("CACHE_TTL_TOKEN_BLACKLIST", "3600"))
+# 热门标签：默认统计窗口（24h/7d/30d/all），超过多少天的小时桶合并为天桶
+HOT_TAG_DEFAULT_WINDOW = os.getenv("HOT_TAG_DEFAULT_WINDOW", "7d")
+HOT_TAG_COMPACT_AFTER_DAYS = int(os.getenv("HOT_TAG_COMPACT_AFTER_DAYS", "30"))
+# 搜索日志：进程内缓冲条数和最长缓冲时间（秒），日志保留天数
+SEARCH_LOG_BUFFER_SIZE = int(os.getenv("SEARCH_LOG_BUFFER_SIZE", "100"))
+SEARCH_LOG_FLUSH_INTERVAL = int(os.getenv("SEARCH_LOG_FLUSH_INTERVAL", "10"))
+SEARCH_LOG_RETENTION_DAYS = int(os.getenv("SEARCH_LOG_RETENTION_DAYS", "30"))
+# 热门搜索词：统计窗口（小时）、汇总间隔（秒）、返回的搜索词数、预计算搜索建议的查询数
+SEARCH_TRENDS_WINDOW_HOURS = int(os.getenv("SEARCH_TRENDS_WINDOW_HOURS", "24"))
+SEARCH_TRENDS_INTERVAL = int(os.getenv("SEARCH_TRENDS_INTERVAL", "300"))
+SEARCH_TRENDS_KEYWORDS = int(os.getenv("SEARCH_TRENDS_KEYWORDS", "10"))
+SEARCH_PRECOMPUTE_QUERIES = int(os.getenv("SEARCH_PRECOMPUTE_QUERIES", "50"))
+# 搜索建议前缀树：每个节点保留的词条数、收录的热门搜索词数、进程内索引的同步间隔（秒）
+AUTOCOMPLETE_TOP_K = int(os.getenv("AUTOCOMPLETE_TOP_K", "10"))
+AUTOCOMPLETE_KEYWORDS = int(os.getenv("AUTOCOMPLETE_KEYWORDS", "500"))
+AUTOCOMPLETE_REFRESH_SECONDS = int(os.getenv("AUTOCOMPLETE_REFRESH_SECONDS", "60"))
+# 搜索建议是否合并动态内容片段（每次输入都会扫描动态内容，默认关闭，只返回前缀树的结果）
+SEARCH_SUGGEST_CONTENT = os.getenv("SEARCH_SUGGEST_CONTENT", "False") == "True"
+# 缓存未命中时回源计算的锁超时，以及其他请求等待结果的最长时间
+CACHE_LOCK_TIMEOUT = int(os.getenv("CACHE_LOCK_TIMEOUT", "10"))
+CACHE_COALESCE_WAIT = float(os.getenv("CACHE_COALESCE_WAIT", "2"))
+
 REST_FRAMEWORK = {
     "DEFAULT_AUTHENTICATION_CLASSES": (
-        "rest_framework_simplejwt.authentication.JWTAuthentication",
+        "users.authentication.CachedJWTAuthentication",
     ),
     "DEFAULT_PERMISSION_CLASSES": (
         "rest_framework.permissions.IsAuthenticated",
@@ -117,8 +209,23 @@ REST_FRAMEWORK = {
     "PAGE_SIZE": 10,
     "EXCEPTION_HANDLER": "core.exceptions.custom_exception_handler",
     "DEFAULT_SCHEMA_CLASS": "drf_spectacular.openapi.AutoSchema",
+    # 应用前面的反向代理层数：限流按 X-Forwarded-For 中由代理追加的客户端地址识别 IP，
+    # 0 表示直接使用 REMOTE_ADDR（客户端自带的 X-Forwarded-For 不可信）
+    "NUM_PROXIES": int(os.getenv("NUM_PROXIES", "0")),
+}
+
+# 登录/注册限流（滑动窗口，计数器保存在上面的缓存中）：格式为 次数/时间单位（s/min/hour/day）
+THROTTLE_RATES = {
+    "login_ip": os.getenv("THROTTLE_LOGIN_IP", "30/min"),
+    "login_phone": os.getenv("THROTTLE_LOGIN_PHONE", "5/min"),
+    "register_ip": os.getenv("THROTTLE_REGISTER_IP", "10/hour"),
 }
 
+# 请求性能采样：采样比例（0 关闭，1 全部采样）、是否检查重复 SQL、/metrics/ 的访问 token（开启采样时必须配置，否则拒绝访问）
+PROFILING_SAMPLE_RATE = float(os.getenv("PROFILING_SAMPLE_RATE", "0"))
+PROFILING_DEBUG = os.getenv("PROFILING_DEBUG", str(DEBUG)) == "True"
+PROFILING_METRICS_TOKEN = os.getenv("PROFILING_METRICS_TOKEN", "")
+
 # API Documentation Settings
 SPECTACULAR_SETTINGS = {
     "TITLE": "MomentsShare API",
@@ -156,13 +263,50 @@ SIMPLE_JWT = {
     "ALGORITHM": "HS256",
     "SIGNING_KEY": SECRET_KEY,
     "AUTH_HEADER_TYPES": ("Bearer",),
+    "TOKEN_REFRESH_SERIALIZER": "users.serializers.CachedTokenRefreshSerializer",
 }
+# 每批删除的过期 token 数
+TOKEN_PRUNE_BATCH_SIZE = int(os.getenv("TOKEN_PRUNE_BATCH_SIZE", "1000"))
 
 CELERY_BROKER_URL = os.getenv("CELERY_BROKER_URL", "redis://localhost:6379/0")
 CELERY_RESULT_BACKEND = os.getenv("CELERY_RESULT_BACKEND", CELERY_BROKER_URL)
 CELERY_ACCEPT_CONTENT = ["json"]
 CELERY_TASK_SERIALIZER = "json"
 CELERY_RESULT_SERIALIZER = "json"
+CELERY_BEAT_SCHEDULE = {
+    "cleanup-stale-video-uploads": {
+        "task": "moments.tasks.cleanup_stale_uploads",
+        "schedule": 3600,
+    },
+    "compact-tag-usage": {
+        "task": "moments.tasks.compact_tag_usage",
+        "schedule": 24 * 3600,
+    },
+    "aggregate-search-trends": {
+        "task": "moments.tasks.aggregate_search_trends",
+        "schedule": SEARCH_TRENDS_INTERVAL,
+    },
+    "prune-expired-tokens": {
+        "task": "users.tasks.prune_expired_tokens",
+        "schedule": 24 * 3600,
+    },
+}
+
+# 视频转码（ffmpeg）：HLS 分片时长、每个转码任务处理的时长
+FFMPEG_BINARY = os.getenv("FFMPEG_BINARY", "ffmpeg")
+FFPROBE_BINARY = os.getenv("FFPROBE_BINARY", "ffprobe")
+VIDEO_HLS_SEGMENT_SECONDS = int(os.getenv("VIDEO_HLS_SEGMENT_SECONDS", "6"))
+VIDEO_TRANSCODE_CHUNK_SECONDS = int(os.getenv("VIDEO_TRANSCODE_CHUNK_SECONDS", "60"))
+# 视频分块上传：单个文件上限、单块上限、未完成上传的保留时长
+VIDEO_UPLOAD_MAX_SIZE = int(os.getenv("VIDEO_UPLOAD_MAX_SIZE", str(1024 * 1024 * 1024)))
+VIDEO_UPLOAD_CHUNK_SIZE = int(os.getenv("VIDEO_UPLOAD_CHUNK_SIZE", str(8 * 1024 * 1024)))
+VIDEO_UPLOAD_EXPIRE_HOURS = int(os.getenv("VIDEO_UPLOAD_EXPIRE_HOURS", "24"))
+# 图文动态图片上传：单张文件大小、像素数上限，并发写入存储的线程数
+IMAGE_UPLOAD_MAX_SIZE = int(os.getenv("IMAGE_UPLOAD_MAX_SIZE", str(20 * 1024 * 1024)))
+IMAGE_UPLOAD_MAX_PIXELS = int(os.getenv("IMAGE_UPLOAD_MAX_PIXELS", str(40_000_000)))
+IMAGE_INGEST_WORKERS = int(os.getenv("IMAGE_INGEST_WORKERS", "4"))
+# 图片衍生版本（缩略图/中图/大图）的编码质量
+IMAGE_DERIVATIVE_QUALITY = int(os.getenv("IMAGE_DERIVATIVE_QUALITY", "80"))
 
 SENSITIVE_WORDS = os.getenv("SENSITIVE_WORDS", "违禁,敏感,非法").split(",")
 
@@ -177,4 +321,37 @@ AI_BASE_URL = os.getenv("AI_BASE_URL", "")  # Optional: Custom API base URL
 AI_MODEL_NAME = os.getenv("AI_MODEL_NAME", "gpt-3.5-turbo")
 AI_PROXY_URL = os.getenv("AI_PROXY_URL", "")  # Optional: Proxy URL (e.g. http://127.0.0.1:7890)
 
+# AI 客户端连接池（进程内复用 ChatOpenAI 与 HTTP keep-alive 连接）
+AI_HTTP_MAX_CONNECTIONS = int(os.getenv("AI_HTTP_MAX_CONNECTIONS", "20"))
+AI_HTTP_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("AI_HTTP_MAX_KEEPALIVE_CONNECTIONS", "10"))
+AI_HTTP_KEEPALIVE_EXPIRY = float(os.getenv("AI_HTTP_KEEPALIVE_EXPIRY", "60"))
+# Worker 启动时预热的模型列表（逗号分隔，留空则预热 AI_MODEL_NAME）
+AI_WARMUP_MODELS = [m for m in os.getenv("AI_WARMUP_MODELS", "").split(",") if m]
+
+# 上游 LLM 熔断与降级：单次请求的总耗时预算、对冲备用模型的等待时间
+AI_REQUEST_BUDGET = float(os.getenv("AI_REQUEST_BUDGET", "20"))  # seconds
+AI_HEDGE_DELAY = float(os.getenv("AI_HEDGE_DELAY", "5"))  # seconds
+AI_BACKUP_MODELS = [m for m in os.getenv("AI_BACKUP_MODELS", "").split(",") if m]
+AI_MAX_CONCURRENT_CALLS = int(os.getenv("AI_MAX_CONCURRENT_CALLS", "16"))
+AI_BREAKER_FAILURE_RATE = float(os.getenv("AI_BREAKER_FAILURE_RATE", "0.5"))
+AI_BREAKER_MIN_CALLS = int(os.getenv("AI_BREAKER_MIN_CALLS", "5"))
+AI_BREAKER_WINDOW_SECONDS = float(os.getenv("AI_BREAKER_WINDOW_SECONDS", "60"))
+AI_BREAKER_OPEN_SECONDS = float(os.getenv("AI_BREAKER_OPEN_SECONDS", "30"))
+
+# 发送给视觉模型前的图片预处理（缩放 + 去除 EXIF + 重新编码）
+AI_IMAGE_MAX_SIDE = int(os.getenv("AI_IMAGE_MAX_SIDE", "1280"))
+AI_IMAGE_FORMAT = os.getenv("AI_IMAGE_FORMAT", "JPEG")  # JPEG or WEBP
+AI_IMAGE_QUALITY = int(os.getenv("AI_IMAGE_QUALITY", "80"))
+AI_IMAGE_MAX_PIXELS = int(os.getenv("AI_IMAGE_MAX_PIXELS", str(50_000_000)))
+
+# 历史动态 AI 标签补全（manage.py backfill_tags / ai_service.tasks.backfill_moment_tags）
+AI_BACKFILL_CHUNK_SIZE = int(os.getenv("AI_BACKFILL_CHUNK_SIZE", "200"))
+AI_BACKFILL_BATCH_SIZE = int(os.getenv("AI_BACKFILL_BATCH_SIZE", "10"))  # 每个 prompt 包含的动态数
+AI_BACKFILL_MAX_WORKERS = int(os.getenv("AI_BACKFILL_MAX_WORKERS", "4"))
+AI_BACKFILL_RATE_LIMIT = float(os.getenv("AI_BACKFILL_RATE_LIMIT", "2"))  # 每秒请求数，0 表示不限制
+# 模型答复了同一分块的其他动态却始终漏答某条动态时，重试多少次后跳过该动态
+AI_BACKFILL_MAX_ATTEMPTS = int(os.getenv("AI_BACKFILL_MAX_ATTEMPTS", "3"))
+# 后台任务连续失败多少次后不再自动重新排队（需人工检查后再次提交）
+AI_BACKFILL_MAX_FAILED_RUNS = int(os.getenv("AI_BACKFILL_MAX_FAILED_RUNS", "10"))
+
 CORS_ALLOW_ALL_ORIGINS = True
\ No newline at end of file
@@ -8,6 +8,8 @@ from drf_spectacular.views import (
     SpectacularSwaggerView,
 )
 
+from core.profiling import metrics_view
+
 urlpatterns = [
     path("admin/", admin.site.urls),
     path("api/v1/auth/", include("users.auth_urls")),
@@ -18,6 +20,7 @@ urlpatterns = [
     path("api/v1/interactions/", include("interactions.urls")),
     path("api/v1/ai/", include("ai_service.urls")),
     path("api/v1/admin/", include("admin_panel.urls")),
+    path("metrics/", metrics_view, name="metrics"),
     # API 文档
     path("api/schema/", SpectacularAPIView.as_view(), name="schema"),
     path("api/docs/", SpectacularSwaggerView.as_view(url_name="schema"), name="swagger-ui"),
@@ -8,6 +8,15 @@ from PIL import Image as PILImage
 from rest_framework import status
 
 
+@pytest.fixture(autouse=True)
+def _reset_circuit_breakers():
+    """Circuit breakers are process-wide; isolate them between tests."""
+    from ai_service.resilience import reset_breakers
+    reset_breakers()
+    yield
+    reset_breakers()
+
+
 @pytest.mark.django_db
 class TestPolishView:
     """Tests for polish view (MC-01)."""
@@ -443,3 +452,478 @@ class TestTagRecommendSerializer:
         serializer = TagRecommendSerializer(data={})
         assert not serializer.is_valid()
 
+
+
+@pytest.mark.django_db
+class TestLLMClientPool:
+    """Tests for the process-level ChatOpenAI client registry."""
+
+    @pytest.fixture(autouse=True)
+    def _reset_pool(self, settings):
+        from ai_service.services import reset_llm_clients
+        settings.AI_API_KEY = "test-key"
+        settings.AI_BASE_URL = ""
+        settings.AI_PROXY_URL = ""
+        reset_llm_clients()
+        yield
+        reset_llm_clients()
+
+    def test_same_settings_reuse_client(self):
+        """Test repeated get_llm calls return the same pooled client."""
+        from ai_service.services import AIService, get_client_stats
+        llm1 = AIService().get_llm(model_name="Qwen/Qwen2.5-7B-Instruct")
+        llm2 = AIService().get_llm(model_name="Qwen/Qwen2.5-7B-Instruct")
+        assert llm1 is llm2
+        stats = get_client_stats()
+        assert stats["clients_created"] == 1
+        assert stats["clients_reused"] == 1
+
+    def test_reuse_logged_at_debug(self, caplog):
+        """Test reusing a pooled client does not log at INFO on the hot path."""
+        import logging
+        from ai_service.services import AIService
+        AIService().get_llm(model_name="Qwen/Qwen2.5-7B-Instruct")
+        with caplog.at_level(logging.DEBUG, logger="ai_service.services"):
+            AIService().get_llm(model_name="Qwen/Qwen2.5-7B-Instruct")
+        reuse = [r for r in caplog.records if "Reusing client" in r.getMessage()]
+        assert [r.levelno for r in reuse] == [logging.DEBUG]
+
+    def test_different_models_get_separate_clients(self):
+        """Test clients are keyed by model and timeout but share the HTTP pool."""
+        from ai_service.services import AIService
+        service = AIService()
+        qwen = service.get_llm(model_name="Qwen/Qwen2.5-7B-Instruct")
+        other = service.get_llm(model_name="deepseek-ai/DeepSeek-V3")
+        glm = service.get_llm(model_name="zai-org/GLM-4.6V")
+        assert qwen is not other
+        assert qwen.http_client is other.http_client
+        # GLM uses a longer timeout, so it gets its own connection pool
+        assert glm.http_client is not qwen.http_client
+
+    def test_no_api_key_returns_none(self, settings):
+        """Test no client is pooled when API key is missing."""
+        from ai_service.services import AIService, get_client_stats
+        settings.AI_API_KEY = ""
+        assert AIService().get_llm() is None
+        assert get_client_stats()["pooled_clients"] == 0
+
+    def test_connection_reuse_stats(self):
+        """Test request hook and trace callback feed the reuse ratio."""
+        import httpx
+        from ai_service.services import _on_http_request, get_client_stats
+        for _ in range(4):
+            request = httpx.Request("POST", "https://example.com/v1/chat/completions")
+            _on_http_request(request)
+        request.extensions["trace"]("connection.connect_tcp.complete", {})
+        stats = get_client_stats()
+        assert stats["http_requests"] == 4
+        assert stats["connections_opened"] == 1
+        assert stats["connections_reused"] == 3
+        assert stats["connection_reuse_ratio"] == 0.75
+
+    def test_warmup_builds_clients(self, settings):
+        """Test warmup pre-builds one client per configured model."""
+        from ai_service.services import get_client_stats, warmup_llm_clients
+        settings.AI_WARMUP_MODELS = ["Qwen/Qwen2.5-7B-Instruct", "zai-org/GLM-4.6V"]
+        assert warmup_llm_clients() == 2
+        assert get_client_stats()["pooled_clients"] == 2
+
+    def test_warmup_skipped_without_api_key(self, settings):
+        """Test warmup is a no-op without API key."""
+        from ai_service.services import warmup_llm_clients
+        settings.AI_API_KEY = ""
+        assert warmup_llm_clients() == 0
+
+
+@pytest.mark.django_db
+class TestImagePreprocessing:
+    """Tests for image downscaling before sending to the vision model."""
+
+    def _make_jpeg(self, size=(3000, 2000), exif=True):
+        img = PILImage.new("RGB", size, color="orange")
+        buffer = io.BytesIO()
+        if exif:
+            exif_data = PILImage.Exif()
+            exif_data[0x010F] = "TestCamera"  # Make
+            img.save(buffer, format="JPEG", quality=95, exif=exif_data)
+        else:
+            img.save(buffer, format="JPEG", quality=95)
+        buffer.seek(0)
+        buffer.name = "photo.jpg"
+        return buffer
+
+    def test_downscales_to_max_side(self):
+        """Test large images are resized to fit max side."""
+        from ai_service.images import preprocess_image
+        data, mime = preprocess_image(self._make_jpeg(), max_side=1024)
+        result = PILImage.open(io.BytesIO(data))
+        assert max(result.size) == 1024
+        assert mime == "image/jpeg"
+
+    def test_small_image_not_upscaled(self):
+        """Test images smaller than max side keep their size."""
+        from ai_service.images import preprocess_image
+        data, _ = preprocess_image(self._make_jpeg(size=(200, 100), exif=False), max_side=1024)
+        assert PILImage.open(io.BytesIO(data)).size == (200, 100)
+
+    def test_strips_exif(self):
+        """Test EXIF metadata is removed."""
+        from ai_service.images import preprocess_image
+        data, _ = preprocess_image(self._make_jpeg(), max_side=512)
+        assert not PILImage.open(io.BytesIO(data)).getexif()
+
+    def test_webp_output(self, test_image_png):
+        """Test WebP re-encoding returns webp mime type."""
+        from ai_service.images import preprocess_image
+        data, mime = preprocess_image(test_image_png, image_format="webp")
+        assert mime == "image/webp"
+        assert PILImage.open(io.BytesIO(data)).format == "WEBP"
+
+    def test_model_specific_max_side(self, settings):
+        """Test max side is capped per model family and by settings."""
+        from ai_service.images import max_side_for_model
+        settings.AI_IMAGE_MAX_SIDE = 1280
+        assert max_side_for_model("stepfun-ai/step3") == 1024
+        assert max_side_for_model("zai-org/GLM-4.6V") == 1280
+        assert max_side_for_model(None) == 1280
+
+    def test_process_image_returns_base64_and_mime(self):
+        """Test view helper returns a payload smaller than the original."""
+        import base64
+        from ai_service.views import _process_image
+        original = self._make_jpeg()
+        original_size = len(original.getvalue())
+        encoded, mime = _process_image(original)
+        assert mime == "image/jpeg"
+        assert len(base64.b64decode(encoded)) < original_size
+
+    def test_process_image_invalid_file(self):
+        """Test corrupt uploads are ignored instead of sent raw."""
+        from ai_service.views import _process_image
+        broken = io.BytesIO(b"not an image")
+        broken.name = "broken.jpg"
+        assert _process_image(broken) == (None, None)
+
+
+@pytest.mark.django_db
+class TestTagBackfill:
+    """Tests for batch AI tag backfill of untagged moments."""
+
+    class FakeService:
+        def __init__(self, answer=None):
+            self.calls = []
+            self.answer = answer
+
+        def recommend_tags_batch(self, items, model_name=None):
+            self.calls.append(list(items))
+            if self.answer is not None:
+                return self.answer
+            return {item_id: ["#旅行", "风景", "法轮功"] for item_id, _ in items}
+
+    def _make_moments(self, user, count):
+        from moments.models import Moment
+        return [
+            Moment.objects.create(author=user, content=f"动态{i}", type=Moment.MomentType.IMAGE)
+            for i in range(count)
+        ]
+
+    def test_recommend_tags_batch_parses_results(self, settings):
+        """Test multi-item prompt response is mapped back to ids."""
+        from ai_service.services import AIService
+        settings.AI_API_KEY = "test-key"
+        llm = MagicMock(model_name="test-model")
+        llm.invoke.return_value = MagicMock(
+            content='```json\n{"results": [{"id": 1, "tags": ["美食", "日常"]}, {"id": 99, "tags": ["x"]}]}\n```'
+        )
+        service = AIService()
+        with patch.object(service, "get_llm", return_value=llm):
+            result = service.recommend_tags_batch([(1, "吃火锅"), (2, "看电影")])
+        assert result == {1: ["美食", "日常"]}
+
+    def test_recommend_tags_batch_failure_returns_empty(self, settings):
+        """Test failed calls return no tags rather than fallback tags."""
+        from ai_service.services import AIService
+        settings.AI_API_KEY = "test-key"
+        llm = MagicMock(model_name="test-model")
+        llm.invoke.side_effect = Exception("timeout")
+        service = AIService()
+        with patch.object(service, "get_llm", return_value=llm):
+            assert service.recommend_tags_batch([(1, "吃火锅")]) == {}
+
+    def test_backfill_tags_untagged_moments(self, user, tmp_path):
+        """Test backfill batches items, writes tags and skips sensitive ones."""
+        from ai_service.backfill import run_tag_backfill
+        moments = self._make_moments(user, 5)
+        service = self.FakeService()
+        state = run_tag_backfill(
+            chunk_size=3, batch_size=2, max_workers=2, rate_limit=0,
+            checkpoint_path=tmp_path / "ckpt", service=service,
+        )
+        assert state["done"] is True
+        assert state["processed"] == 5
+        assert max(len(call) for call in service.calls) == 2
+        for moment in moments:
+            assert sorted(moment.tags.values_list("name", flat=True)) == ["旅行", "风景"]
+
+    def test_backfill_resumes_from_checkpoint(self, user, tmp_path):
+        """Test an interrupted run continues after the last checkpointed id."""
+        from ai_service.backfill import load_checkpoint, run_tag_backfill
+        moments = self._make_moments(user, 4)
+        checkpoint = tmp_path / "ckpt"
+        first = run_tag_backfill(
+            chunk_size=2, batch_size=2, rate_limit=0, max_chunks=1,
+            checkpoint_path=checkpoint, service=self.FakeService(),
+        )
+        assert first["done"] is False and first["failed"] is False
+        assert load_checkpoint(checkpoint)["last_id"] == moments[1].id
+
+        service = self.FakeService()
+        second = run_tag_backfill(
+            chunk_size=2, batch_size=2, rate_limit=0,
+            checkpoint_path=checkpoint, service=service,
+        )
+        assert second["processed"] == 4
+        called_ids = {item_id for call in service.calls for item_id, _ in call}
+        assert called_ids == {moments[2].id, moments[3].id}
+
+    def test_backfill_failed_batch_does_not_advance(self, user, tmp_path):
+        """Test unanswered moments stop the run and are retried by the next one."""
+        from ai_service.backfill import load_checkpoint, run_tag_backfill
+        moments = self._make_moments(user, 4)
+        checkpoint = tmp_path / "ckpt"
+        failed = run_tag_backfill(
+            chunk_size=2, batch_size=2, rate_limit=0,
+            checkpoint_path=checkpoint, service=self.FakeService(answer={}),
+        )
+        assert failed["done"] is False and failed["failed"] is True
+        assert load_checkpoint(checkpoint)["last_id"] == 0
+
+        # Only the first moment of the batch is answered: the checkpoint stops right after it
+        partial = run_tag_backfill(
+            chunk_size=2, batch_size=2, rate_limit=0,
+            checkpoint_path=checkpoint, service=self.FakeService(answer={moments[0].id: ["风景"]}),
+        )
+        assert partial["failed"] is True
+        assert load_checkpoint(checkpoint)["last_id"] == moments[0].id
+
+        service = self.FakeService()
+        assert run_tag_backfill(
+            chunk_size=2, batch_size=2, rate_limit=0, checkpoint_path=checkpoint, service=service,
+        )["done"] is True
+        called_ids = {item_id for call in service.calls for item_id, _ in call}
+        assert called_ids == {moments[1].id, moments[2].id, moments[3].id}
+
+    def test_backfill_skips_moment_left_out_repeatedly(self, user, tmp_path):
+        """Test a moment the model keeps leaving out is skipped after the attempt limit."""
+        from ai_service.backfill import load_checkpoint, run_tag_backfill
+        moments = self._make_moments(user, 3)
+        checkpoint = tmp_path / "ckpt"
+        # 模型总是答复第一、三条而漏答第二条
+        answer = {moments[0].id: ["风景"], moments[2].id: ["风景"]}
+        for _ in range(2):
+            state = run_tag_backfill(
+                chunk_size=3, batch_size=3, rate_limit=0, max_attempts=3,
+                checkpoint_path=checkpoint, service=self.FakeService(answer=answer),
+            )
+            assert state["failed"] is True
+            assert state["last_id"] == moments[0].id
+        state = run_tag_backfill(
+            chunk_size=3, batch_size=3, rate_limit=0, max_attempts=3,
+            checkpoint_path=checkpoint, service=self.FakeService(answer=answer),
+        )
+        assert state["done"] is True and state["skipped"] == 1
+        assert load_checkpoint(checkpoint)["attempts"] == {}
+
+    def test_backfill_outage_does_not_count_attempts(self, user, tmp_path):
+        """Test a chunk with no answers at all is treated as an outage, not a bad moment."""
+        from ai_service.backfill import run_tag_backfill
+        self._make_moments(user, 2)
+        for _ in range(5):
+            state = run_tag_backfill(
+                chunk_size=2, batch_size=2, rate_limit=0, max_attempts=2,
+                checkpoint_path=tmp_path / "ckpt", service=self.FakeService(answer={}),
+            )
+        assert state["skipped"] == 0 and state["attempts"] == {} and state["last_id"] == 0
+
+    def test_backfill_task_stops_after_failed_runs(self, settings):
+        """Test the self re-enqueueing task gives up after too many failed runs in a row."""
+        from ai_service import tasks
+        settings.AI_BACKFILL_MAX_FAILED_RUNS = 3
+        failed = {"done": False, "failed": True, "last_id": 7}
+        with patch("ai_service.tasks.run_tag_backfill", return_value=failed), \
+                patch.object(tasks.backfill_moment_tags, "apply_async") as enqueue:
+            tasks.backfill_moment_tags(failed_runs=1)
+            assert enqueue.call_args.kwargs["kwargs"]["failed_runs"] == 2
+            enqueue.reset_mock()
+            tasks.backfill_moment_tags(failed_runs=2)
+            enqueue.assert_not_called()
+
+    def test_backfill_skips_tagged_and_empty_moments(self, user, tmp_path):
+        """Test moments with tags or no text are not sent to the model."""
+        from ai_service.backfill import run_tag_backfill
+        from moments.models import Moment, Tag
+        tagged = Moment.objects.create(author=user, content="已有标签", type=Moment.MomentType.IMAGE)
+        tagged.tags.add(Tag.objects.create(name="日常"))
+        Moment.objects.create(author=user, content="", type=Moment.MomentType.IMAGE)
+        service = self.FakeService()
+        run_tag_backfill(rate_limit=0, checkpoint_path=tmp_path / "ckpt", service=service)
+        assert service.calls == []
+
+    def test_backfill_command(self, user, tmp_path):
+        """Test management command runs the backfill."""
+        from django.core.management import call_command
+        self._make_moments(user, 2)
+        out = io.StringIO()
+        with patch("ai_service.backfill.AIService", return_value=self.FakeService()):
+            call_command("backfill_tags", checkpoint=str(tmp_path / "ckpt"), rate_limit=0, stdout=out)
+        assert "标签补全完成" in out.getvalue()
+
+    def test_rate_limiter_spaces_calls(self):
+        """Test rate limiter enforces minimum spacing between calls."""
+        import time
+        from ai_service.backfill import RateLimiter
+        limiter = RateLimiter(rate_per_second=50)
+        start = time.monotonic()
+        for _ in range(5):
+            limiter.acquire()
+        assert time.monotonic() - start >= 4 / 50 * 0.9
+
+
+@pytest.mark.django_db
+class TestCircuitBreaker:
+    """Tests for upstream LLM circuit breaking and hedged backup calls."""
+
+    def _llm(self, name, response=None, error=None, delay=0):
+        import time
+
+        def invoke(messages, **kwargs):
+            if delay:
+                time.sleep(delay)
+            if error:
+                raise error
+            return MagicMock(content=response or '{"polished_content": "%s", "suggested_tags": ["a"]}' % name)
+
+        llm = MagicMock(model_name=name)
+        llm.invoke.side_effect = invoke
+        return llm
+
+    def _service(self, settings, llms):
+        from ai_service.services import AIService
+        settings.AI_API_KEY = "test-key"
+        settings.AI_MODEL_NAME = llms[0].model_name
+        settings.AI_BACKUP_MODELS = [llm.model_name for llm in llms[1:]]
+        service = AIService()
+        by_name = {llm.model_name: llm for llm in llms}
+        service.get_llm = lambda model_name=None, image_data=None: by_name.get(model_name)
+        return service
+
+    def test_breaker_opens_after_failure_rate(self):
+        """Test breaker opens once failure rate crosses threshold."""
+        from ai_service.resilience import CircuitBreaker
+        breaker = CircuitBreaker("m", failure_rate=0.5, min_calls=4, open_seconds=30)
+        breaker.record_success()
+        breaker.record_failure()
+        breaker.record_failure()
+        assert breaker.state == CircuitBreaker.CLOSED
+        breaker.record_failure()
+        assert breaker.state == CircuitBreaker.OPEN
+        assert not breaker.allow_request()
+
+    def test_breaker_half_open_single_probe(self):
+        """Test only one probe passes in half-open state and success closes it."""
+        from ai_service.resilience import CircuitBreaker
+        breaker = CircuitBreaker("m", min_calls=1, open_seconds=0)
+        breaker.record_failure()
+        assert breaker.state == CircuitBreaker.HALF_OPEN
+        assert breaker.allow_request()
+        assert not breaker.allow_request()
+        breaker.record_success()
+        assert breaker.state == CircuitBreaker.CLOSED
+
+    def test_breaker_half_open_failure_reopens(self):
+        """Test failed probe re-opens the breaker."""
+        from ai_service.resilience import CircuitBreaker
+        breaker = CircuitBreaker("m", min_calls=1, open_seconds=0)
+        breaker.record_failure()
+        assert breaker.allow_request()
+        breaker.open_seconds = 30
+        breaker.record_failure()
+        assert breaker.state == CircuitBreaker.OPEN
+
+    def test_open_breaker_fails_fast(self, settings):
+        """Test process_content returns fallback immediately when circuit is open."""
+        import time
+        from ai_service.resilience import get_breaker
+        slow = self._llm("primary", delay=5)
+        service = self._service(settings, [slow])
+        breaker = get_breaker("primary")
+        breaker.open_seconds = 30
+        for _ in range(settings.AI_BREAKER_MIN_CALLS):
+            breaker.record_failure()
+        start = time.monotonic()
+        result = service.process_content("原文")
+        assert time.monotonic() - start < 0.5
+        assert result["polished_content"] == "原文"
+        slow.invoke.assert_not_called()
+
+    def test_failure_switches_to_backup(self, settings):
+        """Test a failing primary immediately falls over to the backup model."""
+        primary = self._llm("primary", error=Exception("502"))
+        backup = self._llm("backup")
+        service = self._service(settings, [primary, backup])
+        result = service.process_content("原文")
+        assert result["polished_content"] == "backup"
+
+    def test_slow_primary_is_hedged(self, settings):
+        """Test a backup call is started when the primary exceeds the hedge delay."""
+        import time
+        settings.AI_HEDGE_DELAY = 0.05
+        primary = self._llm("primary", delay=1)
+        backup = self._llm("backup")
+        service = self._service(settings, [primary, backup])
+        start = time.monotonic()
+        result = service.process_content("原文")
+        assert result["polished_content"] == "backup"
+        assert time.monotonic() - start < 0.5
+
+    def test_hedge_loser_outcome_is_recorded(self, settings):
+        """Test an abandoned half-open probe still releases its breaker when it finishes."""
+        import threading
+        from ai_service.resilience import CircuitBreaker, get_breaker
+        settings.AI_HEDGE_DELAY = 0.01
+        release, recorded = threading.Event(), threading.Event()
+        primary = self._llm("primary")
+        primary.invoke.side_effect = lambda messages, **kwargs: release.wait(5) and MagicMock(content="{}")
+        backup = self._llm("backup")
+        service = self._service(settings, [primary, backup])
+        breaker = get_breaker("primary")
+        breaker.open_seconds = 0
+        for _ in range(settings.AI_BREAKER_MIN_CALLS):
+            breaker.record_failure()
+        record_success = breaker.record_success
+        breaker.record_success = lambda: (record_success(), recorded.set())
+
+        assert service.process_content("原文")["polished_content"] == "backup"
+        # The primary was the half-open probe and lost the race
+        assert not breaker.allow_request()
+        release.set()
+        assert recorded.wait(5)
+        assert breaker.state == CircuitBreaker.CLOSED
+
+    def test_call_timeout_is_capped_by_budget(self, settings):
+        """Test the client timeout passed to each call does not exceed the budget."""
+        settings.AI_REQUEST_BUDGET = 3
+        primary = self._llm("primary")
+        service = self._service(settings, [primary])
+        service.process_content("原文")
+        assert primary.invoke.call_args.kwargs["timeout"] <= 3
+
+    def test_budget_exceeded_records_failure(self, settings):
+        """Test exceeding the time budget returns fallback and counts as failure."""
+        from ai_service.resilience import get_breaker
+        settings.AI_REQUEST_BUDGET = 0.1
+        primary = self._llm("primary", delay=0.5)
+        service = self._service(settings, [primary])
+        result = service.process_content("原文")
+        assert result["suggested_tags"] == ["日常", "分享"]
+        assert get_breaker("primary").stats()["failures"] == 1
@@ -1,6 +1,9 @@
 """
 Tests for Celery tasks - covers all branches.
 """
+import shutil
+import subprocess
+
 import pytest
 from unittest.mock import patch, MagicMock
 
@@ -43,3 +46,166 @@ class TestTranscodeVideoTask:
         moment_video.refresh_from_db()
         assert moment_video.video_status == Moment.VideoStatus.READY
 
+
+
+class TestTranscodingHelpers:
+    """Tests for ffmpeg pipeline planning and playlist merging."""
+
+    def test_plan_chunks_aligned_to_segments(self, settings):
+        """Test chunk length is rounded up to a multiple of the segment length."""
+        from moments.transcoding import plan_chunks
+        settings.VIDEO_HLS_SEGMENT_SECONDS = 6
+        settings.VIDEO_TRANSCODE_CHUNK_SECONDS = 50
+        assert plan_chunks(130) == [(0.0, 54), (54.0, 54), (108.0, 22)]
+
+    def test_select_renditions_no_upscale(self):
+        """Test renditions above the source height are skipped."""
+        from moments.transcoding import select_renditions
+        assert [r["name"] for r in select_renditions(720)] == ["360p", "720p"]
+        assert [r["name"] for r in select_renditions(1080)] == ["360p", "720p", "1080p"]
+        assert [r["name"] for r in select_renditions(240)] == ["360p"]
+
+    def test_write_playlists_merges_chunks(self, tmp_path):
+        """Test chunk playlists are merged into a single VOD playlist per rendition."""
+        from moments.transcoding import RENDITIONS, chunk_playlist_name, write_playlists
+        rendition_dir = tmp_path / "360p"
+        rendition_dir.mkdir()
+        for index in range(2):
+            (rendition_dir / chunk_playlist_name(index)).write_text(
+                "#EXTM3U\n#EXT-X-TARGETDURATION:6\n"
+                f"#EXTINF:6.000000,\nc{index:04d}_000.ts\n"
+                f"#EXTINF:4.500000,\nc{index:04d}_001.ts\n#EXT-X-ENDLIST\n"
+            )
+        master = write_playlists(tmp_path, RENDITIONS[:1], 2, 640, 480)
+        index = (rendition_dir / "index.m3u8").read_text()
+        assert index.count("#EXTINF") == 4
+        assert index.count("#EXT-X-DISCONTINUITY") == 1
+        assert index.rstrip().endswith("#EXT-X-ENDLIST")
+        assert not (rendition_dir / chunk_playlist_name(0)).exists()
+        assert "RESOLUTION=480x360" in master.read_text()
+
+
+@pytest.mark.django_db
+class TestTranscodePipeline:
+    """Tests for the chunked transcode task chain."""
+
+    def test_probe_failure_marks_failed(self, moment_video_processing, settings, tmp_path):
+        """Test unreadable source marks the moment FAILED."""
+        from django.core.files.base import ContentFile
+        from moments.models import Moment
+        from moments.tasks import transcode_video
+        from moments.transcoding import TranscodeError
+        settings.MEDIA_ROOT = tmp_path
+        moment_video_processing.video_file.save("bad.mp4", ContentFile(b"not a video"))
+        with patch("moments.transcoding.ffmpeg_available", return_value=True), \
+                patch("moments.transcoding.probe", side_effect=TranscodeError("bad")):
+            transcode_video(moment_video_processing.id)
+        moment_video_processing.refresh_from_db()
+        assert moment_video_processing.video_status == Moment.VideoStatus.FAILED
+
+    def test_chunks_are_dispatched_one_by_one(self, moment_video_processing):
+        """Test each chunk task updates progress and enqueues the next step."""
+        from moments.tasks import transcode_video_chunk
+        job = {
+            "source": "src.mp4", "out_dir": "/tmp/out", "renditions": ["360p"],
+            "chunks": [[0, 6], [6, 6], [12, 3]], "has_audio": False,
+            "duration": 15, "width": 640, "height": 480,
+        }
+        with patch("moments.transcoding.transcode_chunk") as mock_chunk, \
+                patch("moments.tasks.transcode_video_chunk.delay") as mock_next, \
+                patch("moments.tasks.finalize_video.delay") as mock_finalize:
+            transcode_video_chunk(moment_video_processing.id, 0, job)
+            mock_next.assert_called_once_with(moment_video_processing.id, 1, job)
+            moment_video_processing.refresh_from_db()
+            assert moment_video_processing.video_progress == 30
+
+            transcode_video_chunk(moment_video_processing.id, 2, job)
+            mock_finalize.assert_called_once_with(moment_video_processing.id, job)
+        assert mock_chunk.call_count == 2
+
+    @pytest.mark.skipif(shutil.which("ffmpeg") is None, reason="ffmpeg not installed")
+    def test_transcode_sample_clip(self, moment_video_processing, settings, tmp_path):
+        """Test a generated sample clip is transcoded to HLS with a poster."""
+        from django.core.files import File
+        from moments.models import Moment
+        from moments.tasks import transcode_video
+        from moments_share.celery import app
+
+        settings.MEDIA_ROOT = tmp_path
+        settings.VIDEO_HLS_SEGMENT_SECONDS = 1
+        settings.VIDEO_TRANSCODE_CHUNK_SECONDS = 2
+        sample = tmp_path / "sample.mp4"
+        subprocess.run([
+            "ffmpeg", "-y", "-v", "error",
+            "-f", "lavfi", "-i", "testsrc=duration=3:size=320x240:rate=10",
+            "-f", "lavfi", "-i", "sine=duration=3",
+            "-c:v", "libx264", "-c:a", "aac", "-shortest", str(sample),
+        ], check=True)
+        with open(sample, "rb") as f:
+            moment_video_processing.video_file.save("sample.mp4", File(f))
+
+        app.conf.task_always_eager = True
+        try:
+            transcode_video(moment_video_processing.id)
+        finally:
+            app.conf.task_always_eager = False
+
+        moment_video_processing.refresh_from_db()
+        assert moment_video_processing.video_status == Moment.VideoStatus.READY
+        assert moment_video_processing.video_progress == 100
+        assert 2.5 < moment_video_processing.video_duration < 3.5
+        playlist = tmp_path / "hls" / str(moment_video_processing.id) / "360p" / "index.m3u8"
+        assert playlist.read_text().count("#EXTINF") >= 3
+        assert (tmp_path / moment_video_processing.video_poster.name).exists()
+
+
+@pytest.mark.django_db
+class TestCleanupStaleUploads:
+    """Tests for cleanup_stale_uploads task."""
+
+    def test_removes_only_stale_uploads(self, user, settings, tmp_path):
+        """Test expired unfinished uploads and their temp files are removed."""
+        from datetime import timedelta
+        from django.utils import timezone
+        from moments.models import VideoUpload
+        from moments.tasks import cleanup_stale_uploads
+        from moments.uploads import part_path
+
+        settings.MEDIA_ROOT = tmp_path
+        stale = VideoUpload.objects.create(user=user, filename="a.mp4", total_size=10, checksum="0" * 64)
+        fresh = VideoUpload.objects.create(user=user, filename="b.mp4", total_size=10, checksum="0" * 64)
+        VideoUpload.objects.filter(id=stale.id).update(updated_at=timezone.now() - timedelta(days=2))
+        part_path(stale).parent.mkdir(parents=True)
+        part_path(stale).write_bytes(b"12345")
+
+        assert cleanup_stale_uploads() == 1
+        assert not part_path(stale).exists()
+        assert list(VideoUpload.objects.values_list("id", flat=True)) == [fresh.id]
+
+
+@pytest.mark.django_db
+class TestTranscodeReuse:
+    """Tests for reusing transcodes of identical videos."""
+
+    def test_duplicate_video_skips_transcoding(self, user, moment_video_processing):
+        """Test a video whose file matches a READY moment reuses its playlist."""
+        from moments.models import Moment
+        from moments.tasks import transcode_video
+        moment_video_processing.video_file = "videos/ab/abcdef.mp4"
+        moment_video_processing.save()
+        Moment.objects.create(
+            author=user,
+            type=Moment.MomentType.VIDEO,
+            video_file="videos/ab/abcdef.mp4",
+            video_status=Moment.VideoStatus.READY,
+            video_duration=12.5,
+            video_playlist="hls/1/master.m3u8",
+            video_poster="hls/1/poster.jpg",
+        )
+        with patch("moments.tasks.transcoding.probe") as mock_probe:
+            transcode_video(moment_video_processing.id)
+        mock_probe.assert_not_called()
+        moment_video_processing.refresh_from_db()
+        assert moment_video_processing.video_status == Moment.VideoStatus.READY
+        assert moment_video_processing.video_playlist.name == "hls/1/master.m3u8"
+        assert moment_video_processing.video_duration == 12.5
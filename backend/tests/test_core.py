@@ -84,3 +84,391 @@ class TestSensitiveWords:
         assert contains_sensitive_word("违禁内容") is True
         assert contains_sensitive_word("正常") is False
 
+
+
+@pytest.mark.django_db
+class TestContentAddressedStorage:
+    """Tests for content-addressed media storage."""
+
+    def test_identical_content_stored_once(self, settings, tmp_path):
+        """Test the same bytes map to one file with a reference count."""
+        from django.core.files.base import ContentFile
+        from core.models import MediaBlob
+        from core.storage import content_storage
+        settings.MEDIA_ROOT = tmp_path
+        first = content_storage.save("images/a.jpg", ContentFile(b"same bytes"))
+        second = content_storage.save("images/b.JPG", ContentFile(b"same bytes"))
+        other = content_storage.save("images/c.jpg", ContentFile(b"other bytes"))
+        assert first == second != other
+        assert MediaBlob.objects.get(path=first).ref_count == 2
+        assert len(list((tmp_path / "images").rglob("*.jpg"))) == 2
+
+    def test_delete_only_removes_last_reference(self, settings, tmp_path):
+        """Test the file survives until its last reference is deleted."""
+        from django.core.files.base import ContentFile
+        from core.models import MediaBlob
+        from core.storage import content_storage
+        settings.MEDIA_ROOT = tmp_path
+        name = content_storage.save("avatars/x.png", ContentFile(b"avatar"))
+        content_storage.save("avatars/y.png", ContentFile(b"avatar"))
+        content_storage.delete(name)
+        assert content_storage.exists(name)
+        content_storage.delete(name)
+        assert not content_storage.exists(name)
+        assert not MediaBlob.objects.exists()
+
+    def test_release_ignores_untracked_files(self, settings, tmp_path):
+        """Test releasing a file not saved by the storage leaves it alone."""
+        from core.storage import content_storage
+        settings.MEDIA_ROOT = tmp_path
+        (tmp_path / "default_avatar.png").write_bytes(b"default")
+        content_storage.release("default_avatar.png")
+        assert (tmp_path / "default_avatar.png").exists()
+
+    def test_deleting_image_releases_reference(self, settings, tmp_path, moment_image, django_capture_on_commit_callbacks):
+        """Test deleting an Image row drops its file reference."""
+        from django.core.files.base import ContentFile
+        from core.models import MediaBlob
+        from moments.models import Image
+        settings.MEDIA_ROOT = tmp_path
+        image = Image(moment=moment_image, order=1)
+        image.image_file.save("pic.jpg", ContentFile(b"jpeg bytes"))
+        with django_capture_on_commit_callbacks(execute=True):
+            image.delete()
+        assert not MediaBlob.objects.exists()
+
+    def test_register_restores_file_deleted_after_write(self, settings, tmp_path):
+        """Test a file deleted between write and register is put back on register."""
+        from django.core.files.base import ContentFile
+        from core.models import MediaBlob
+        from core.storage import content_storage
+        settings.MEDIA_ROOT = tmp_path
+        name = content_storage.save("images/a.jpg", ContentFile(b"shared"))
+        blob = content_storage.write("images/b.jpg", ContentFile(b"shared"))
+        content_storage.delete(name)
+        content_storage.register(blob)
+        assert content_storage.exists(blob.name)
+        assert MediaBlob.objects.get(path=blob.name).ref_count == 1
+
+    def test_discard_keeps_files_referenced_elsewhere(self, settings, tmp_path):
+        """Test discarding a registered-then-rolled-back blob keeps files others reference."""
+        from django.core.files.base import ContentFile
+        from django.db import transaction
+        from core.storage import content_storage
+        settings.MEDIA_ROOT = tmp_path
+        kept = content_storage.save("images/a.jpg", ContentFile(b"shared"))
+        blobs = [
+            content_storage.write("images/b.jpg", ContentFile(b"shared")),
+            content_storage.write("images/c.jpg", ContentFile(b"fresh")),
+        ]
+        with pytest.raises(RuntimeError):
+            with transaction.atomic():
+                content_storage.register(*blobs)
+                raise RuntimeError
+        content_storage.discard(*blobs)
+        assert content_storage.exists(kept)
+        assert not content_storage.exists(blobs[1].name)
+        assert not list((tmp_path / ".incoming").iterdir())
+
+
+class TestCacheLayer:
+    """Tests for cache helpers."""
+
+    def test_concurrent_misses_compute_once(self):
+        """Test request coalescing runs the loader once for concurrent misses."""
+        import threading
+        import time
+        from core.cache import get_or_compute
+        calls = []
+
+        def compute():
+            calls.append(1)
+            time.sleep(0.2)
+            return {"value": 42}
+
+        results = []
+        threads = [
+            threading.Thread(target=lambda: results.append(get_or_compute("ms:test:coalesce", 60, compute)))
+            for _ in range(5)
+        ]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        assert len(calls) == 1
+        assert results == [{"value": 42}] * 5
+
+    def test_cache_errors_fall_back_to_compute(self):
+        """Test a broken cache backend does not break the endpoint."""
+        from unittest.mock import patch
+        from core.cache import get_or_compute
+        with patch("core.cache.cache.get", side_effect=ConnectionError("redis down")):
+            assert get_or_compute("ms:test:down", 60, lambda: "fresh") == "fresh"
+
+    def test_expired_lock_of_another_owner_is_kept(self, settings):
+        """Test a slow owner does not delete a lock another request took after it expired."""
+        from django.core.cache import cache
+        from core.cache import get_or_compute
+
+        def slow_compute():
+            # 锁已过期并被其他请求重新获取
+            cache.set("ms:test:slow:lock", "other-owner")
+            return "fresh"
+
+        assert get_or_compute("ms:test:slow", 60, slow_compute) == "fresh"
+        assert cache.get("ms:test:slow:lock") == "other-owner"
+
+    def test_cache_write_errors_fall_back_to_compute(self):
+        """Test failures after the lock is taken still return the computed value."""
+        from unittest.mock import patch
+        from core.cache import get_or_compute
+        with patch("core.cache.cache.set", side_effect=ConnectionError("redis down")), \
+                patch("core.cache.cache.delete_many", side_effect=ConnectionError("redis down")):
+            assert get_or_compute("ms:test:write-down", 60, lambda: "fresh") == "fresh"
+
+    def test_waiter_cache_errors_fall_back_to_compute(self, settings):
+        """Test a waiter whose cache reads fail computes the value itself."""
+        from unittest.mock import patch
+        from core.cache import get_or_compute
+        settings.CACHE_COALESCE_WAIT = 5
+        reads = iter([None, ConnectionError("redis down")])
+
+        def get(key, default=None):
+            error = next(reads)
+            if error:
+                raise error
+            return default
+
+        with patch("core.cache.cache.add", return_value=False), \
+                patch("core.cache.cache.get", side_effect=get), \
+                patch("core.cache.time.sleep"):
+            assert get_or_compute("ms:test:wait-down", 60, lambda: "fresh") == "fresh"
+
+
+@pytest.mark.django_db
+class TestCachedEndpoints:
+    """Tests for cached read endpoints and their invalidation."""
+
+    def test_avg_score_invalidated_on_rate(self, auth_client, moment_image):
+        """Test rating a moment refreshes the cached average."""
+        url = f"/api/v1/interactions/avg_score/?moment_id={moment_image.id}"
+        assert auth_client.get(url).data["avg_score"] == 0.0
+        auth_client.post("/api/v1/interactions/rate/", {"moment": moment_image.id, "score": 4}, format="json")
+        assert auth_client.get(url).data["avg_score"] == 4.0
+
+    def test_moment_detail_cached_and_invalidated_on_like(self, auth_client, moment_image, django_assert_max_num_queries):
+        """Test detail is served from cache and likes refresh it."""
+        url = f"/api/v1/moments/{moment_image.id}/"
+        first = auth_client.get(url)
+        assert first.data["likes_count"] == 0
+        # 命中缓存时只剩认证用户和点赞状态两次查询
+        with django_assert_max_num_queries(2):
+            auth_client.get(url)
+        auth_client.post(f"/api/v1/moments/{moment_image.id}/like/")
+        second = auth_client.get(url)
+        assert second.data["likes_count"] == 1
+        assert second.data["is_liked"] is True
+
+    def test_deleted_moment_not_served_from_stale_cache(self, auth_client, moment_image):
+        """Test soft-deleting a moment invalidates its cached detail."""
+        url = f"/api/v1/moments/{moment_image.id}/"
+        assert auth_client.get(url).status_code == status.HTTP_200_OK
+        moment_image.is_deleted = True
+        moment_image.save()
+        assert auth_client.get(url).status_code == status.HTTP_403_FORBIDDEN
+
+    def test_hot_search_invalidated_on_new_tags(self, auth_client, moment_image):
+        """Test attaching tags refreshes the hot tag list."""
+        from moments.tagging import attach_tags
+        url = "/api/v1/moments/search/hot/"
+        assert auth_client.get(url).data["tags"] == []
+        attach_tags({moment_image.id: ["旅行"]})
+        assert [t["name"] for t in auth_client.get(url).data["tags"]] == ["旅行"]
+
+    def test_user_profile_invalidated_on_update(self, auth_client, auth_client2, user):
+        """Test profile edits show up immediately for other viewers."""
+        url = f"/api/v1/users/{user.id}/"
+        assert auth_client2.get(url).data["nickname"] == user.nickname
+        auth_client.patch("/api/v1/users/me/", {"nickname": "新昵称"}, format="json")
+        response = auth_client2.get(url)
+        assert response.data["nickname"] == "新昵称"
+        assert "friendship_status" in response.data
+
+    def test_moment_detail_invalidated_on_author_update(self, auth_client, user, moment_image):
+        """Test a cached moment detail shows the author's new nickname."""
+        url = f"/api/v1/moments/{moment_image.id}/"
+        assert auth_client.get(url).data["author"]["nickname"] == user.nickname
+        auth_client.patch("/api/v1/users/me/", {"nickname": "新昵称"}, format="json")
+        assert auth_client.get(url).data["author"]["nickname"] == "新昵称"
+
+
+@pytest.mark.django_db
+class TestProfilingMiddleware:
+    """Tests for sampled per-request profiling and the metrics endpoint."""
+
+    def test_unsampled_requests_untouched(self, auth_client, settings):
+        """Test requests outside the sample get no timing header."""
+        settings.PROFILING_SAMPLE_RATE = 0
+        response = auth_client.get("/api/v1/users/me/")
+        assert "Server-Timing" not in response
+
+    def test_server_timing_and_metrics(self, auth_client, moment_image, settings):
+        """Test sampled requests report timings and are aggregated per route."""
+        from rest_framework.test import APIClient
+        settings.PROFILING_SAMPLE_RATE = 1
+        response = auth_client.get(f"/api/v1/moments/{moment_image.id}/")
+        timing = response["Server-Timing"]
+        assert "db;dur=" in timing and "serializer;dur=" in timing and "total;dur=" in timing
+        auth_client.get(f"/api/v1/moments/{moment_image.id}/")
+
+        settings.PROFILING_METRICS_TOKEN = "scrape-secret"
+        metrics = APIClient().get("/metrics/", HTTP_AUTHORIZATION="Bearer scrape-secret").content.decode()
+        label = 'method="GET",route="/api/v1/moments/<int:pk>/"'
+        assert f"moments_share_requests_total{{{label}}} 2" in metrics
+        prefix = f"moments_share_db_queries_total{{{label}}}"
+        queries = next(line for line in metrics.splitlines() if line.startswith(prefix))
+        assert int(queries.rsplit(" ", 1)[1]) > 0
+
+    def test_duplicate_queries_flagged_in_debug_mode(self, user, settings, caplog):
+        """Test the same SQL run repeatedly in one request is reported."""
+        from django.http import HttpResponse
+        from django.test import RequestFactory
+        from core.profiling import ProfilingMiddleware
+        from users.models import User
+        settings.PROFILING_SAMPLE_RATE = 1
+        settings.PROFILING_DEBUG = True
+
+        def view(request):
+            for _ in range(3):
+                User.objects.filter(id=user.id).first()
+            return HttpResponse("ok")
+
+        response = ProfilingMiddleware(view)(RequestFactory().get("/"))
+        assert response["X-Duplicate-Queries"] == "2"
+        assert "repeated 2 extra time(s)" in caplog.text
+
+    def test_metrics_token(self, api_client, settings):
+        """Test the metrics endpoint requires the configured bearer token."""
+        settings.PROFILING_METRICS_TOKEN = "scrape-secret"
+        assert api_client.get("/metrics/").status_code == 401
+        response = api_client.get("/metrics/", HTTP_AUTHORIZATION="Bearer scrape-secret")
+        assert response.status_code == 200
+        assert "# TYPE moments_share_requests_total counter" in response.content.decode()
+
+    def test_metrics_token_required_while_sampling(self, api_client, settings):
+        """Test the metrics endpoint refuses to serve without a token once sampling is on."""
+        settings.PROFILING_METRICS_TOKEN = ""
+        settings.PROFILING_SAMPLE_RATE = 0.1
+        assert api_client.get("/metrics/").status_code == 403
+        settings.PROFILING_SAMPLE_RATE = 0
+        assert api_client.get("/metrics/").status_code == 200
+
+    def test_concurrent_first_labels_all_kept(self):
+        """Test labels first seen at the same time are all registered."""
+        from concurrent.futures import ThreadPoolExecutor
+        from core.profiling import _labels, _record
+        labels = [f"GET|/route/{i}/" for i in range(20)]
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            list(pool.map(lambda label: _record(label, {"requests_total": 1}), labels))
+        assert _labels() == sorted(labels)
+
+    def test_metrics_survive_default_cache_churn(self):
+        """Test counters are kept apart from the default cache and are not culled with it."""
+        from django.core.cache import cache
+        from core.profiling import _labels, _record, render_metrics
+        _record("GET|/kept/", {"requests_total": 3})
+        for i in range(1000):
+            cache.set(f"churn:{i}", i)
+        cache.clear()
+        assert _labels() == ["GET|/kept/"]
+        assert 'moments_share_requests_total{method="GET",route="/kept/"} 3' in render_metrics()
+
+
+@pytest.mark.django_db
+class TestDataGenerator:
+    """Tests for the scalable synthetic data generator used by the benchmarks."""
+
+    def test_generate_and_clear(self):
+        """Test generated rows follow the configured ratios and are removed by clear()."""
+        from core import datagen
+        from interactions.models import Comment, Like, Message
+        from moments.models import Moment, TagUsage
+        counts = datagen.generate(20, seed=1)
+        assert datagen.bench_users().count() == counts["users"] == 20
+        assert Moment.objects.count() == counts["moments"]
+        assert Comment.objects.count() == counts["comments"]
+        assert Comment.objects.filter(parent__isnull=False).exists()
+        assert Message.objects.count() == counts["messages"]
+        assert 0 < Like.objects.count() <= counts["likes"]
+        assert TagUsage.objects.exists()
+        assert datagen.clear() == 20
+        assert not Moment.objects.exists()
+
+    def test_same_seed_same_data(self):
+        """Test the generator is deterministic for a given seed."""
+        from core import datagen
+        from moments.models import Moment
+        datagen.generate(10, seed=7)
+        first = list(Moment.objects.order_by("id").values_list("author__username", "content"))
+        datagen.clear()
+        datagen.generate(10, seed=7)
+        assert list(Moment.objects.order_by("id").values_list("author__username", "content")) == first
+
+    def test_seed_data_scale_mode(self, settings, tmp_path):
+        """Test seed_data --scale bulk-creates moments with shared placeholder media."""
+        from io import StringIO
+        from django.core.management import call_command
+        from django.db.models import Sum
+        from core import datagen
+        from core.models import MediaBlob
+        from moments.models import Image, Moment
+        settings.MEDIA_ROOT = tmp_path
+        call_command("seed_data", "--scale", "10", "--moments", "30", "--media-variants", "4", stdout=StringIO())
+        assert datagen.bench_users().count() == 10
+        assert Moment.objects.count() == 30
+        images = Image.objects.count()
+        assert 30 <= images <= 90
+        assert not datagen.bench_users().filter(avatar="default_avatar.png").exists()
+        # one blob per variant, one reference per Image row and per avatar
+        assert MediaBlob.objects.count() == 8
+        assert MediaBlob.objects.aggregate(total=Sum("ref_count"))["total"] == images + 10
+        assert len(list((tmp_path / "images").rglob("*.jpg"))) == 4
+
+
+class TestSeedMediaFetcher:
+    """Tests for the concurrent, cached media fetcher used by seed_data."""
+
+    def test_offline_uses_placeholders(self, tmp_path):
+        """Test offline mode renders images, skips videos and writes no cache."""
+        from core.management.commands.seed_data import MediaFetcher, MediaItem
+        fetcher = MediaFetcher(tmp_path, workers=2, offline=True)
+        media = fetcher.fetch_all([
+            MediaItem("https://example.com/800/600", "image", (80, 60)),
+            MediaItem("https://example.com/a.png", "avatar", (20, 20)),
+            MediaItem("https://example.com/v.mp4", "video"),
+        ])
+        assert media["https://example.com/800/600"][:2] == b"\xff\xd8"
+        assert media["https://example.com/a.png"][:4] == b"\x89PNG"
+        assert media["https://example.com/v.mp4"] is None
+        assert fetcher.stats == {"placeholder": 2, "failed": 1}
+        assert not list(tmp_path.iterdir())
+
+    def test_download_is_cached(self, tmp_path, monkeypatch):
+        """Test a downloaded file is served from the cache on the next run."""
+        from core.management.commands.seed_data import MediaFetcher, MediaItem
+        item = MediaItem("https://example.com/v.mp4", "video")
+        monkeypatch.setattr(MediaFetcher, "_download", lambda self, url, timeout: b"video bytes")
+        assert MediaFetcher(tmp_path).fetch(item) == (b"video bytes", "downloaded")
+        assert MediaFetcher(tmp_path, offline=True).fetch(item) == (b"video bytes", "cached")
+
+    def test_failed_download_falls_back(self, tmp_path, monkeypatch):
+        """Test a failed image download is replaced by a placeholder and not cached."""
+        from core.management.commands.seed_data import MediaFetcher, MediaItem
+
+        def fail(self, url, timeout):
+            raise OSError("network unreachable")
+
+        monkeypatch.setattr(MediaFetcher, "_download", fail)
+        content, source = MediaFetcher(tmp_path).fetch(MediaItem("https://example.com/1", "image", (40, 30)))
+        assert content and source == "placeholder"
+        assert not tmp_path.exists() or not list(tmp_path.iterdir())
@@ -2,8 +2,10 @@
 Tests for moments module - covers all branches.
 """
 import io
+from datetime import timedelta
 import pytest
 from unittest.mock import patch
+from django.utils import timezone
 from PIL import Image as PILImage
 from rest_framework import status
 
@@ -66,7 +68,7 @@ class TestMomentCreate:
         assert response.status_code == status.HTTP_400_BAD_REQUEST
 
     @patch("moments.serializers.transcode_video.delay")
-    def test_create_video_moment_success(self, mock_delay, auth_client, test_video):
+    def test_create_video_moment_success(self, mock_delay, auth_client, test_video, django_capture_on_commit_callbacks):
         """Test creating video moment successfully."""
         url = "/api/v1/moments/"
         data = {
@@ -74,7 +76,8 @@ class TestMomentCreate:
             "content": "测试视频动态",
             "video": test_video,
         }
-        response = auth_client.post(url, data, format="multipart")
+        with django_capture_on_commit_callbacks(execute=True):
+            response = auth_client.post(url, data, format="multipart")
         assert response.status_code == status.HTTP_201_CREATED
         assert response.data["type"] == "VIDEO"
         mock_delay.assert_called_once()
@@ -134,6 +137,15 @@ class TestMomentCreate:
         response = auth_client.post(url, data, format="json")
         assert response.status_code == status.HTTP_201_CREATED
 
+    def test_create_moment_keeps_hash_in_labels(self, auth_client):
+        """Test a leading "#" stays part of the label name, as before bulk tag resolution."""
+        from moments.models import Moment
+        data = {"type": "IMAGE", "content": "带井号的标签", "labels": ["#旅行", "旅行"]}
+        response = auth_client.post("/api/v1/moments/", data, format="json")
+        assert response.status_code == status.HTTP_201_CREATED
+        tags = Moment.objects.get(id=response.data["id"]).tags.values_list("name", flat=True)
+        assert sorted(tags) == ["#旅行", "旅行"]
+
     def test_create_moment_with_sensitive_labels(self, auth_client, settings):
         """Test creating moment with sensitive labels fails."""
         # 使用 DFA 词库中的实际敏感词（如"暴力"）
@@ -375,3 +387,684 @@ class TestMomentModels:
             order=1,
         )
         assert "Image" in str(img)
+
+
+@pytest.mark.django_db
+class TestTagging:
+    """Tests for bulk tag helpers."""
+
+    def test_normalize_tag_names(self):
+        """Test names are stripped, truncated and de-duplicated, keeping "#"."""
+        from moments.tagging import normalize_tag_names
+        assert normalize_tag_names([" #旅行 ", "旅行", " 旅行", "", "一二三四五六七八九十十一"]) == [
+            "#旅行", "旅行", "一二三四五六七八九十"
+        ]
+
+    def test_resolve_tags_creates_missing(self):
+        """Test existing tags are reused and missing ones created."""
+        from moments.models import Tag
+        from moments.tagging import resolve_tags
+        existing = Tag.objects.create(name="美食")
+        tags = resolve_tags(["美食", "旅行"])
+        assert tags["美食"].id == existing.id
+        assert Tag.objects.filter(name="旅行").exists()
+
+    def test_attach_tags_ignores_existing_links(self, moment_image):
+        """Test attaching tags twice does not fail or duplicate."""
+        from moments.tagging import attach_tags
+        attach_tags({moment_image.id: ["美食", "日常"]})
+        attach_tags({moment_image.id: ["美食"]})
+        assert moment_image.tags.count() == 2
+
+
+@pytest.mark.django_db
+class TestHotTagLeaderboard:
+    """Tests for the incrementally maintained hot tag counts."""
+
+    def _post(self, user, created_at, tags):
+        from moments.models import Moment
+        from moments.tagging import attach_tags
+        moment = Moment.objects.create(author=user, content="x", type=Moment.MomentType.IMAGE)
+        Moment.objects.filter(id=moment.id).update(created_at=created_at)
+        attach_tags({moment.id: tags})
+        moment.refresh_from_db()
+        return moment
+
+    def test_window_filters_old_usage(self, auth_client, user):
+        """Test tags used outside the window are not counted."""
+        now = timezone.now()
+        self._post(user, now - timedelta(hours=2), ["旅行", "美食"])
+        self._post(user, now - timedelta(hours=3), ["旅行"])
+        self._post(user, now - timedelta(days=10), ["摄影"])
+        url = "/api/v1/moments/search/hot/"
+
+        tags = auth_client.get(url, {"window": "24h"}).data["tags"]
+        assert [(t["name"], t["count"]) for t in tags] == [("旅行", 2), ("美食", 1)]
+        names = [t["name"] for t in auth_client.get(url, {"window": "30d"}).data["tags"]]
+        assert "摄影" in names
+
+    def test_soft_delete_and_restore_adjust_counts(self, user):
+        """Test soft-deleting a moment removes its tags from the ranking."""
+        from moments.leaderboard import top_tags
+        moment = self._post(user, timezone.now(), ["旅行"])
+        assert top_tags("24h")[0]["count"] == 1
+
+        moment.is_deleted = True
+        moment.save()
+        assert top_tags("24h") == []
+        moment.is_deleted = False
+        moment.save()
+        assert top_tags("24h")[0]["count"] == 1
+
+        moment.delete()
+        assert top_tags("all") == []
+
+    def test_compact_merges_hourly_buckets(self, user):
+        """Test old hourly buckets are merged into one day bucket."""
+        from moments.leaderboard import compact_buckets, rebuild, top_tags
+        from moments.models import TagUsage
+        day = (timezone.now() - timedelta(days=40)).replace(hour=10)
+        self._post(user, day, ["旅行"])
+        self._post(user, day + timedelta(hours=3), ["旅行"])
+        assert TagUsage.objects.count() == 2
+
+        assert compact_buckets(timedelta(days=30)) == 2
+        assert TagUsage.objects.count() == 1
+        assert top_tags("all") == [{"id": top_tags("all")[0]["id"], "name": "旅行", "count": 2}]
+
+        rebuild()
+        assert sum(TagUsage.objects.values_list("count", flat=True)) == 2
+
+
+@pytest.mark.django_db
+class TestSearchLog:
+    """Tests for the buffered search log and trending keywords."""
+
+    def _flush(self, search_log_dispatch):
+        from moments import search_log
+        search_log.flush()
+        for call in search_log_dispatch.call_args_list:
+            search_log.save_entries(call.args[0])
+        search_log_dispatch.reset_mock()
+
+    def test_searches_buffered_and_flushed_in_bulk(self, auth_client, settings, search_log_dispatch):
+        """Test searches are only handed to Celery once the buffer is full."""
+        from moments import search_log
+        from moments.models import SearchQuery
+        settings.SEARCH_LOG_BUFFER_SIZE = 3
+        auth_client.get("/api/v1/moments/search/", {"keyword": " 旅行 "})
+        auth_client.get("/api/v1/moments/search/", {"keyword": "旅行", "page": "2"})
+        auth_client.get("/api/v1/moments/search/suggestions/", {"q": "Lv"})
+        assert not search_log_dispatch.called
+
+        auth_client.get("/api/v1/moments/search/", {"keyword": "美食"})
+        search_log._queue.join()
+        batch = search_log_dispatch.call_args.args[0]
+        assert [(e["query"], e["source"]) for e in batch] == [
+            ("旅行", "SEARCH"), ("lv", "SUGGEST"), ("美食", "SEARCH")
+        ]
+        assert SearchQuery.objects.count() == 0
+        self._flush(search_log_dispatch)
+        assert SearchQuery.objects.count() == 3
+
+    def test_slow_dispatch_drops_oldest_batches(self, settings, search_log_dispatch, caplog):
+        """Test batches waiting on a slow dispatch are bounded and the oldest are dropped."""
+        import threading
+        from moments import search_log
+        settings.SEARCH_LOG_BUFFER_SIZE = 1
+        release = threading.Event()
+        search_log_dispatch.side_effect = lambda batch: release.wait(5)
+        queries = [f"q{i}" for i in range(search_log.MAX_PENDING_BATCHES + 5)]
+        for query in queries:
+            search_log.record(query, "SEARCH")
+        assert search_log._queue.qsize() <= search_log.MAX_PENDING_BATCHES
+        assert "dispatch queue full" in caplog.text
+        release.set()
+        search_log._queue.join()
+        sent = [call.args[0][0]["query"] for call in search_log_dispatch.call_args_list]
+        assert sent[-search_log.MAX_PENDING_BATCHES:] == queries[-search_log.MAX_PENDING_BATCHES:]
+
+    def test_broker_outage_keeps_batch_for_retry(self, auth_client, settings, search_log_dispatch):
+        """Test a failed dispatch neither fails the request nor loses the batch."""
+        from moments import search_log
+        settings.SEARCH_LOG_BUFFER_SIZE = 1
+        search_log_dispatch.side_effect = ConnectionError("broker down")
+        response = auth_client.get("/api/v1/moments/search/", {"keyword": "旅行"})
+        assert response.status_code == status.HTTP_200_OK
+        search_log._queue.join()
+        auth_client.get("/api/v1/moments/search/", {"keyword": "美食"})
+        assert search_log_dispatch.call_count == 1
+
+        search_log_dispatch.side_effect = None
+        search_log.flush()
+        assert [e["query"] for e in search_log_dispatch.call_args.args[0]] == ["旅行", "美食"]
+
+    def test_trending_keywords_in_hot_search(self, auth_client, search_log_dispatch):
+        """Test the most searched keywords are returned by hot search."""
+        from moments import search_log
+        for keyword in ["旅行", "旅行", "美食"]:
+            auth_client.get("/api/v1/moments/search/", {"keyword": keyword})
+        self._flush(search_log_dispatch)
+        search_log.aggregate()
+        keywords = auth_client.get("/api/v1/moments/search/hot/").data["keywords"]
+        assert keywords == [{"keyword": "旅行", "count": 2}, {"keyword": "美食", "count": 1}]
+
+    def test_top_suggestion_queries_precomputed(self, auth_client, moment_image, search_log_dispatch, settings):
+        """Test suggestions for frequent queries are served from the precomputed cache."""
+        from django.core.cache import cache
+        from core.cache import search_suggestions_key
+        from moments import search_log
+        settings.SEARCH_SUGGEST_CONTENT = True
+        url = "/api/v1/moments/search/suggestions/"
+        live = auth_client.get(url, {"q": "测试"}).data
+        self._flush(search_log_dispatch)
+        search_log.aggregate()
+        assert cache.get(search_suggestions_key("测试")) == live
+
+        moment_image.content = "改过的内容"
+        moment_image.save()
+        assert auth_client.get(url, {"q": "测试"}).data == live
+        assert auth_client.get(url, {"q": "测试", "limit": 5}).data["suggestions"] == []
+
+    def test_old_logs_pruned(self, settings):
+        """Test aggregation removes logs past the retention period."""
+        from moments import search_log
+        from moments.models import SearchQuery
+        SearchQuery.objects.create(query="旧", source="SEARCH", created_at=timezone.now() - timedelta(days=40))
+        SearchQuery.objects.create(query="新", source="SEARCH")
+        assert search_log.aggregate()["pruned"] == 1
+        assert list(SearchQuery.objects.values_list("query", flat=True)) == ["新"]
+
+
+class TestPinyinText:
+    """Tests for pinyin with a character offset map."""
+
+    def test_pinyin_and_initials_hits_map_to_original_range(self):
+        """Test full pinyin, initials and partial syllable hits map back to the right characters."""
+        from moments.utils import PinyinText
+        text = PinyinText("今天天气真好")
+        assert text.find("tianqi") == (2, 4)
+        assert text.find("TQ") == (2, 4)
+        assert text.find("ianq") == (2, 4)
+        assert text.find("天汽") == (2, 4)
+        assert text.find("真") == (4, 5)
+        assert text.find("xyz") is None
+
+    def test_direct_hit_skips_pinyin_conversion(self):
+        """Test a plain substring hit does not convert the text to pinyin."""
+        from moments.utils import PinyinText
+        with patch("moments.utils.pinyin_syllables", side_effect=AssertionError("converted")):
+            assert PinyinText("今天天气真好").find("天气") == (2, 4)
+
+    def test_mixed_text_and_polyphones(self):
+        """Test non-Chinese characters keep their own offsets and polyphones follow the phrase."""
+        from moments.utils import PinyinText
+        text = PinyinText("Go 去银行")
+        assert text.find("yinhang") == (4, 6)
+        assert text.find("go") == (0, 2)
+
+    def test_snippet_highlight_offsets(self):
+        """Test the highlight range points at the match inside the snippet."""
+        from moments.utils import PinyinText
+        text = PinyinText("a" * 40 + "银行" + "b" * 40)
+        snippet = text.snippet(text.find("yh"))
+        start, end = snippet["highlight"]
+        assert snippet["text"].startswith("...") and snippet["text"].endswith("...")
+        assert snippet["text"][start:end] == "银行"
+
+
+class TestAutocompleteIndex:
+    """Tests for the prefix trie behind search suggestions."""
+
+    def _index(self, **scores):
+        from moments.autocomplete import AutocompleteIndex, Entry
+        index = AutocompleteIndex(top_k=3)
+        index.build({("tag", name): Entry(score, i) for i, (name, score) in enumerate(scores.items())})
+        return index
+
+    def _names(self, index, query):
+        return [term[1] for term, _ in index.search(query)]
+
+    def test_matches_text_pinyin_initials_and_inner_prefix(self):
+        """Test terms are found by original text, full pinyin, initials and mid-word prefixes."""
+        index = self._index(天气=1, 旅行=1)
+        assert self._names(index, "天") == ["天气"]
+        assert self._names(index, "tianq") == ["天气"]
+        assert self._names(index, "TQ") == ["天气"]
+        assert self._names(index, "qi") == ["天气"]
+        assert self._names(index, "lvx") == ["旅行"]
+        assert self._names(index, "xyz") == []
+
+    def test_nodes_keep_top_k_by_score(self):
+        """Test each prefix returns only the highest scored terms."""
+        index = self._index(美食=5, 美景=9, 美甲=1, 美妆=7)
+        assert self._names(index, "mei") == ["美景", "美妆", "美食"]
+
+    def test_incremental_updates_refresh_paths(self):
+        """Test score changes and removals are reflected without a rebuild."""
+        from moments.autocomplete import Entry
+        index = self._index(美食=5, 美景=9, 美甲=1, 美妆=7)
+        index.upsert(("tag", "美景"), 0, 1)
+        assert self._names(index, "m") == ["美妆", "美食", "美甲"]
+        index.remove(("tag", "美妆"))
+        assert self._names(index, "mz") == []
+        assert self._names(index, "m") == ["美食", "美甲", "美景"]
+        changed = index.sync({("tag", "美食"): Entry(5, 0), ("keyword", "美食探店"): Entry(8, None)})
+        assert changed == 3
+        assert self._names(index, "美") == ["美食探店", "美食"]
+
+    def test_lookup_reads_precomputed_top_terms(self):
+        """Test lookups walk the prefix only, without ranking or re-deriving keys."""
+        from moments.autocomplete import AutocompleteIndex, Entry
+        index = AutocompleteIndex()
+        index.build({("keyword", f"话题{i}号"): Entry(i, None) for i in range(50)})
+        with patch.object(index, "_rank", side_effect=AssertionError("ranked on lookup")), \
+                patch("moments.autocomplete.term_keys", side_effect=AssertionError("keys derived on lookup")):
+            assert [term[1] for term, _ in index.search("ht4", limit=2)] == ["话题49号", "话题48号"]
+
+    def test_search_skips_terms_removed_by_concurrent_sync(self):
+        """Test a term still listed on a node but already dropped from entries is skipped."""
+        index = self._index(美食=5, 美景=9)
+        del index.entries[("tag", "美景")]
+        assert self._names(index, "mei") == ["美食"]
+
+
+@pytest.mark.django_db
+class TestAutocompleteSuggestions:
+    """Tests for search suggestions served from the autocomplete index."""
+
+    def test_tags_and_popular_keywords_suggested(self, auth_client, moment_image):
+        """Test tags and frequent searches are suggested by pinyin prefix."""
+        from moments.models import SearchQuery
+        from moments.tagging import attach_tags
+        attach_tags({moment_image.id: ["旅行"]})
+        SearchQuery.objects.bulk_create([SearchQuery(query="旅行攻略", source="SEARCH")] * 2)
+        response = auth_client.get("/api/v1/moments/search/suggestions/", {"q": "lv"})
+        assert response.data["tags"][0]["name"] == "旅行"
+        assert response.data["suggestions"] == [{"text": "旅行攻略", "keyword": "旅行攻略", "moment_id": None}]
+
+    def test_new_tags_visible_after_attach(self, auth_client, moment_image):
+        """Test tags created in this process show up on the next keystroke."""
+        from moments.tagging import attach_tags
+        url = "/api/v1/moments/search/suggestions/"
+        assert auth_client.get(url, {"q": "ms"}).data["tags"] == []
+        attach_tags({moment_image.id: ["美食"]})
+        assert [t["name"] for t in auth_client.get(url, {"q": "ms"}).data["tags"]] == ["美食"]
+
+    def test_content_not_scanned_by_default(self, auth_client, moment_image):
+        """Test suggestions come from the index alone unless content matching is enabled."""
+        with patch("moments.suggestions.content_suggestions") as content, \
+                patch("moments.suggestions.tag_suggestions") as tags:
+            response = auth_client.get("/api/v1/moments/search/suggestions/", {"q": "测试"})
+        assert response.data == {"suggestions": [], "tags": []}
+        content.assert_not_called()
+        tags.assert_not_called()
+
+    def test_index_hits_merged_with_content(self, auth_client, moment_image, settings):
+        """Test tag hits from the index do not hide matching moment snippets."""
+        from moments.tagging import attach_tags
+        settings.SEARCH_SUGGEST_CONTENT = True
+        attach_tags({moment_image.id: ["测试标签"]})
+        response = auth_client.get("/api/v1/moments/search/suggestions/", {"q": "测试"})
+        assert [t["name"] for t in response.data["tags"]] == ["测试标签"]
+        assert response.data["suggestions"][0]["moment_id"] == moment_image.id
+
+    def test_index_miss_falls_back_to_content(self, auth_client, moment_image, settings):
+        """Test queries outside the index still return moment snippets when content matching is enabled."""
+        settings.SEARCH_SUGGEST_CONTENT = True
+        response = auth_client.get("/api/v1/moments/search/suggestions/", {"q": "测试"})
+        assert response.data["suggestions"][0]["moment_id"] == moment_image.id
+
+    def test_pinyin_snippet_centered_on_match(self, auth_client, user, settings):
+        """Test a pinyin-only hit yields a snippet and highlight at the matched characters."""
+        from moments.models import Moment
+        settings.SEARCH_SUGGEST_CONTENT = True
+        content = "开头" * 30 + "天气真好" + "结尾" * 30
+        moment = Moment.objects.create(author=user, content=content, type=Moment.MomentType.IMAGE)
+        response = auth_client.get("/api/v1/moments/search/suggestions/", {"q": "tianqi"})
+        item = response.data["suggestions"][0]
+        assert item["moment_id"] == moment.id
+        start, end = item["highlight"]
+        assert item["text"][start:end] == "天气"
+
+    def test_search_results_include_highlight(self, auth_client, user):
+        """Test search results carry the matched range in the original content."""
+        from moments.models import Moment
+        Moment.objects.create(author=user, content="今天天气真好", type=Moment.MomentType.IMAGE)
+        results = auth_client.get("/api/v1/moments/search/", {"keyword": "tq"}).data["results"]
+        assert results[0]["highlight"] == [2, 4]
+        results = auth_client.get("/api/v1/moments/search/", {"keyword": "真好"}).data["results"]
+        assert results[0]["highlight"] == [4, 6]
+
+
+@pytest.mark.django_db
+class TestImageDerivatives:
+    """Tests for responsive image derivatives."""
+
+    def _create_image(self, moment, size=(2000, 1000)):
+        from django.core.files.uploadedfile import SimpleUploadedFile
+        from moments.models import Image
+        buf = io.BytesIO()
+        PILImage.new("RGB", size, color="blue").save(buf, format="JPEG")
+        upload = SimpleUploadedFile("big.jpg", buf.getvalue(), content_type="image/jpeg")
+        return Image.objects.create(moment=moment, image_file=upload, order=1)
+
+    def test_generate_all_variants(self, moment_image, settings, tmp_path):
+        """Test every variant is generated in both formats without upscaling."""
+        from moments.derivatives import generate_derivatives
+        settings.MEDIA_ROOT = tmp_path
+        image = self._create_image(moment_image, size=(1000, 500))
+        generate_derivatives(image)
+        derivatives = {(d.variant, d.format): d for d in image.derivatives.all()}
+        assert len(derivatives) == 6
+        assert derivatives[("thumbnail", "WEBP")].width == 320
+        assert derivatives[("medium", "JPEG")].height == 360
+        # 原图比 LARGE 档小，不放大
+        assert derivatives[("large", "WEBP")].width == 1000
+        assert all(d.size_bytes > 0 for d in derivatives.values())
+
+    def test_regenerate_replaces_rows(self, moment_image, settings, tmp_path):
+        """Test regenerating does not duplicate derivative rows."""
+        from moments.derivatives import generate_derivatives
+        settings.MEDIA_ROOT = tmp_path
+        image = self._create_image(moment_image)
+        generate_derivatives(image)
+        generate_derivatives(image)
+        assert image.derivatives.count() == 6
+
+    def test_serializer_exposes_srcset(self, auth_client, moment_image, settings, tmp_path):
+        """Test moment detail returns variants and srcset."""
+        from moments.tasks import generate_image_derivatives
+        settings.MEDIA_ROOT = tmp_path
+        self._create_image(moment_image)
+        assert generate_image_derivatives(moment_image.id) == 1
+        response = auth_client.get(f"/api/v1/moments/{moment_image.id}/")
+        assert response.status_code == status.HTTP_200_OK
+        image = response.data["images"][0]
+        assert len(image["variants"]) == 6
+        assert image["srcset"]["WEBP"].count("w,") == 2
+        assert image["srcset"]["JPEG"].startswith("http")
+
+    def test_create_schedules_generation(self, auth_client, test_image, django_capture_on_commit_callbacks):
+        """Test creating an image moment schedules derivative generation after commit."""
+        with patch("moments.serializers.generate_image_derivatives.delay") as mock_delay, \
+                django_capture_on_commit_callbacks(execute=True):
+            response = auth_client.post(
+                "/api/v1/moments/",
+                {"type": "IMAGE", "content": "多尺寸图片", "images": [test_image]},
+                format="multipart",
+            )
+        assert response.status_code == status.HTTP_201_CREATED
+        mock_delay.assert_called_once()
+
+
+@pytest.mark.django_db
+class TestVideoUpload:
+    """Tests for resumable chunked video upload."""
+
+    DATA = b"fake video bytes " * 1000
+
+    def _initiate(self, client, data=None):
+        import hashlib
+        data = self.DATA if data is None else data
+        response = client.post(
+            "/api/v1/moments/uploads/",
+            {"filename": "clip.mp4", "total_size": len(data), "checksum": hashlib.sha256(data).hexdigest()},
+            format="json",
+        )
+        assert response.status_code == status.HTTP_201_CREATED
+        return response.data["id"]
+
+    def _put(self, client, upload_id, offset, chunk):
+        return client.put(
+            f"/api/v1/moments/uploads/{upload_id}/?offset={offset}",
+            data=chunk,
+            content_type="application/octet-stream",
+        )
+
+    def test_full_upload_creates_video_moment(self, auth_client, settings, tmp_path):
+        """Test chunks are assembled, verified and handed to transcoding."""
+        from moments.models import Moment
+        settings.MEDIA_ROOT = tmp_path
+        upload_id = self._initiate(auth_client)
+        for offset in range(0, len(self.DATA), 5000):
+            response = self._put(auth_client, upload_id, offset, self.DATA[offset:offset + 5000])
+            assert response.status_code == status.HTTP_200_OK
+        assert response.data["received_bytes"] == len(self.DATA)
+
+        with patch("moments.views.transcode_video.delay") as mock_delay:
+            response = auth_client.post(
+                f"/api/v1/moments/uploads/{upload_id}/complete/",
+                {"content": "分块上传的视频", "labels": ["旅行"]},
+                format="json",
+            )
+        assert response.status_code == status.HTTP_201_CREATED
+        moment = Moment.objects.get(id=response.data["id"])
+        assert moment.video_status == Moment.VideoStatus.PROCESSING
+        assert moment.video_file.read() == self.DATA
+        assert list(moment.tags.values_list("name", flat=True)) == ["旅行"]
+        assert not (tmp_path / "uploads" / f"{upload_id}.part").exists()
+
+    def test_offset_mismatch_returns_current_progress(self, auth_client, settings, tmp_path):
+        """Test a chunk at the wrong offset is rejected with the resume point."""
+        settings.MEDIA_ROOT = tmp_path
+        upload_id = self._initiate(auth_client)
+        self._put(auth_client, upload_id, 0, self.DATA[:1000])
+        response = self._put(auth_client, upload_id, 5000, self.DATA[5000:6000])
+        assert response.status_code == status.HTTP_409_CONFLICT
+        assert response.data["received_bytes"] == 1000
+        progress = auth_client.get(f"/api/v1/moments/uploads/{upload_id}/")
+        assert progress.data["received_bytes"] == 1000
+
+    def test_checksum_mismatch_resets_upload(self, auth_client, settings, tmp_path):
+        """Test corrupted data is rejected and the upload restarts from zero."""
+        from moments.models import Moment, VideoUpload
+        settings.MEDIA_ROOT = tmp_path
+        upload_id = self._initiate(auth_client)
+        self._put(auth_client, upload_id, 0, b"x" * len(self.DATA))
+        response = auth_client.post(f"/api/v1/moments/uploads/{upload_id}/complete/", {}, format="json")
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert VideoUpload.objects.get(id=upload_id).received_bytes == 0
+        assert not Moment.objects.exists()
+
+    def test_incomplete_upload_cannot_complete(self, auth_client, settings, tmp_path):
+        """Test completing before all bytes arrive fails."""
+        settings.MEDIA_ROOT = tmp_path
+        upload_id = self._initiate(auth_client)
+        self._put(auth_client, upload_id, 0, self.DATA[:100])
+        response = auth_client.post(f"/api/v1/moments/uploads/{upload_id}/complete/", {}, format="json")
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+    def test_oversized_file_rejected(self, auth_client, settings):
+        """Test declaring a file larger than the limit fails."""
+        settings.VIDEO_UPLOAD_MAX_SIZE = 10
+        response = auth_client.post(
+            "/api/v1/moments/uploads/",
+            {"filename": "big.mp4", "total_size": 11, "checksum": "0" * 64},
+            format="json",
+        )
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+    def test_other_user_cannot_access_upload(self, auth_client, auth_client2, settings, tmp_path):
+        """Test uploads are private to their owner."""
+        settings.MEDIA_ROOT = tmp_path
+        upload_id = self._initiate(auth_client)
+        response = self._put(auth_client2, upload_id, 0, self.DATA[:100])
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+
+
+@pytest.mark.django_db
+class TestImageIngest:
+    """Tests for parallel image ingest."""
+
+    def _jpeg(self, name, size=(60, 40)):
+        buf = io.BytesIO()
+        PILImage.new("RGB", size, color="red").save(buf, format="JPEG")
+        buf.seek(0)
+        buf.name = name
+        return buf
+
+    def test_images_stored_in_order(self, auth_client, settings, tmp_path):
+        """Test all images are stored and keep their upload order."""
+        from moments.models import Moment
+        settings.MEDIA_ROOT = tmp_path
+        images = [self._jpeg(f"img{i}.jpg", size=(60 + i, 40)) for i in range(5)]
+        response = auth_client.post(
+            "/api/v1/moments/",
+            {"type": "IMAGE", "content": "五张图", "images": images},
+            format="multipart",
+        )
+        assert response.status_code == status.HTTP_201_CREATED
+        stored = Moment.objects.get(id=response.data["id"]).images.all()
+        assert [img.order for img in stored] == [1, 2, 3, 4, 5]
+        assert [PILImage.open(img.image_file.path).width for img in stored] == [60, 61, 62, 63, 64]
+
+    def test_oversized_image_rejected_before_write(self, auth_client, settings, tmp_path):
+        """Test images over the pixel limit are rejected and nothing is written."""
+        from moments.models import Moment
+        settings.MEDIA_ROOT = tmp_path
+        settings.IMAGE_UPLOAD_MAX_PIXELS = 1000
+        response = auth_client.post(
+            "/api/v1/moments/",
+            {"type": "IMAGE", "content": "大图", "images": [self._jpeg("big.jpg")]},
+            format="multipart",
+        )
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert "分辨率" in str(response.data)
+        assert not Moment.objects.exists()
+        assert not (tmp_path / "images").exists()
+
+    def test_storage_failure_cleans_up(self, moment_image, settings, tmp_path):
+        """Test a failed write removes files already stored and inserts no rows."""
+        from moments.ingest import ingest_images
+        from moments.models import Image
+        settings.MEDIA_ROOT = tmp_path
+
+        class Broken(io.BytesIO):
+            name = "broken.jpg"
+
+            def read(self, *args):
+                raise OSError("disk full")
+
+        with pytest.raises(OSError):
+            ingest_images(moment_image, [self._jpeg("ok.jpg"), Broken()])
+        assert not Image.objects.exists()
+        assert not (tmp_path / "images" / "ok.jpg").exists()
+
+    def test_insert_failure_surfaces_and_cleans_up(self, moment_image, settings, tmp_path):
+        """Test a failed insert inside an outer transaction re-raises the real error and removes new files."""
+        from django.db import IntegrityError, transaction
+        from moments.ingest import ingest_images
+        from moments.models import Image
+        settings.MEDIA_ROOT = tmp_path
+
+        with patch.object(Image.objects, "bulk_create", side_effect=IntegrityError("boom")):
+            with pytest.raises(IntegrityError, match="boom"):
+                with transaction.atomic():
+                    ingest_images(moment_image, [self._jpeg("ok.jpg")])
+        assert not list((tmp_path / "images").rglob("*.jpg"))
+
+
+@pytest.mark.django_db
+class TestMomentCreateQueries:
+    """Tests for the query budget of moment creation."""
+
+    def test_publish_uses_fixed_number_of_queries(self, auth_client, settings, tmp_path, django_assert_max_num_queries):
+        """Test a 9-image, 5-tag post does not scale queries with images or tags."""
+        from moments.models import Moment, Tag
+        settings.MEDIA_ROOT = tmp_path
+        Tag.objects.create(name="已有")
+        images = []
+        for i in range(9):
+            buf = io.BytesIO()
+            PILImage.new("RGB", (20, 20), color="red").save(buf, format="JPEG")
+            buf.seek(0)
+            buf.name = f"img{i}.jpg"
+            images.append(buf)
+        data = {
+            "type": "IMAGE",
+            "content": "九图五标签",
+            "images": images,
+            "labels": ["已有", "旅行", "美食", "日常", "摄影"],
+        }
+        with django_assert_max_num_queries(18):
+            response = auth_client.post("/api/v1/moments/", data, format="multipart")
+        assert response.status_code == status.HTTP_201_CREATED
+        moment = Moment.objects.get(id=response.data["id"])
+        assert moment.images.count() == 9
+        assert sorted(moment.tags.values_list("name", flat=True)) == sorted(data["labels"])
+
+
+@pytest.mark.django_db
+class TestMediaDedup:
+    """Tests for reusing work across duplicate media."""
+
+    def test_duplicate_image_reuses_derivatives(self, moment_image, settings, tmp_path):
+        """Test a second image with identical bytes copies existing derivatives."""
+        from django.core.files.base import ContentFile
+        from moments.derivatives import generate_derivatives
+        from moments.models import Image
+        settings.MEDIA_ROOT = tmp_path
+        buf = io.BytesIO()
+        PILImage.new("RGB", (800, 600), color="green").save(buf, format="JPEG")
+        first = Image(moment=moment_image, order=1)
+        first.image_file.save("a.jpg", ContentFile(buf.getvalue()))
+        second = Image(moment=moment_image, order=2)
+        second.image_file.save("b.jpg", ContentFile(buf.getvalue()))
+        assert first.image_file.name == second.image_file.name
+
+        generate_derivatives(first)
+        with patch("moments.derivatives.PILImage.open") as mock_open:
+            generate_derivatives(second)
+        mock_open.assert_not_called()
+        assert sorted(second.derivatives.values_list("file", flat=True)) == sorted(
+            first.derivatives.values_list("file", flat=True)
+        )
+
+
+@pytest.mark.django_db
+class TestMomentVisibility:
+    """Tests for the stored is_visible flag and the visible() querysets."""
+
+    def test_flag_follows_publish_transcode_and_delete(self, moment_image, moment_video_processing):
+        """Test is_visible is kept in sync by save() and queryset.update()."""
+        from moments.models import Moment
+        from moments.tasks import _update_moment
+        assert moment_image.is_visible is True
+        assert moment_video_processing.is_visible is False
+        assert list(Moment.objects.visible()) == [moment_image]
+
+        _update_moment(moment_video_processing.id, video_status=Moment.VideoStatus.READY, video_progress=100)
+        assert Moment.objects.get(id=moment_video_processing.id).is_visible is True
+
+        moment_image.is_deleted = True
+        moment_image.save(update_fields=["is_deleted"])
+        assert list(Moment.objects.visible()) == [Moment.objects.get(id=moment_video_processing.id)]
+
+    def test_update_uses_new_values_for_filtered_rows(self, moment_video_processing):
+        """Test a filter on the updated field still recomputes the matched rows."""
+        from moments.models import Moment
+        Moment.objects.filter(video_status=Moment.VideoStatus.PROCESSING).update(video_status=Moment.VideoStatus.READY)
+        assert Moment.objects.visible().filter(id=moment_video_processing.id).exists()
+
+    def test_bulk_create_sets_flag(self, user):
+        """Test bulk_create computes is_visible without calling save()."""
+        from moments.models import Moment
+        Moment.objects.bulk_create([
+            Moment(author=user, type=Moment.MomentType.IMAGE),
+            Moment(author=user, type=Moment.MomentType.VIDEO, video_status=Moment.VideoStatus.FAILED),
+        ])
+        assert list(Moment.objects.order_by("id").values_list("is_visible", flat=True)) == [True, False]
+
+    def test_deleted_comments_are_hidden(self, auth_client, moment_image, user):
+        """Test deleted comments and replies are excluded from the comment tree."""
+        from interactions.models import Comment
+        root = Comment.objects.create(moment=moment_image, author=user, content="一级")
+        Comment.objects.create(moment=moment_image, author=user, content="回复", parent=root)
+        Comment.objects.create(moment=moment_image, author=user, content="已删回复", parent=root, is_deleted=True)
+        Comment.objects.create(moment=moment_image, author=user, content="已删", is_deleted=True)
+        assert Comment.objects.visible().count() == 2
+        response = auth_client.get(f"/api/v1/moments/{moment_image.id}/comments/")
+        results = response.data["results"] if isinstance(response.data, dict) else response.data
+        assert [c["content"] for c in results] == ["一级"]
+        assert [r["content"] for r in results[0]["replies"]] == ["回复"]
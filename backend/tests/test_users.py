@@ -226,6 +226,82 @@ class TestPhoneChange:
         assert response.status_code == status.HTTP_400_BAD_REQUEST
 
 
+@pytest.mark.django_db
+class TestCachedAuthentication:
+    """Tests for JWT authentication backed by the user cache."""
+
+    url = "/api/v1/users/me/"
+
+    @pytest.fixture(autouse=True)
+    def shared_cache(self, settings):
+        settings.CACHE_SHARED = True
+
+    def test_repeat_requests_skip_user_query(self, auth_client, django_assert_num_queries):
+        """Test the user row is only loaded on the first request."""
+        auth_client.get(self.url)
+        with django_assert_num_queries(0):
+            response = auth_client.get(self.url)
+        assert response.status_code == status.HTTP_200_OK
+
+    def test_profile_and_phone_changes_refresh_cache(self, auth_client):
+        """Test profile and phone updates are visible on the next request."""
+        auth_client.get(self.url)
+        auth_client.patch(self.url, {"nickname": "新昵称"})
+        assert auth_client.get(self.url).data["nickname"] == "新昵称"
+        auth_client.post("/api/v1/users/me/phone/", {"password": "TestPass123!", "new_phone": "13900009999"})
+        assert auth_client.get(self.url).data["phone"] == "13900009999"
+
+    def test_ban_takes_effect_immediately(self, auth_client, admin_client, user):
+        """Test a banned user is rejected even with a cached user object."""
+        assert auth_client.get(self.url).status_code == status.HTTP_200_OK
+        admin_client.post(f"/api/v1/admin/users/{user.id}/status/")
+        assert auth_client.get(self.url).status_code == status.HTTP_401_UNAUTHORIZED
+
+    def test_logout_bumps_user_version(self, auth_client, user):
+        """Test logout invalidates the cached user."""
+        from rest_framework_simplejwt.tokens import RefreshToken
+        from users.authentication import user_version
+        auth_client.get(self.url)
+        before = user_version(user.id)
+        auth_client.post("/api/v1/auth/logout/", {"refresh_token": str(RefreshToken.for_user(user))})
+        assert user_version(user.id) != before
+
+    def test_falls_back_to_database_when_cache_fails(self, auth_client):
+        """Test authentication still works when the cache backend errors."""
+        from unittest.mock import patch
+        with patch("users.authentication.cache.get", side_effect=ConnectionError("down")):
+            assert auth_client.get(self.url).status_code == status.HTTP_200_OK
+
+    def test_process_local_cache_not_used(self, auth_client, settings, django_assert_num_queries):
+        """Test the user is loaded from the database on every request with a per-process cache."""
+        settings.CACHE_SHARED = False
+        auth_client.get(self.url)
+        with django_assert_num_queries(1):
+            assert auth_client.get(self.url).status_code == status.HTTP_200_OK
+
+    def test_password_hash_not_cached(self, auth_client, user):
+        """Test the cached user carries no password hash and saving it keeps the password."""
+        from django.core.cache import cache
+        from core.cache import auth_user_key
+        from users.authentication import user_version
+        auth_client.get(self.url)
+        cached = cache.get(auth_user_key(user.id, user_version(user.id)))
+        assert user.password not in cached
+        auth_client.patch(self.url, {"nickname": "新昵称"})
+        user.refresh_from_db()
+        assert user.check_password("TestPass123!")
+
+    def test_version_bumped_again_on_commit(self, user, django_capture_on_commit_callbacks):
+        """Test invalidation repeats after commit so stale reads cached mid-transaction are dropped."""
+        from users.authentication import invalidate_user, user_version
+        before = user_version(user.id)
+        with django_capture_on_commit_callbacks(execute=True) as callbacks:
+            invalidate_user(user.id)
+            during = user_version(user.id)
+        assert len(callbacks) == 1
+        assert before != during != user_version(user.id)
+
+
 @pytest.mark.django_db
 class TestUserManager:
     """Tests for UserManager."""
@@ -337,3 +413,210 @@ class TestPhoneAuthBackend:
         result = backend.get_user(99999)
         assert result is None
 
+
+
+@pytest.mark.django_db
+class TestPasswordHashing:
+    """Tests for the configurable password hasher policy."""
+
+    def test_rehash_on_login_after_tuning(self, user, settings):
+        """Test an existing hash is upgraded to the new parameters on the next login."""
+        from users.backends import PhoneAuthBackend
+        settings.PASSWORD_PBKDF2_ITERATIONS = 1000
+        assert PhoneAuthBackend().authenticate(None, phone=user.phone, password="TestPass123!") == user
+        user.refresh_from_db()
+        assert user.password.startswith("pbkdf2_sha256$1000$")
+
+    def test_rehash_on_login_after_switching_algorithm(self, user, settings):
+        """Test switching the preferred hasher migrates accounts transparently."""
+        from users.backends import PhoneAuthBackend
+        settings.PASSWORD_HASHERS = [
+            "users.hashers.TunedScryptPasswordHasher",
+            "users.hashers.TunedPBKDF2PasswordHasher",
+        ]
+        settings.PASSWORD_SCRYPT_WORK_FACTOR = 2**10
+        assert PhoneAuthBackend().authenticate(None, phone=user.phone, password="TestPass123!") == user
+        user.refresh_from_db()
+        assert user.password.startswith("scrypt$")
+        assert PhoneAuthBackend().authenticate(None, phone=user.phone, password="TestPass123!") == user
+
+    def test_unknown_phone_uses_precomputed_dummy_hash(self, db):
+        """Test a login miss verifies against the cached dummy hash instead of hashing a new password."""
+        from unittest.mock import patch
+        from users.backends import PhoneAuthBackend
+        from users.hashers import dummy_password_hash
+        assert dummy_password_hash() == dummy_password_hash()
+        with patch("django.contrib.auth.hashers.make_password") as mock_make:
+            assert PhoneAuthBackend().authenticate(None, phone="19999999999", password="AnyPass!") is None
+        mock_make.assert_not_called()
+
+    def test_benchmark_command_reports_throughput(self):
+        """Test the benchmark command prints a line per configuration."""
+        from io import StringIO
+        from django.core.management import call_command
+        out = StringIO()
+        call_command(
+            "benchmark_password_hashers", "--rounds", "1", "--processes", "1",
+            "--pbkdf2-iterations", "1000", "--scrypt-work-factors", "1024", stdout=out,
+        )
+        assert "pbkdf2 iterations=1000" in out.getvalue()
+        assert "scrypt work_factor=1024" in out.getvalue()
+
+
+@pytest.mark.django_db
+class TestLoginThrottling:
+    """Tests for sliding-window throttling of login and registration."""
+
+    def _login(self, client, phone, password="WrongPassword123!", ip="10.0.0.1"):
+        return client.post(
+            "/api/v1/auth/login/", {"phone": phone, "password": password}, REMOTE_ADDR=ip
+        )
+
+    def test_phone_limit_rejects_before_password_check(self, api_client, user, settings):
+        """Test requests over the per-phone limit get 429 without hashing the password."""
+        from unittest.mock import patch
+        settings.THROTTLE_RATES = {**settings.THROTTLE_RATES, "login_phone": "3/min"}
+        for _ in range(3):
+            assert self._login(api_client, user.phone).status_code != status.HTTP_429_TOO_MANY_REQUESTS
+        with patch("users.backends.PhoneAuthBackend.authenticate") as mock_auth:
+            response = self._login(api_client, user.phone, password="TestPass123!")
+        assert response.status_code == status.HTTP_429_TOO_MANY_REQUESTS
+        assert int(response["Retry-After"]) > 0
+        mock_auth.assert_not_called()
+        # 其他手机号不受影响
+        assert self._login(api_client, "19999999999").status_code == status.HTTP_400_BAD_REQUEST
+
+    def test_ip_limit_spans_phones(self, api_client, settings):
+        """Test one IP rotating through phone numbers is limited by the per-IP rate."""
+        settings.THROTTLE_RATES = {**settings.THROTTLE_RATES, "login_ip": "4/min"}
+        codes = [self._login(api_client, f"1990000000{i}").status_code for i in range(6)]
+        assert codes[:4] == [status.HTTP_400_BAD_REQUEST] * 4
+        assert codes[4:] == [status.HTTP_429_TOO_MANY_REQUESTS] * 2
+        assert self._login(api_client, "19900000009", ip="10.0.0.2").status_code == status.HTTP_400_BAD_REQUEST
+
+    def test_spoofed_forwarded_for_shares_ip_limit(self, api_client, settings):
+        """Test rotating X-Forwarded-For does not give a fresh per-IP bucket."""
+        settings.THROTTLE_RATES = {**settings.THROTTLE_RATES, "login_ip": "2/min"}
+        codes = [
+            api_client.post(
+                "/api/v1/auth/login/", {"phone": f"1990000000{i}", "password": "x"},
+                REMOTE_ADDR="10.0.0.1", HTTP_X_FORWARDED_FOR=f"203.0.113.{i}",
+            ).status_code
+            for i in range(3)
+        ]
+        assert codes[2] == status.HTTP_429_TOO_MANY_REQUESTS
+
+    def test_forwarded_for_trusted_behind_proxy(self, api_client, settings):
+        """Test the proxy-appended address is used when NUM_PROXIES is configured."""
+        settings.THROTTLE_RATES = {**settings.THROTTLE_RATES, "login_ip": "1/min"}
+        settings.REST_FRAMEWORK = {**settings.REST_FRAMEWORK, "NUM_PROXIES": 1}
+        codes = [
+            api_client.post(
+                "/api/v1/auth/login/", {"phone": "19900000001", "password": "x"},
+                REMOTE_ADDR="127.0.0.1", HTTP_X_FORWARDED_FOR=f"1.2.3.4, 203.0.113.{i}",
+            ).status_code
+            for i in range(2)
+        ]
+        assert codes == [status.HTTP_400_BAD_REQUEST] * 2
+
+    def test_register_limit(self, api_client, settings):
+        """Test registration is limited per IP."""
+        settings.THROTTLE_RATES = {**settings.THROTTLE_RATES, "register_ip": "1/hour"}
+        data = {"phone": "13800009999", "username": "throttled", "nickname": "限流", "password": "StrongPass123!"}
+        assert api_client.post("/api/v1/auth/register/", data).status_code == status.HTTP_201_CREATED
+        response = api_client.post("/api/v1/auth/register/", {**data, "phone": "13800009998", "username": "t2"})
+        assert response.status_code == status.HTTP_429_TOO_MANY_REQUESTS
+
+    def test_fails_open_when_cache_unavailable(self, api_client, user, settings):
+        """Test login keeps working if the counter cache errors."""
+        from unittest.mock import patch
+        settings.THROTTLE_RATES = {**settings.THROTTLE_RATES, "login_phone": "1/min"}
+        with patch("core.throttling.cache.incr", side_effect=ConnectionError("down")):
+            for _ in range(3):
+                response = self._login(api_client, user.phone, password="TestPass123!")
+                assert response.status_code == status.HTTP_200_OK
+
+    def test_admin_throttle_stats(self, api_client, admin_client, user, settings):
+        """Test the admin endpoint reports allowed and rejected counts per scope."""
+        settings.THROTTLE_RATES = {**settings.THROTTLE_RATES, "login_phone": "2/min"}
+        for _ in range(3):
+            self._login(api_client, user.phone)
+        response = admin_client.get("/api/v1/admin/throttle/")
+        assert response.status_code == status.HTTP_200_OK
+        rows = {row["scope"]: row for row in response.data}
+        assert rows["login_phone"]["allowed"] == 2
+        assert rows["login_phone"]["rejected"] == 1
+        assert rows["login_phone"]["rate"] == "2/min"
+
+    def test_loadtest_command(self, settings):
+        """Test the load-test command reports throttled batches."""
+        from io import StringIO
+        from django.core.management import call_command
+        settings.THROTTLE_RATES = {**settings.THROTTLE_RATES, "login_phone": "2/min"}
+        out = StringIO()
+        call_command("loadtest_login", "--requests", "6", "--batch", "3", stdout=out)
+        assert "429×3" in out.getvalue()
+
+
+@pytest.mark.django_db
+class TestTokenBlacklist:
+    """Tests for the cached refresh-token blacklist and expired token pruning."""
+
+    def _refresh(self, client, token):
+        return client.post("/api/v1/auth/token/refresh/", {"refresh": str(token)})
+
+    def test_refresh_skips_db_once_cached(self, api_client, user, settings):
+        """Test a repeated refresh of a valid token answers the blacklist check from the cache."""
+        from unittest.mock import patch
+        from users.tokens import CachedRefreshToken
+        settings.CACHE_SHARED = True
+        token = CachedRefreshToken.for_user(user)
+        assert self._refresh(api_client, token).status_code == status.HTTP_200_OK
+        with patch("users.tokens.BlacklistedToken.objects.filter") as mock_filter:
+            assert self._refresh(api_client, token).status_code == status.HTTP_200_OK
+        mock_filter.assert_not_called()
+
+    def test_valid_result_not_cached_per_process(self, user):
+        """Test a per-process cache does not remember that a token is not blacklisted."""
+        from django.core.cache import cache
+        from core.cache import token_blacklist_key
+        from users.tokens import CachedRefreshToken, is_blacklisted
+        token = CachedRefreshToken.for_user(user)
+        assert is_blacklisted(token["jti"]) is False
+        assert cache.get(token_blacklist_key(token["jti"])) is None
+
+    def test_logout_updates_cached_result(self, auth_client, api_client, user):
+        """Test a token cached as valid is rejected right after logout blacklists it."""
+        from users.tokens import CachedRefreshToken
+        token = CachedRefreshToken.for_user(user)
+        assert self._refresh(api_client, token).status_code == status.HTTP_200_OK
+        auth_client.post("/api/v1/auth/logout/", {"refresh_token": str(token)})
+        assert self._refresh(api_client, token).status_code == status.HTTP_401_UNAUTHORIZED
+
+    def test_falls_back_to_db_when_cache_unavailable(self, user):
+        """Test the blacklist check still works if the cache errors."""
+        from unittest.mock import patch
+        from users.tokens import CachedRefreshToken, is_blacklisted
+        token = CachedRefreshToken.for_user(user)
+        token.blacklist()
+        with patch("users.tokens.cache.get", side_effect=ConnectionError("down")):
+            assert is_blacklisted(token["jti"]) is True
+
+    def test_prune_expired_tokens_in_batches(self, user, settings):
+        """Test the pruning task deletes only expired tokens and their blacklist rows."""
+        from datetime import timedelta
+        from django.utils import timezone
+        from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+        from users.tasks import prune_expired_tokens
+        from users.tokens import CachedRefreshToken
+        tokens = [CachedRefreshToken.for_user(user) for _ in range(5)]
+        for token in tokens[:2]:
+            token.blacklist()
+        OutstandingToken.objects.filter(jti__in=[t["jti"] for t in tokens[:4]]).update(
+            expires_at=timezone.now() - timedelta(seconds=1)
+        )
+        fresh = OutstandingToken.objects.get(jti=tokens[4]["jti"])
+        settings.TOKEN_PRUNE_BATCH_SIZE = 3
+        assert prune_expired_tokens() == 4
+        assert list(OutstandingToken.objects.all()) == [fresh]
+        assert not BlacklistedToken.objects.exists()
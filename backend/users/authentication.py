@@ -0,0 +1,110 @@
+"""
+带缓存的 JWT 认证
+
+simplejwt 默认每个请求都按 user_id 查询一次 User，这里把用户字段（不含密码哈希）缓存在
+auth_user:<user_id>:<version> 下。用户资料、手机号、封禁状态变更以及登出时递增版本号，
+旧版本的缓存不会再被读到（并发请求把旧数据写回旧版本的键也不影响），过期后自然清除。
+进程内缓存无法让其他进程失效，只有 CACHE_SHARED 时才缓存；缓存不可用时同样退回 simplejwt 的数据库查询。
+"""
+import logging
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils.translation import gettext_lazy as _
+from drf_spectacular.contrib.rest_framework_simplejwt import SimpleJWTScheme
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+from core.cache import auth_user_key, user_version_key
+
+logger = logging.getLogger(__name__)
+
+
+def user_version(user_id) -> int:
+    key = user_version_key(user_id)
+    version = cache.get(key)
+    if version is None:
+        # 版本号被淘汰后用当前时间重新初始化，不会与淘汰前用过的版本号重复
+        cache.add(key, time.time_ns(), None)
+        version = cache.get(key)
+    return version
+
+
+def _bump_version(user_id):
+    key = user_version_key(user_id)
+    try:
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, time.time_ns(), None)
+    except Exception as e:
+        logger.warning(f"[auth] invalidate user {user_id} failed: {e}")
+
+
+def invalidate_user(user_id):
+    """
+    递增用户版本号，使已缓存的用户对象失效。事务提交后再递增一次：
+    提交前并发请求可能读到旧数据并写入新版本的键
+    """
+    _bump_version(user_id)
+    transaction.on_commit(lambda: _bump_version(user_id))
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """与 JWTAuthentication 行为一致，但常规路径不查询数据库"""
+
+    @property
+    def cached_fields(self):
+        return [field for field in self.user_model._meta.concrete_fields if field.attname != "password"]
+
+    def _dump(self, user) -> list:
+        return [field.get_prep_value(field.value_from_object(user)) for field in self.cached_fields]
+
+    def _load(self, values: list):
+        # 密码字段延迟加载：需要时再查询，save() 也只会写回已加载的字段
+        names = [field.attname for field in self.cached_fields]
+        return self.user_model.from_db(self.user_model.objects.db, names, values)
+
+    def get_user(self, validated_token):
+        if not settings.CACHE_SHARED:
+            return super().get_user(validated_token)
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError as e:
+            raise InvalidToken(_("Token contained no recognizable user identification")) from e
+
+        try:
+            key = auth_user_key(user_id, user_version(user_id))
+            cached = cache.get(key)
+        except Exception as e:
+            logger.warning(f"[auth] read user {user_id} from cache failed: {e}")
+            return super().get_user(validated_token)
+
+        if cached is None:
+            try:
+                user = self.user_model.objects.get(**{api_settings.USER_ID_FIELD: user_id})
+            except self.user_model.DoesNotExist as e:
+                raise AuthenticationFailed(_("User not found"), code="user_not_found") from e
+            try:
+                cache.set(key, self._dump(user), settings.CACHE_TTL_AUTH_USER)
+            except Exception as e:
+                logger.warning(f"[auth] cache user {user_id} failed: {e}")
+        else:
+            user = self._load(cached)
+
+        if api_settings.CHECK_USER_IS_ACTIVE and not user.is_active:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+        if api_settings.CHECK_REVOKE_TOKEN and validated_token.get(
+            api_settings.REVOKE_TOKEN_CLAIM
+        ) != get_md5_hash_password(user.password):
+            raise AuthenticationFailed(_("The user's password has been changed."), code="password_changed")
+        return user
+
+
+class CachedJWTScheme(SimpleJWTScheme):
+    """让 drf-spectacular 把 CachedJWTAuthentication 识别为 JWT 认证"""
+    target_class = "users.authentication.CachedJWTAuthentication"
@@ -3,6 +3,9 @@ Custom authentication backend for phone-based login.
 """
 from django.contrib.auth import get_user_model
 from django.contrib.auth.backends import ModelBackend
+from django.contrib.auth.hashers import check_password
+
+from .hashers import dummy_password_hash
 
 User = get_user_model()
 
@@ -20,9 +23,10 @@ class PhoneAuthBackend(ModelBackend):
         try:
             user = User.objects.get(phone=phone)
         except User.DoesNotExist:
-            # Run the default password hasher once to reduce timing attack
-            User().set_password(password)
+            # Verify against a precomputed hash so a miss costs the same as a real login
+            check_password(password, dummy_password_hash())
             return None
+        # check_password rehashes and saves the password when the hasher policy changed
         if user.check_password(password) and self.user_can_authenticate(user):
             return user
         return None
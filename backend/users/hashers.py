@@ -0,0 +1,66 @@
+"""
+可配置参数的密码哈希算法
+
+settings.PASSWORD_HASHER 选择新密码使用的算法（pbkdf2 / scrypt / argon2），各算法的参数也来自 settings。
+其余算法仍保留在 PASSWORD_HASHERS 中用于校验旧密码；算法或参数变化后，用户下次登录时
+Django 的 check_password 会自动按新配置重新哈希并保存。
+"""
+from functools import lru_cache
+
+from django.conf import settings
+from django.contrib.auth.hashers import (
+    Argon2PasswordHasher,
+    PBKDF2PasswordHasher,
+    ScryptPasswordHasher,
+    make_password,
+)
+from django.utils.crypto import get_random_string
+
+
+class TunedPBKDF2PasswordHasher(PBKDF2PasswordHasher):
+    @property
+    def iterations(self):
+        return settings.PASSWORD_PBKDF2_ITERATIONS
+
+
+class TunedScryptPasswordHasher(ScryptPasswordHasher):
+    @property
+    def work_factor(self):
+        return settings.PASSWORD_SCRYPT_WORK_FACTOR
+
+    @property
+    def block_size(self):
+        return settings.PASSWORD_SCRYPT_BLOCK_SIZE
+
+    @property
+    def parallelism(self):
+        return settings.PASSWORD_SCRYPT_PARALLELISM
+
+
+class TunedArgon2PasswordHasher(Argon2PasswordHasher):
+    """需要安装 argon2-cffi"""
+
+    @property
+    def time_cost(self):
+        return settings.PASSWORD_ARGON2_TIME_COST
+
+    @property
+    def memory_cost(self):
+        return settings.PASSWORD_ARGON2_MEMORY_COST
+
+    @property
+    def parallelism(self):
+        return settings.PASSWORD_ARGON2_PARALLELISM
+
+
+@lru_cache(maxsize=None)
+def _dummy_password_hash(hasher_path: str) -> str:
+    return make_password(get_random_string(32))
+
+
+def dummy_password_hash() -> str:
+    """
+    用当前首选算法预先生成的随机密码哈希，手机号不存在时用它做一次校验，
+    耗时与真实用户的登录一致（不必每次都重新生成哈希）
+    """
+    return _dummy_password_hash(settings.PASSWORD_HASHERS[0])
@@ -0,0 +1,110 @@
+"""
+密码哈希算法的登录吞吐量基准测试
+
+对每种算法/参数组合重复校验同一个密码（登录时的开销），报告单次耗时、
+单核每秒可校验次数，以及多进程并发时的总吞吐量，用于调整 PASSWORD_* 配置。
+
+使用方式：
+    python manage.py benchmark_password_hashers
+    python manage.py benchmark_password_hashers --pbkdf2-iterations 600000 300000 --rounds 20
+    python manage.py benchmark_password_hashers --processes 4
+"""
+import importlib.util
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth.hashers import Argon2PasswordHasher, PBKDF2PasswordHasher, ScryptPasswordHasher
+from django.core.management.base import BaseCommand
+
+PASSWORD = "benchmark-Password-123"
+HASHER_CLASSES = {
+    "pbkdf2": PBKDF2PasswordHasher,
+    "scrypt": ScryptPasswordHasher,
+    "argon2": Argon2PasswordHasher,
+}
+
+
+def build_hasher(algorithm: str, params: dict):
+    hasher = HASHER_CLASSES[algorithm]()
+    for name, value in params.items():
+        setattr(hasher, name, value)
+    return hasher
+
+
+def verify_rounds(algorithm: str, params: dict, encoded: str, rounds: int) -> float:
+    """校验 rounds 次，返回耗时（秒）"""
+    hasher = build_hasher(algorithm, params)
+    start = time.perf_counter()
+    for _ in range(rounds):
+        hasher.verify(PASSWORD, encoded)
+    return time.perf_counter() - start
+
+
+class Command(BaseCommand):
+    help = '测试各密码哈希配置的登录校验吞吐量'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rounds', type=int, default=10, help='每个进程的校验次数')
+        parser.add_argument('--processes', type=int, default=os.cpu_count() or 1, help='并发测试的进程数')
+        parser.add_argument(
+            '--pbkdf2-iterations', type=int, nargs='+',
+            default=[settings.PASSWORD_PBKDF2_ITERATIONS], help='要对比的 PBKDF2 迭代次数',
+        )
+        parser.add_argument(
+            '--scrypt-work-factors', type=int, nargs='+',
+            default=[settings.PASSWORD_SCRYPT_WORK_FACTOR], help='要对比的 scrypt work factor',
+        )
+        parser.add_argument(
+            '--argon2-memory-costs', type=int, nargs='+',
+            default=[settings.PASSWORD_ARGON2_MEMORY_COST], help='要对比的 argon2 内存开销（KiB）',
+        )
+
+    def configs(self, options):
+        for iterations in options['pbkdf2_iterations']:
+            yield 'pbkdf2', {'iterations': iterations}
+        for work_factor in options['scrypt_work_factors']:
+            yield 'scrypt', {
+                'work_factor': work_factor,
+                'block_size': settings.PASSWORD_SCRYPT_BLOCK_SIZE,
+                'parallelism': settings.PASSWORD_SCRYPT_PARALLELISM,
+            }
+        if importlib.util.find_spec('argon2') is None:
+            self.stdout.write(self.style.WARNING('⚠️ 未安装 argon2-cffi，跳过 argon2'))
+            return
+        for memory_cost in options['argon2_memory_costs']:
+            yield 'argon2', {
+                'time_cost': settings.PASSWORD_ARGON2_TIME_COST,
+                'memory_cost': memory_cost,
+                'parallelism': settings.PASSWORD_ARGON2_PARALLELISM,
+            }
+
+    def handle(self, *args, **options):
+        rounds, processes = options['rounds'], options['processes']
+        self.stdout.write(self.style.NOTICE(
+            f'🚀 当前首选算法: {settings.PASSWORD_HASHER}，每进程校验 {rounds} 次，并发 {processes} 个进程'
+        ))
+        results = []
+        with ProcessPoolExecutor(max_workers=processes) as pool:
+            # 先启动全部工作进程，避免把进程启动时间计入第一组结果
+            list(pool.map(time.sleep, [0] * processes))
+            for algorithm, params in self.configs(options):
+                encoded = build_hasher(algorithm, params).encode(PASSWORD, HASHER_CLASSES[algorithm]().salt())
+                single = verify_rounds(algorithm, params, encoded, rounds)
+                start = time.perf_counter()
+                list(pool.map(verify_rounds, *zip(*[(algorithm, params, encoded, rounds)] * processes)))
+                parallel = time.perf_counter() - start
+                results.append({
+                    'config': f"{algorithm} {' '.join(f'{k}={v}' for k, v in params.items())}",
+                    'ms_per_hash': single / rounds * 1000,
+                    'per_core': rounds / single,
+                    'total': rounds * processes / parallel,
+                })
+
+        for row in results:
+            self.stdout.write(
+                f"  {row['config']}: {row['ms_per_hash']:.1f} 毫秒/次，单核 {row['per_core']:.1f} 次/秒，"
+                f"{processes} 进程合计 {row['total']:.1f} 次/秒"
+            )
+        self.stdout.write(self.style.SUCCESS('🎉 基准测试完成'))
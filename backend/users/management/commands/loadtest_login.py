@@ -0,0 +1,59 @@
+"""
+模拟撞库攻击的登录压测
+
+在进程内用测试客户端连续提交错误密码，按批统计响应状态和本进程消耗的 CPU 时间。
+限流生效后被拒绝的请求不会计算密码哈希，之后每批的 CPU 耗时应保持在很低的水平。
+
+使用方式：
+    python manage.py loadtest_login                          # 单 IP 单手机号
+    python manage.py loadtest_login --phones 50 --ips 5      # 轮换手机号和 IP
+"""
+import time
+import uuid
+from collections import Counter
+
+from django.core.management.base import BaseCommand
+from django.test import Client
+
+
+class Command(BaseCommand):
+    help = '模拟撞库攻击，观察限流后登录接口的 CPU 耗时'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200, help='总请求数')
+        parser.add_argument('--batch', type=int, default=20, help='每批请求数')
+        parser.add_argument('--phones', type=int, default=1, help='轮换的手机号数量')
+        parser.add_argument('--ips', type=int, default=1, help='轮换的来源 IP 数量')
+        parser.add_argument('--url', default='/api/v1/auth/login/', help='登录接口地址')
+
+    def handle(self, *args, **options):
+        client = Client()
+        # 每次运行使用新的手机号段，不受上一次运行留下的计数影响
+        prefix = f"19{uuid.uuid4().int % 10**5:05d}"
+        phones = [f"{prefix}{i:04d}" for i in range(options['phones'])]
+        ips = [f"10.{i // 65536 % 256}.{i // 256 % 256}.{i % 256}" for i in range(options['ips'])]
+
+        self.stdout.write(self.style.NOTICE(
+            f"🚀 共 {options['requests']} 次登录，{len(phones)} 个手机号，{len(ips)} 个 IP"
+        ))
+        batches = []
+        for start in range(0, options['requests'], options['batch']):
+            statuses = Counter()
+            cpu_start = time.process_time()
+            for i in range(start, min(start + options['batch'], options['requests'])):
+                response = client.post(
+                    options['url'],
+                    {"phone": phones[i % len(phones)], "password": "wrong-password"},
+                    content_type="application/json",
+                    REMOTE_ADDR=ips[i % len(ips)],
+                )
+                statuses[response.status_code] += 1
+            cpu_ms = (time.process_time() - cpu_start) * 1000
+            batches.append(cpu_ms)
+            summary = "，".join(f"{code}×{count}" for code, count in sorted(statuses.items()))
+            self.stdout.write(f"  第 {len(batches)} 批: {summary}，CPU {cpu_ms:.1f} ms")
+
+        tail = batches[len(batches) // 2:]
+        self.stdout.write(self.style.SUCCESS(
+            f"🎉 压测完成: 首批 CPU {batches[0]:.1f} ms，后半程平均 {sum(tail) / len(tail):.1f} ms/批"
+        ))
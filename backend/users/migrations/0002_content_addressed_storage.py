@@ -0,0 +1,27 @@
+# Generated by Django 4.2.30 on 2026-10-19 14:26
+
+import core.storage
+from django.db import migrations, models
+import users.models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0001_initial"),
+        ("users", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="user",
+            name="avatar",
+            field=models.ImageField(
+                blank=True,
+                default=users.models.default_avatar_path,
+                null=True,
+                storage=core.storage.ContentAddressedStorage(),
+                upload_to="avatars/",
+            ),
+        ),
+    ]
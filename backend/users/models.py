@@ -3,6 +3,8 @@ from django.contrib.auth.models import PermissionsMixin
 from django.db import models
 from django.utils import timezone
 
+from core.storage import content_storage
+
 
 class UserManager(BaseUserManager):
     def create_user(self, phone, username, nickname, password=None, **extra_fields):
@@ -38,7 +40,9 @@ class User(AbstractBaseUser, PermissionsMixin):
     phone = models.CharField(max_length=11, unique=True)
     username = models.CharField(max_length=30, unique=True)
     nickname = models.CharField(max_length=30)
-    avatar = models.ImageField(upload_to="avatars/", null=True, blank=True, default=default_avatar_path)
+    avatar = models.ImageField(
+        upload_to="avatars/", storage=content_storage, null=True, blank=True, default=default_avatar_path
+    )
     is_staff = models.BooleanField(default=False)
     is_active = models.BooleanField(default=True)
     created_at = models.DateTimeField(default=timezone.now)
@@ -51,3 +55,11 @@ class User(AbstractBaseUser, PermissionsMixin):
     def __str__(self):
         return f"{self.username}({self.phone})"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # 记录从数据库读出的头像，保存时据此判断是否更换了头像，无需再查询一次
+        if "avatar" in field_names:
+            instance._loaded_avatar = values[field_names.index("avatar")]
+        return instance
+
@@ -1,10 +1,25 @@
 from django.contrib.auth import authenticate
+from django.contrib.auth.models import update_last_login
 from django.contrib.auth.password_validation import validate_password
 from django.db.models import Q
 from rest_framework import serializers
-from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer, TokenRefreshSerializer
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
 
 from .models import User
+from .tokens import CachedRefreshToken
+
+
+def friendship_status(user, other_id):
+    """返回 user 与 other_id 对应用户之间的好友关系状态，未登录、本人或没有关系时返回 None"""
+    if not user.is_authenticated or other_id == user.id:
+        return None
+
+    from friends.models import Friendship
+    return Friendship.objects.filter(
+        (Q(from_user=user) & Q(to_user_id=other_id)) |
+        (Q(from_user_id=other_id) & Q(to_user=user))
+    ).values_list("status", flat=True).first()
 
 
 class RegisterSerializer(serializers.ModelSerializer):
@@ -47,22 +62,9 @@ class UserSerializer(serializers.ModelSerializer):
     def get_friendship_status(self, obj):
         """获取当前用户与该用户的好友关系状态"""
         request = self.context.get('request')
-        if not request or not request.user.is_authenticated:
-            return None
-
-        user = request.user
-        if obj.id == user.id:
+        if not request:
             return None
-
-        from friends.models import Friendship
-        friendship = Friendship.objects.filter(
-            (Q(from_user=user) & Q(to_user=obj)) |
-            (Q(from_user=obj) & Q(to_user=user))
-        ).first()
-
-        if friendship:
-            return friendship.status
-        return None
+        return friendship_status(request.user, obj.id)
 
 
 class CurrentUserSerializer(serializers.ModelSerializer):
@@ -101,6 +103,7 @@ class PhoneChangeSerializer(serializers.Serializer):
 
 class PhoneTokenObtainPairSerializer(TokenObtainPairSerializer):
     username_field = "phone"
+    token_class = CachedRefreshToken
 
     def validate(self, attrs):
         phone = attrs.get("phone")
@@ -111,7 +114,15 @@ class PhoneTokenObtainPairSerializer(TokenObtainPairSerializer):
         if not user.is_active:
             raise serializers.ValidationError({"detail": "账号未激活"})
         self.user = user  # Store for subclasses
-        data = super().validate({"phone": phone, "password": password})
+        # 不调用父类 validate，避免再执行一次 authenticate（密码哈希）
+        refresh = self.get_token(user)
+        data = {"refresh": str(refresh), "access": str(refresh.access_token)}
+        if jwt_settings.UPDATE_LAST_LOGIN:
+            update_last_login(None, user)
         data["user_info"] = UserInfoSerializer(user).data
         return data
 
+
+class CachedTokenRefreshSerializer(TokenRefreshSerializer):
+    """刷新 token 时通过缓存检查黑名单"""
+    token_class = CachedRefreshToken
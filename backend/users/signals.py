@@ -0,0 +1,54 @@
+"""
+- 头像文件的引用计数维护：更换头像或删除用户后释放旧文件的引用
+- 用户资料变更（含手机号、封禁状态）后失效资料缓存和认证用户缓存，昵称或头像变更时同时失效其动态的详情缓存
+- refresh token 被拉黑后立即更新黑名单缓存
+"""
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken
+
+from core.cache import invalidate, invalidate_moments, user_profile_key
+from core.storage import release_on_commit
+
+from .authentication import invalidate_user
+from .models import User
+from .tokens import mark_blacklisted
+
+
+@receiver(pre_save, sender=User)
+def release_replaced_avatar(sender, instance, update_fields=None, **kwargs):
+    if instance.pk is None or (update_fields is not None and "avatar" not in update_fields):
+        return
+    if hasattr(instance, "_loaded_avatar"):
+        old_avatar = instance._loaded_avatar
+    else:
+        old_avatar = User.objects.filter(pk=instance.pk).values_list("avatar", flat=True).first()
+    if old_avatar and old_avatar != instance.avatar.name:
+        release_on_commit(old_avatar)
+    instance._loaded_avatar = instance.avatar.name
+
+
+@receiver(post_delete, sender=User)
+def release_avatar(sender, instance, **kwargs):
+    release_on_commit(instance.avatar.name)
+
+
+# 动态详情缓存中包含的作者字段
+AUTHOR_FIELDS = {"nickname", "avatar"}
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_user_profile(sender, instance, update_fields=None, **kwargs):
+    invalidate(user_profile_key(instance.id))
+    invalidate_user(instance.id)
+    if update_fields is None or AUTHOR_FIELDS & set(update_fields):
+        from moments.models import Moment
+
+        invalidate_moments(*Moment.objects.filter(author_id=instance.id).values_list("id", flat=True))
+
+
+@receiver(post_save, sender=BlacklistedToken)
+def cache_blacklisted_token(sender, instance, created, **kwargs):
+    if created:
+        mark_blacklisted(instance.token.jti)
@@ -0,0 +1,16 @@
+import logging
+
+from celery import shared_task
+
+from . import tokens
+
+logger = logging.getLogger(__name__)
+
+
+@shared_task
+def prune_expired_tokens():
+    """分批删除已过期的 refresh token 记录"""
+    deleted = tokens.prune_expired_tokens()
+    if deleted:
+        logger.info(f"[prune_expired_tokens] Removed {deleted} expired token(s)")
+    return deleted
@@ -0,0 +1,75 @@
+"""
+refresh token 黑名单的缓存查询与过期清理
+
+simplejwt 每次刷新 token 都查询一次 BlacklistedToken，而绝大多数 token 并不在黑名单中。
+这里把查询结果缓存在 token_blacklist:<jti> 下：未命中时查询数据库并用 cache.add 写入，
+拉黑时由信号用 cache.set 覆盖为 True，并发的查询不会把旧结果写回。缓存不可用时直接查询数据库。
+进程内缓存无法得知其他进程的拉黑操作，"未拉黑" 的结果只在 CACHE_SHARED 时缓存。
+
+OutstandingToken 每次登录新增一行，过期后由定时任务分批删除（拉黑记录随之删除）。
+"""
+import logging
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from core.cache import token_blacklist_key
+
+logger = logging.getLogger(__name__)
+
+
+def is_blacklisted(jti: str) -> bool:
+    key = token_blacklist_key(jti)
+    try:
+        cached = cache.get(key)
+    except Exception as e:
+        logger.warning(f"[token] blacklist cache unavailable: {e}")
+        return BlacklistedToken.objects.filter(token__jti=jti).exists()
+    if cached is not None:
+        return cached
+    blacklisted = BlacklistedToken.objects.filter(token__jti=jti).exists()
+    if blacklisted or settings.CACHE_SHARED:
+        try:
+            cache.add(key, blacklisted, settings.CACHE_TTL_TOKEN_BLACKLIST)
+        except Exception:
+            pass
+    return blacklisted
+
+
+def mark_blacklisted(jti: str):
+    try:
+        cache.set(token_blacklist_key(jti), True, settings.CACHE_TTL_TOKEN_BLACKLIST)
+    except Exception as e:
+        logger.warning(f"[token] mark {jti} blacklisted failed: {e}")
+
+
+class CachedRefreshToken(RefreshToken):
+    """黑名单检查走缓存的 RefreshToken"""
+
+    def check_blacklist(self):
+        if is_blacklisted(self.payload[api_settings.JTI_CLAIM]):
+            raise TokenError(_("Token is blacklisted"))
+
+
+def prune_expired_tokens(batch_size: int = None) -> int:
+    """分批删除已过期的 OutstandingToken 及其拉黑记录，返回删除的 token 数"""
+    batch_size = batch_size or settings.TOKEN_PRUNE_BATCH_SIZE
+    now = timezone.now()
+    total = 0
+    while True:
+        ids = list(
+            OutstandingToken.objects.filter(expires_at__lte=now)
+            .order_by("id")
+            .values_list("id", flat=True)[:batch_size]
+        )
+        if not ids:
+            return total
+        BlacklistedToken.objects.filter(token_id__in=ids).delete()
+        OutstandingToken.objects.filter(id__in=ids).delete()
+        total += len(ids)
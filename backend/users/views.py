@@ -1,9 +1,13 @@
+from django.conf import settings
+from django.shortcuts import get_object_or_404
 from drf_spectacular.utils import extend_schema, extend_schema_view, OpenApiExample
 from rest_framework import generics, permissions, status
 from rest_framework.response import Response
-from rest_framework_simplejwt.tokens import RefreshToken
 from rest_framework_simplejwt.views import TokenObtainPairView
 
+from core.cache import get_or_compute, user_profile_key
+from core.throttling import LoginIPThrottle, LoginPhoneThrottle, RegisterIPThrottle
+from .authentication import invalidate_user
 from .models import User
 from .serializers import (
     CurrentUserSerializer,
@@ -11,7 +15,9 @@ from .serializers import (
     PhoneTokenObtainPairSerializer,
     RegisterSerializer,
     UserSerializer,
+    friendship_status,
 )
+from .tokens import CachedRefreshToken
 
 
 @extend_schema(
@@ -36,6 +42,7 @@ class RegisterView(generics.CreateAPIView):
     queryset = User.objects.all()
     serializer_class = RegisterSerializer
     permission_classes = [permissions.AllowAny]
+    throttle_classes = [RegisterIPThrottle]
 
 
 @extend_schema(
@@ -57,6 +64,7 @@ class LoginView(TokenObtainPairView):
     """用户登录接口，返回 access 和 refresh token"""
     serializer_class = PhoneTokenObtainPairSerializer
     permission_classes = [permissions.AllowAny]
+    throttle_classes = [LoginIPThrottle, LoginPhoneThrottle]
 
 
 @extend_schema(
@@ -80,10 +88,11 @@ class LogoutView(generics.GenericAPIView):
         if not refresh_token:
             return Response({"detail": "缺少 refresh_token"}, status=status.HTTP_400_BAD_REQUEST)
         try:
-            token = RefreshToken(refresh_token)
+            token = CachedRefreshToken(refresh_token)
             token.blacklist()
         except Exception:
             return Response({"detail": "refresh_token 无效"}, status=status.HTTP_400_BAD_REQUEST)
+        invalidate_user(request.user.id)
         return Response({"detail": "已退出登录"})
 
 
@@ -152,3 +161,15 @@ class UserProfileView(generics.RetrieveAPIView):
     permission_classes = [permissions.IsAuthenticated]
     lookup_field = 'id'
 
+    def retrieve(self, request, *args, **kwargs):
+        user_id = kwargs["id"]
+
+        def load():
+            user = get_object_or_404(User, id=user_id)
+            return dict(self.get_serializer(user).data)
+
+        # 资料本身按用户缓存，好友关系与访问者有关，每次单独计算
+        data = dict(get_or_compute(user_profile_key(user_id), settings.CACHE_TTL_USER_PROFILE, load))
+        data["friendship_status"] = friendship_status(request.user, user_id)
+        return Response(data)
+